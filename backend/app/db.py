@@ -1,18 +1,69 @@
+import base64
 import os
 
-from sqlalchemy import inspect
-from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import migrations
+from .services import metrics, search
 
 DB_URL = os.getenv("DB_URL", "sqlite:///data/app.db")
-# For SQLite, need check_same_thread=False when used in threaded servers
-engine = create_engine(
-    DB_URL,
-    connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
-)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Postgres: recycle connections before server or proxy idle timeouts drop them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Plain URLs select the asyncio driver: aiosqlite, or asyncpg for Postgres
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def async_url(url: str) -> str:
+    """``url`` with its sync driver (if any) swapped for the asyncio one."""
+    scheme, sep, rest = url.partition("://")
+    dialect, _, driver = scheme.partition("+")
+    if driver in ("aiosqlite", "asyncpg"):
+        return url
+    return ASYNC_DRIVERS.get(dialect, scheme) + sep + rest
+
+
+if DB_URL.startswith("sqlite"):
+    engine = create_async_engine(
+        async_url(DB_URL),
+        connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000},
+        # Keep connections (each one an aiosqlite thread) open between requests
+        **({} if ":memory:" in DB_URL else {
+            "poolclass": AsyncAdaptedQueuePool, "pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW,
+        }),
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL lets readers run alongside the writer; NORMAL only syncs at checkpoints
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        cur.close()
+else:
+    engine = create_async_engine(
+        async_url(DB_URL),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+metrics.instrument_engine(engine.sync_engine)
 
 _initialized = False
 
-def init_db():
+async def init_db():
+    """Apply pending migrations; called once at startup."""
     global _initialized
     if _initialized:
         return
@@ -20,29 +71,39 @@ def init_db():
     # Ensure the data directory exists for sqlite
     if DB_URL.startswith("sqlite"):
         os.makedirs("data", exist_ok=True)
-    SQLModel.metadata.create_all(engine)
-
-    # Simple migrations for older databases
-    with engine.begin() as conn:
-        inspector = inspect(conn)
-        tables = set(inspector.get_table_names())
-
-        if "chat" in tables:
-            cols = {col["name"] for col in inspector.get_columns("chat")}
-            if "user_id" not in cols:
-                conn.exec_driver_sql(
-                    "ALTER TABLE chat ADD COLUMN user_id TEXT DEFAULT ''"
-                )
-
-        if "imageasset" in tables:
-            cols = {col["name"] for col in inspector.get_columns("imageasset")}
-            if "user_id" not in cols:
-                conn.exec_driver_sql(
-                    "ALTER TABLE imageasset ADD COLUMN user_id TEXT DEFAULT ''"
-                )
-
+    async with engine.connect() as conn:
+        await conn.run_sync(migrations.upgrade)
+        await conn.run_sync(search.detect_fts)
+        await conn.run_sync(_migrate_image_blobs)
     _initialized = True
 
-def get_session() -> Session:
-    init_db()
-    return Session(engine)
+async def close_db():
+    """Close pooled connections (app shutdown); the pool reopens on next use."""
+    await engine.dispose()
+
+def _migrate_image_blobs(conn, batch: int = 50):
+    """Move inline base64 images into the blob store, a batch per transaction."""
+    from .services import blobstore
+
+    while True:
+        rows = conn.execute(
+            text("SELECT id, b64 FROM imageasset WHERE sha256 IS NULL AND b64 != '' LIMIT :n"),
+            {"n": batch},
+        ).fetchall()
+        for image_id, b64 in rows:
+            digest = blobstore.put(base64.b64decode(b64))
+            conn.execute(
+                text("UPDATE imageasset SET sha256 = :sha, b64 = '' WHERE id = :id"),
+                {"sha": digest, "id": image_id},
+            )
+        conn.commit()
+        if len(rows) < batch:
+            return
+
+def get_session() -> AsyncSession:
+    """A new async session: ``async with get_session() as s:``.
+
+    Objects stay usable after commit, so handlers can read them without
+    another round trip.
+    """
+    return AsyncSession(engine, expire_on_commit=False)
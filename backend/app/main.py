@@ -1,7 +1,14 @@
-from fastapi import FastAPI
+from .startup import readiness  # first, so its import time covers the whole app
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import chat, tts, stt, image, books, history, library
-from .db import init_db
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .routers import chat, tts, stt, image, books, history, library, users
+from .db import close_db, init_db
+from .services import audio_cache, gateway, image_jobs, metrics
+from .services.embedding_cache import cache as embedding_cache
+from .services.reply_cache import cache as reply_cache
+from .services.moderation import verdicts as moderation_verdicts
+from .services.write_behind import writer
 import os
 
 app = FastAPI()
@@ -9,8 +16,31 @@ app = FastAPI()
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
 
 @app.on_event("startup")
-def on_startup():
-    init_db()
+async def on_startup():
+    await init_db()
+
+@app.on_event("startup")
+async def start_image_jobs():
+    image_jobs.queue.start()
+
+@app.on_event("startup")
+async def start_prewarm():
+    readiness.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await readiness.stop()
+    await image_jobs.queue.stop()
+    await writer.close()
+    await gateway.aclose()
+    await close_db()
+
+@app.exception_handler(gateway.CircuitOpen)
+async def upstream_unavailable(request: Request, exc: gateway.CircuitOpen):
+    # Fail fast while an upstream is known to be down
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=503, headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,7 +48,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+# Outermost, so request latency includes CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.watch_cache("embeddings", embedding_cache.stats)
+metrics.watch_cache("replies", reply_cache.stats)
+metrics.watch_cache("moderation", moderation_verdicts.stats)
+metrics.watch_cache("tts", audio_cache.stats)
+metrics.watch("ready", "1 once migrations and prewarming are done.", lambda: float(readiness.ready))
+metrics.watch("image_jobs_running", "Image jobs being generated by this process.", lambda: image_jobs.queue.running)
+metrics.watch("write_behind_queued", "Writes waiting in the write-behind queue.", lambda: writer.stats()["queued"])
+metrics.watch("write_behind_jobs_total", "Writes committed by the write-behind queue.",
+              lambda: writer.jobs, kind="counter")
+metrics.watch("write_behind_transactions_total", "Write-behind transactions.",
+              lambda: writer.batches, kind="counter")
 
 app.include_router(chat.router)
 app.include_router(tts.router)
@@ -27,7 +72,31 @@ app.include_router(image.router)
 app.include_router(books.router)
 app.include_router(history.router)
 app.include_router(library.router)
+app.include_router(users.router)
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    return {
+        "status": "ok",
+        "caches": {
+            "embeddings": embedding_cache.stats(),
+            "replies": reply_cache.stats(),
+            "moderation": moderation_verdicts.stats(),
+            "tts": audio_cache.stats(),
+        },
+        "write_behind": writer.stats(),
+        "upstreams": gateway.stats(),
+    }
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until migrations and prewarming are done; reports startup timings."""
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+readiness.imported()
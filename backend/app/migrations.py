@@ -0,0 +1,194 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in its own transaction, and is recorded in the
+``schema_version`` table. The transaction starts by inserting that row, so
+when several workers start together only one applies a migration; the
+others block on the row and then skip it.
+
+Tables are declared here as they were when the migration was written, not
+taken from ``models``, so a fresh database and an upgraded one end up with
+the same schema. Add new migrations at the end of ``MIGRATIONS``; never
+edit one that has shipped.
+
+On SQLite the waiting workers hold off for up to MIGRATION_BUSY_TIMEOUT_MS
+(the FTS rebuild can take longer than the usual busy timeout).
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, inspect, text,
+)
+from sqlalchemy.exc import IntegrityError
+
+from .services import search
+
+log = logging.getLogger(__name__)
+
+MIGRATION_BUSY_TIMEOUT_MS = int(os.getenv("MIGRATION_BUSY_TIMEOUT_MS", str(10 * 60 * 1000)))
+
+_v1 = MetaData()
+_chat = Table(
+    "chat", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", String, nullable=False, index=True),
+    Column("title", String, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Column("updated_at", DateTime, nullable=False, index=True),
+    Column("summary", String, nullable=False),
+    Column("summary_until", Integer, nullable=False),
+    Column("is_book_chat", Boolean, nullable=False),
+    Index("ix_chat_user_updated", "user_id", "updated_at", "id"),
+)
+_message = Table(
+    "message", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chat.id"), nullable=False),
+    Column("role", String, nullable=False),
+    Column("content", String, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Index("ix_message_chat_created", "chat_id", "created_at", "id"),
+)
+_imageasset = Table(
+    "imageasset", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chat.id")),
+    Column("title", String),
+    Column("user_id", String, nullable=False, index=True),
+    Column("sha256", String, index=True),
+    Column("b64", String, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Index("ix_imageasset_user_created", "user_id", "created_at", "id"),
+    Index("ix_imageasset_chat_created", "chat_id", "created_at", "id"),
+)
+_imagejob = Table(
+    "imagejob", _v1,
+    Column("id", String, primary_key=True),
+    Column("user_id", String, nullable=False, index=True),
+    Column("prompt", String, nullable=False),
+    Column("model", String, nullable=False),
+    Column("title", String),
+    Column("chat_id", Integer),
+    Column("dedup_key", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("lease_until", DateTime),
+    Column("image_id", Integer),
+    Column("error", String),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Index("ix_imagejob_status_created", "status", "created_at"),
+    Index(
+        "ux_imagejob_active_key", "dedup_key", unique=True,
+        sqlite_where=text("status IN ('queued', 'running')"),
+        postgresql_where=text("status IN ('queued', 'running')"),
+    ),
+)
+
+# Columns added to tables by the startup patching that predates versioning
+_LEGACY_COLUMNS = {
+    "chat": [
+        ("user_id", "TEXT DEFAULT ''"),
+        ("summary", "TEXT DEFAULT ''"),
+        ("summary_until", "INTEGER DEFAULT 0"),
+        ("is_book_chat", "BOOLEAN DEFAULT FALSE"),
+    ],
+    "imageasset": [("user_id", "TEXT DEFAULT ''"), ("sha256", "TEXT")],
+}
+
+
+def _tables(conn) -> None:
+    """Chats, messages and images; databases from before versioning get their missing columns."""
+    existing = set(inspect(conn).get_table_names())
+    _v1.create_all(conn, tables=[_chat, _message, _imageasset], checkfirst=True)
+    for table, columns in _LEGACY_COLUMNS.items():
+        if table not in existing:
+            continue
+        have = {c["name"] for c in inspect(conn).get_columns(table)}
+        for name, ddl in columns:
+            if name not in have:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+                if name == "is_book_chat":
+                    _backfill_book_flag(conn)
+
+
+def _backfill_book_flag(conn) -> None:
+    """Set chat.is_book_chat for existing chats from their messages."""
+    from .services.context import BOOK_KEYWORDS
+
+    match = " OR ".join(f"lower(m.content) LIKE :k{i}" for i in range(len(BOOK_KEYWORDS)))
+    conn.execute(
+        text(f"UPDATE chat SET is_book_chat = TRUE WHERE EXISTS "
+             f"(SELECT 1 FROM message m WHERE m.chat_id = chat.id AND ({match}))"),
+        {f"k{i}": f"%{k}%" for i, k in enumerate(BOOK_KEYWORDS)},
+    )
+
+
+def _indexes(conn) -> None:
+    """Indexes that tables created before they were declared never got."""
+    for table in (_chat, _message, _imageasset):
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _fts(conn) -> None:
+    if conn.dialect.name == "sqlite":
+        search.install_fts(conn)
+
+
+def _image_jobs(conn) -> None:
+    _v1.create_all(conn, tables=[_imagejob], checkfirst=True)
+
+
+def _image_job_owner(conn) -> None:
+    conn.exec_driver_sql("ALTER TABLE imagejob ADD COLUMN lease_owner VARCHAR")
+
+
+MIGRATIONS: list[tuple[int, str, Callable]] = [
+    (1, "chat, message and image tables", _tables),
+    (2, "timeline and recency indexes", _indexes),
+    (3, "full-text search", _fts),
+    (4, "image jobs", _image_jobs),
+    (5, "image job lease owner", _image_job_owner),
+]
+
+
+def upgrade(conn) -> list[int]:
+    """Apply pending migrations on a (sync) connection; returns the versions applied."""
+    if conn.dialect.name != "sqlite":
+        return _upgrade(conn)
+    busy = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+    conn.exec_driver_sql(f"PRAGMA busy_timeout={MIGRATION_BUSY_TIMEOUT_MS}")
+    try:
+        return _upgrade(conn)
+    finally:
+        conn.exec_driver_sql(f"PRAGMA busy_timeout={int(busy)}")
+
+
+def _upgrade(conn) -> list[int]:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    )
+    conn.commit()
+    done = set(conn.execute(text("SELECT version FROM schema_version")).scalars())
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            # Claims the migration; a concurrent worker waits here, then skips it
+            conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+        except IntegrityError:
+            conn.rollback()
+            continue
+        migrate(conn)
+        conn.commit()
+        log.info("applied migration %d: %s", version, name)
+        applied.append(version)
+    return applied
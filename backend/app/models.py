@@ -1,18 +1,30 @@
 from datetime import datetime
 from typing import Optional
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 
 class Chat(SQLModel, table=True):
+    # Keyset pagination of a user's chats by recency
+    __table_args__ = (Index("ix_chat_user_updated", "user_id", "updated_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)
     title: str = Field(default="New Chat")
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    # Rolling summary of messages up to and including summary_until (a Message.id)
+    summary: str = ""
+    summary_until: int = 0
+    # Set once any turn in the chat was about books; routes later turns to RAG
+    is_book_chat: bool = False
 
     messages: list["Message"] = Relationship(back_populates="chat")
     images: list["ImageAsset"] = Relationship(back_populates="chat")
 
 class Message(SQLModel, table=True):
+    # Chat timeline reads: all of a chat's rows in time order
+    __table_args__ = (Index("ix_message_chat_created", "chat_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chat_id: int = Field(foreign_key="chat.id")
     role: str  # "user" | "assistant"
@@ -22,11 +34,47 @@ class Message(SQLModel, table=True):
     chat: Chat = Relationship(back_populates="messages")
 
 class ImageAsset(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_imageasset_user_created", "user_id", "created_at", "id"),
+        Index("ix_imageasset_chat_created", "chat_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chat_id: Optional[int] = Field(default=None, foreign_key="chat.id")
     title: Optional[str] = Field(default=None)
     user_id: str = Field(index=True)
-    b64: str  # base64 png
+    sha256: Optional[str] = Field(default=None, index=True)  # PNG bytes live in the blob store
+    b64: str = ""  # legacy inline base64 png; emptied by the blob-store migration
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
-    chat: Optional[Chat] = Relationship(back_populates="images")
\ No newline at end of file
+    chat: Optional[Chat] = Relationship(back_populates="images")
+
+class ImageJob(SQLModel, table=True):
+    """A queued image generation; see services/image_jobs.py."""
+
+    __table_args__ = (
+        # Workers claim the oldest queued job first
+        Index("ix_imagejob_status_created", "status", "created_at"),
+        # At most one active job per (user, model, prompt): duplicates coalesce
+        Index(
+            "ux_imagejob_active_key", "dedup_key", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id: str = Field(primary_key=True)
+    user_id: str = Field(index=True)
+    prompt: str
+    model: str
+    title: Optional[str] = None
+    chat_id: Optional[int] = None  # requested chat; the actual one once done
+    dedup_key: str
+    status: str = "queued"  # queued | running | done | failed
+    attempts: int = 0
+    lease_until: Optional[datetime] = None  # a running job past its lease is reclaimed
+    lease_owner: Optional[str] = None  # token of the claim holding the lease
+    image_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
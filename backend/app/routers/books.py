@@ -1,9 +1,32 @@
-from fastapi import APIRouter
-import json, pathlib
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from ..services import similar
+from ..services.catalog import catalog
+from ..services.conditional import etag_matches
 
 router = APIRouter(prefix="", tags=["books"])
-PATH = pathlib.Path(__file__).parents[1] / "data" / "book_summaries.json"
 
 @router.get("/books")
-def books():
-    return json.loads(PATH.read_text(encoding="utf-8"))
+def books(request: Request):
+    """The whole catalog, pre-serialized; supports gzip and If-None-Match."""
+    gz = "gzip" in request.headers.get("accept-encoding", "")
+    body, etag = catalog.payload(gzipped=gz)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(etag, request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+    if gz:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/books/{book_id}/similar")
+def similar_books(book_id: str, k: int = Query(5, ge=1, le=similar.SIMILAR_TOP_N)):
+    """Nearest books by embedding, from the graph precomputed at ingest."""
+    book = catalog.get(book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    items = []
+    for other_id, score in similar.get_graph().neighbors(book_id, k):
+        other = catalog.get(other_id)
+        if other is not None:
+            items.append({"id": other_id, "title": other["title"], "themes": other.get("themes", []), "score": score})
+    return {"id": book_id, "title": book["title"], "similar": items}
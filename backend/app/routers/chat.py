@@ -1,158 +1,239 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional
 from datetime import datetime
-from openai import OpenAI
-import os, json
+import asyncio, os, json, logging, time
+from collections import Counter
+
+import anyio
 
 from sqlmodel import select
-from ..services.rag import retrieve
+from ..services.rag import retrieve, retrieve_similar
+from ..services.catalog import catalog
+from ..services.embeddings import embed_query
+from ..services import gateway, metrics, reply_cache
+from ..services.write_behind import writer
 from ..services.tools import get_summary_by_title
 from ..services.moderation import is_blocked
+from ..services.context import CONTEXT_MAX_MESSAGES, History, asks_for_similar, fit, mentions_books
 from ..db import get_session
 from ..models import Chat, Message
 
 
+log = logging.getLogger(__name__)
+
 router = APIRouter(prefix="", tags=["chat"])
-oai = OpenAI()
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
 
+LIGHT_PROMPT = (
+    "You are Smart Librarian. Engage in brief, friendly conversation. "
+    "Keep replies light, and if the user asks about books you can help with recommendations."
+)
+BOOK_PROMPT = (
+    "You are Smart Librarian, a friendly conversational assistant. Use the provided context from "
+    "a vector search over book blurbs to recommend a single book in a natural tone. "
+    "You may briefly relate to the user's comments before suggesting the book. If you can infer the exact "
+    "title, call the tool get_summary_by_title(title) to append the full summary at the end."
+)
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Smart Librarian, a book "
+    "recommendation assistant. Merge the new messages into the existing summary. Keep the user's "
+    "tastes, books already recommended or discussed, and open questions. At most 120 words."
+)
+TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "get_summary_by_title",
+        "description": "Return full book summary for an exact title.",
+        "parameters": {
+            "type": "object",
+            "properties": {"title": {"type": "string"}},
+            "required": ["title"]
+        }
+    }
+}]
+
 
 class ChatIn(BaseModel):
     message: str
     chat_id: Optional[int] = None
 
 
-@router.post("/chat")
-def chat(body: ChatIn, user_id: str):
-    user_input = (body.message or "").strip()
-    if not user_input:
-        return {"reply": "Please enter a message.", "blocked": False}
+async def _load_history(chat_id: Optional[int], user_id: str) -> History:
+    """The chat's rolling summary, routing flag and the recent messages that fit the token budget."""
+    if not chat_id:
+        return History()
+    await writer.wait(chat_id=chat_id)  # read-your-writes for queued turns
+    async with get_session() as s:
+        chat = (await s.exec(
+            select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id)
+        )).first()
+        if not chat:
+            return History()
+        writer.remember_chat(chat.id, user_id)
+        # Only messages not yet folded into the summary
+        recent = (await s.exec(
+            select(Message)
+            .where(Message.chat_id == chat.id, Message.id > chat.summary_until)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(CONTEXT_MAX_MESSAGES)
+        )).all()
+        recent.reverse()
+        overflow, kept = fit(recent, chat.summary, CHAT_MODEL)
+        # A full window may hide older unsummarized messages (e.g. a long chat from before summaries)
+        return History(
+            kept, overflow, chat.summary, chat.is_book_chat, chat.id,
+            summary_until=chat.summary_until, backlog=len(recent) == CONTEXT_MAX_MESSAGES,
+        )
 
-    # Moderation gate
-    if is_blocked(user_input):
-        return {"reply": "Sorry, I can't help with that.", "blocked": True}
 
-    # Retrieve recent conversation for context (up to 20 messages)
-    history: List[Message] = []
-    if body.chat_id:
-        with get_session() as s:
-            chat = s.exec(
-                select(Chat).where(Chat.id == body.chat_id, Chat.user_id == user_id)
-            ).first()
-            if chat:
-                history = s.exec(
-                    select(Message)
-                    .where(Message.chat_id == chat.id)
-                    .order_by(Message.id.desc())
-                    .limit(20)
-                ).all()
-                history.reverse()
-
-    # Decide whether the user is asking about books (considering prior turns)
-    keywords = ("book", "novel", "read", "recommend", "author", "literature", "story", "title")
-    is_book_request = any(k in user_input.lower() for k in keywords)
-    if not is_book_request:
-        for msg in reversed(history):
-            if any(k in msg.content.lower() for k in keywords):
-                is_book_request = True
-                break
+def _is_book_request(user_input: str, history: History) -> bool:
+    # Decide whether the user is asking about books (the chat's flag covers prior turns)
+    return history.is_book or mentions_books(user_input)
+
 
+def _history_messages(history: History) -> list[dict]:
     messages = []
-    final_reply: str
+    if history.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {history.summary}"})
+    messages.extend({"role": m.role, "content": m.content} for m in history.messages)
+    return messages
+
+
+def _mark(timings: dict, stage: str, start: float) -> None:
+    """Record the time since ``start`` under ``stage``, in ``timings`` (ms) and in the metrics."""
+    seconds = time.perf_counter() - start
+    timings[stage] = round(seconds * 1000, 1)
+    metrics.record_stage(stage, seconds)
+
+
+async def _timed(timings: dict, stage: str, aw):
+    """Await ``aw``, recording its wall time under ``stage``."""
+    start = time.perf_counter()
+    result = await aw
+    _mark(timings, stage, start)
+    return result
+
+
+def _server_timing(timings: dict) -> str:
+    return ", ".join(f"{stage};dur={ms}" for stage, ms in timings.items())
+
+
+def _discard(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()  # mark as retrieved; the result is not needed
+
+
+async def _retrieve(user_input: str) -> tuple[Optional[list], str]:
+    # The reply cache needs the query embedding; otherwise retrieve() may skip it
+    q_emb = await embed_query(user_input) if reply_cache.REPLY_CACHE_ENABLED else None
+    return q_emb, await retrieve(user_input, q_emb=q_emb)
 
-    if not is_book_request:
-        # Light conversation branch
-        system_prompt = (
-            "You are Smart Librarian. Engage in brief, friendly conversation. "
-            "Keep replies light, and if the user asks about books you can help with recommendations."
-        )
-        messages.append({"role": "system", "content": system_prompt})
-        messages.extend({"role": m.role, "content": m.content} for m in history)
-        messages.append({"role": "user", "content": user_input})
-        reply = oai.chat.completions.create(model=CHAT_MODEL, messages=messages)
-        final_reply = reply.choices[0].message.content or ""
-    else:
-        # Retrieve context via RAG for book requests
-        context = retrieve(user_input)
-
-        # System prompt and tool schema for recommendations
-        system_prompt = (
-            "You are Smart Librarian, a friendly conversational assistant. Use the provided context from "
-            "a vector search over book blurbs to recommend a single book in a natural tone. "
-            "You may briefly relate to the user's comments before suggesting the book. If you can infer the exact "
-            "title, call the tool get_summary_by_title(title) to append the full summary at the end."
-        )
-        tools = [{
-            "type": "function",
-            "function": {
-                "name": "get_summary_by_title",
-                "description": "Return full book summary for an exact title.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"title": {"type": "string"}},
-                    "required": ["title"]
-                }
-            }
-        }]
 
+async def _similar_context(user_input: str, history: History) -> Optional[str]:
+    """Graph neighbours of the book the turn names, else of the one the previous reply named."""
+    named = catalog.mentioned(user_input)
+    if not named and history.messages:
+        last = next((m for m in reversed(history.messages) if m.role == "assistant"), None)
+        named = catalog.mentioned(last.content) if last is not None else []
+    if not named:
+        return None
+    # The title mentioned most often; the later one on ties
+    counts = Counter(b["id"] for b in named)
+    return await retrieve_similar(max(reversed(named), key=lambda b: counts[b["id"]]))
+
+
+async def _prepare(
+    user_input: str, chat_id: Optional[int], user_id: str, timings: dict
+) -> Optional[tuple[list, bool, Optional[reply_cache.Probe], History]]:
+    """Run moderation, history load and retrieval concurrently.
+
+    Retrieval starts speculatively whenever the turn could be book-related
+    and is cancelled if moderation blocks it or the history says otherwise.
+    A "more like this" turn waits for the history instead: if the turn, or
+    else the previous reply, names a catalog book, its precomputed
+    neighbours are the context and no embedding or vector query is made.
+    Returns None for blocked input, else the prompt messages, whether the
+    book tools should be offered, a reply-cache probe for cacheable
+    (history-free book) turns, and the loaded history.
+    """
+    moderation = asyncio.create_task(_timed(timings, "moderation", is_blocked(user_input)))
+    history_task = asyncio.create_task(
+        _timed(timings, "history", _load_history(chat_id, user_id))
+    )
+    follow_up = asks_for_similar(user_input)
+    retrieval = None
+    if (chat_id or mentions_books(user_input)) and not follow_up:
+        retrieval = asyncio.create_task(_timed(timings, "retrieval", _retrieve(user_input)))
+    try:
+        if await moderation:
+            return None
+        history = await history_task
+        context = await _timed(timings, "retrieval", _similar_context(user_input, history)) if follow_up else None
+
+        messages = []
+        if context is None and not _is_book_request(user_input, history):
+            # Light conversation branch
+            messages.append({"role": "system", "content": LIGHT_PROMPT})
+            messages.extend(_history_messages(history))
+            messages.append({"role": "user", "content": user_input})
+            return messages, False, None, history
+
+        # Book request: use the retrieved context (RAG)
+        q_emb = None
+        if context is None:
+            if retrieval is None:  # held back for a follow-up the graph could not answer
+                retrieval = asyncio.create_task(_timed(timings, "retrieval", _retrieve(user_input)))
+            q_emb, context = await retrieval
+        probe = None
+        # Graph contexts come without a query embedding, so they are not cached
+        if reply_cache.REPLY_CACHE_ENABLED and q_emb is not None and not (history.messages or history.summary):
+            probe = reply_cache.cache.lookup(CHAT_MODEL, context, q_emb)
         user_input_with_context = f"User question: {user_input}\n\nContext:\n{context}"
 
-        messages.append({"role": "system", "content": system_prompt})
-        messages.extend({"role": m.role, "content": m.content} for m in history)
+        messages.append({"role": "system", "content": BOOK_PROMPT})
+        messages.extend(_history_messages(history))
         messages.append({"role": "user", "content": user_input_with_context})
+        return messages, True, probe, history
+    finally:
+        _discard(moderation)
+        _discard(history_task)
+        _discard(retrieval)
 
-        # First model call (may decide to call tool)
-        first = oai.chat.completions.create(model=CHAT_MODEL, messages=messages, tools=tools)
-        msg = first.choices[0].message
 
-        # If the model decided to call a tool
-        if getattr(msg, "tool_calls", None):
-            # Add the assistant turn with tool calls
-            assistant_msg = {
-                "role": "assistant",
-                "content": msg.content or "",
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        },
-                    }
-                    for tc in msg.tool_calls
-                ],
-            }
-            messages.append(assistant_msg)
-
-            # Execute tools and add tool results
-            for call in msg.tool_calls:
-                try:
-                    args = json.loads(call.function.arguments or "{}")
-                except Exception:
-                    args = {}
-                title = (args or {}).get("title", "") or ""
-                summary = get_summary_by_title(title) if title else "Summary not found."
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": call.id,
-                    "name": "get_summary_by_title",
-                    "content": summary,
-                })
+def _append_tool_turn(messages: list, content: str, tool_calls: list[dict]) -> None:
+    """Add the assistant turn with tool calls, then execute tools and add their results."""
+    with metrics.span("tools"):
+        _run_tools(messages, content, tool_calls)
+
+
+def _run_tools(messages: list, content: str, tool_calls: list[dict]) -> None:
+    messages.append({"role": "assistant", "content": content or "", "tool_calls": tool_calls})
+    for call in tool_calls:
+        try:
+            args = json.loads(call["function"]["arguments"] or "{}")
+        except Exception:
+            args = {}
+        title = (args or {}).get("title", "") or ""
+        summary = get_summary_by_title(title) if title else "Summary not found."
+        messages.append({
+            "role": "tool",
+            "tool_call_id": call["id"],
+            "name": "get_summary_by_title",
+            "content": summary,
+        })
 
-            # Second model call with tool results included
-            final = oai.chat.completions.create(model=CHAT_MODEL, messages=messages)
-            final_reply = final.choices[0].message.content or ""
-        else:
-            # No tool calls → reply directly
-            final_reply = msg.content or ""
 
-    # Persist conversation: create chat if needed, then store messages
-    chat_id = body.chat_id
-    with get_session() as s:
+def _persist_job(chat_id: Optional[int], user_id: str, user_input: str, reply: str):
+    async def job(s) -> int:
+        # Persist conversation: create chat if needed, then store messages
         chat: Optional[Chat] = (
-            s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id)).first()
+            (await s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id))).first()
             if chat_id
             else None
         )
@@ -161,8 +242,7 @@ def chat(body: ChatIn, user_id: str):
             title = user_input[:48] + ("…" if len(user_input) > 48 else "")
             chat = Chat(user_id=user_id, title=title)
             s.add(chat)
-            s.commit()
-            s.refresh(chat)
+            await s.flush()
         else:
             # Update default title on first user message
             if (chat.title or "") == "New Chat":
@@ -170,10 +250,278 @@ def chat(body: ChatIn, user_id: str):
 
         # Store user and assistant messages
         s.add(Message(chat_id=chat.id, role="user", content=user_input))
-        s.add(Message(chat_id=chat.id, role="assistant", content=final_reply))
+        s.add(Message(chat_id=chat.id, role="assistant", content=reply))
+        if not chat.is_book_chat and (mentions_books(user_input) or mentions_books(reply)):
+            chat.is_book_chat = True
         chat.updated_at = datetime.utcnow()
         s.add(chat)
-        s.commit()
-        chat_id = chat.id
+        return chat.id
+
+    return job
+
+
+async def _persist(chat_id: Optional[int], user_id: str, user_input: str, reply: str) -> int:
+    """Queue the turn on the write-behind writer and return its chat id.
+
+    Appends to a chat already verified as the user's are not awaited; a new
+    chat's id is only known once its transaction commits.
+    """
+    fut = writer.submit(_persist_job(chat_id, user_id, user_input, reply), chat_id=chat_id, user_id=user_id)
+    if writer.owns(chat_id, user_id):
+        return chat_id
+    # Shielded: a client disconnect must not cancel the queued write
+    new_id = await asyncio.shield(fut)
+    writer.remember_chat(new_id, user_id)
+    return new_id
+
+
+_summarizing: set[int] = set()
+
+
+def _summarize_later(history: History) -> None:
+    """Fold messages that fell out of the token budget into the chat's summary, off the request path."""
+    if not (history.overflow or history.backlog) or history.chat_id in _summarizing:
+        return
+    _summarizing.add(history.chat_id)
+    task = asyncio.create_task(_update_summary(history))
+    task.add_done_callback(lambda t: _summary_done(history.chat_id, t))
+
 
+def _summary_done(chat_id: int, task: asyncio.Task) -> None:
+    _summarizing.discard(chat_id)
+    if not task.cancelled() and task.exception() is not None:
+        log.error("rolling summary for chat %s failed", chat_id, exc_info=task.exception())
+
+
+async def _update_summary(history: History) -> None:
+    """Fold unsummarized messages older than the kept ones into the summary, oldest first.
+
+    Usually that is just ``history.overflow``. With a backlog, messages are
+    read from ``summary_until`` onwards, CONTEXT_MAX_MESSAGES at a time,
+    until the kept window is reached.
+    """
+    summary, until = history.summary, history.summary_until
+    stop = history.messages[0].id if history.messages else None
+    chunk = await _unsummarized(history.chat_id, until, stop) if history.backlog else history.overflow
+    while chunk:
+        summary = await _fold(summary, chunk)
+        until = chunk[-1].id
+        # Stored chunk by chunk, so an interrupted catch-up resumes where it stopped
+        await writer.submit(_summary_job(history.chat_id, summary, until), chat_id=history.chat_id)
+        chunk = await _unsummarized(history.chat_id, until, stop) if history.backlog else None
+
+
+async def _unsummarized(chat_id: int, after: int, before: Optional[int]) -> list:
+    async with get_session() as s:
+        stmt = select(Message).where(Message.chat_id == chat_id, Message.id > after)
+        if before is not None:
+            stmt = stmt.where(Message.id < before)
+        return (await s.exec(stmt.order_by(Message.id).limit(CONTEXT_MAX_MESSAGES))).all()
+
+
+async def _fold(summary: str, messages: list) -> str:
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in messages)
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {
+            "role": "user",
+            "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}",
+        },
+    ]
+    res = await gateway.call("chat", lambda c: c.chat.completions.create(model=CHAT_MODEL, messages=prompt))
+    metrics.record_usage(CHAT_MODEL, res.usage)
+    return (res.choices[0].message.content or "").strip()
+
+
+def _summary_job(chat_id: int, summary: str, until: int):
+    async def job(s) -> None:
+        chat = await s.get(Chat, chat_id)
+        # Skip if the chat is gone or a newer summary already landed
+        if chat is not None and chat.summary_until < until:
+            chat.summary, chat.summary_until = summary, until
+            s.add(chat)
+
+    return job
+
+
+@router.post("/chat")
+async def chat(body: ChatIn, user_id: str, response: Response):
+    """One chat turn. Per-stage timings are reported in the Server-Timing header."""
+    user_input = (body.message or "").strip()
+    if not user_input:
+        return {"reply": "Please enter a message.", "blocked": False}
+
+    timings: dict = {}
+    # Moderation gate, history and retrieval run concurrently
+    prepared = await _timed(timings, "prepare", _prepare(user_input, body.chat_id, user_id, timings))
+    if prepared is None:
+        response.headers["Server-Timing"] = _server_timing(timings)
+        return {"reply": "Sorry, I can't help with that.", "blocked": True}
+    messages, use_tools, probe, history = prepared
+    llm_start = time.perf_counter()
+
+    if probe and probe.reply:
+        final_reply = probe.reply
+    elif not use_tools:
+        reply = await gateway.call("chat", lambda c: c.chat.completions.create(model=CHAT_MODEL, messages=messages))
+        metrics.record_usage(CHAT_MODEL, reply.usage)
+        final_reply = reply.choices[0].message.content or ""
+    else:
+        # First model call (may decide to call tool)
+        with metrics.span("llm_first"):
+            first = await gateway.call(
+                "chat", lambda c: c.chat.completions.create(model=CHAT_MODEL, messages=messages, tools=TOOLS)
+            )
+        metrics.record_usage(CHAT_MODEL, first.usage)
+        msg = first.choices[0].message
+
+        # If the model decided to call a tool
+        if getattr(msg, "tool_calls", None):
+            tool_calls = [
+                {
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {"name": tc.function.name, "arguments": tc.function.arguments},
+                }
+                for tc in msg.tool_calls
+            ]
+            _append_tool_turn(messages, msg.content, tool_calls)
+
+            # Second model call with tool results included
+            with metrics.span("llm_second"):
+                final = await gateway.call(
+                    "chat", lambda c: c.chat.completions.create(model=CHAT_MODEL, messages=messages)
+                )
+            metrics.record_usage(CHAT_MODEL, final.usage)
+            final_reply = final.choices[0].message.content or ""
+        else:
+            # No tool calls → reply directly
+            final_reply = msg.content or ""
+        if probe:
+            reply_cache.cache.put(probe, final_reply)
+    _mark(timings, "llm", llm_start)
+
+    chat_id = await _timed(
+        timings, "persist", _persist(body.chat_id, user_id, user_input, final_reply)
+    )
+    _summarize_later(history)
+    response.headers["Server-Timing"] = _server_timing(timings)
     return {"reply": final_reply, "blocked": False, "chat_id": chat_id}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_completion(
+    stage: str, messages: list, tools: Optional[list], parts: list[str], tool_calls: list[dict]
+):
+    """Yield content deltas of one streamed completion, timed as ``stage``.
+
+    Content is appended to ``parts`` as it arrives; tool-call fragments are
+    reassembled by index into ``tool_calls``.
+    """
+    kwargs = {"tools": tools} if tools else {}
+    with metrics.span(stage):
+        async with gateway.session("chat") as client:
+            stream = await client.chat.completions.create(
+                model=CHAT_MODEL, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+            )
+            try:
+                async for chunk in stream:
+                    # With include_usage the last chunk carries token counts and no choices
+                    metrics.record_usage(CHAT_MODEL, chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        parts.append(delta.content)
+                        yield delta.content
+                    for tc in delta.tool_calls or []:
+                        while len(tool_calls) <= tc.index:
+                            tool_calls.append({"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                        call = tool_calls[tc.index]
+                        if tc.id:
+                            call["id"] = tc.id
+                        if tc.function and tc.function.name:
+                            call["function"]["name"] += tc.function.name
+                        if tc.function and tc.function.arguments:
+                            call["function"]["arguments"] += tc.function.arguments
+            finally:
+                await stream.close()
+
+
+@router.post("/chat/stream")
+async def chat_stream(body: ChatIn, user_id: str):
+    """Server-Sent Events variant of /chat.
+
+    Emits ``delta`` events with text fragments as they arrive and a final
+    ``done`` event with the same payload /chat returns plus per-stage
+    ``timings`` (milliseconds). Moderation, history and retrieval run
+    before the response starts, so their failures get a normal error status
+    (e.g. 503 while an upstream's circuit is open); a failure once the
+    reply is streaming ends it with an ``error`` event instead of ``done``.
+    The turn is persisted when the stream completes or, with the partial
+    reply, when it fails or the client disconnects.
+    """
+    user_input = (body.message or "").strip()
+    timings: dict = {}
+    prepared = None
+    if user_input:
+        prepared = await _timed(timings, "prepare", _prepare(user_input, body.chat_id, user_id, timings))
+
+    async def events():
+        if not user_input:
+            yield _sse("done", {"reply": "Please enter a message.", "blocked": False})
+            return
+        if prepared is None:
+            yield _sse("done", {"reply": "Sorry, I can't help with that.", "blocked": True, "timings": timings})
+            return
+        messages, use_tools, probe, history = prepared
+        llm_start = time.perf_counter()
+
+        parts: list[str] = []
+        persisted = False
+        try:
+            if probe and probe.reply:
+                parts.append(probe.reply)
+                yield _sse("delta", {"text": probe.reply})
+            else:
+                tool_calls: list[dict] = []
+                async for text in _stream_completion("llm_first", messages, TOOLS if use_tools else None, parts, tool_calls):
+                    yield _sse("delta", {"text": text})
+
+                if tool_calls:
+                    _append_tool_turn(messages, "".join(parts), tool_calls)
+                    async for text in _stream_completion("llm_second", messages, None, parts, []):
+                        yield _sse("delta", {"text": text})
+                if probe:
+                    reply_cache.cache.put(probe, "".join(parts))
+
+            reply = "".join(parts)
+            _mark(timings, "llm", llm_start)
+            persisted = True
+            chat_id = await _timed(
+                timings, "persist", _persist(body.chat_id, user_id, user_input, reply)
+            )
+            _summarize_later(history)
+            yield _sse("done", {"reply": reply, "blocked": False, "chat_id": chat_id, "timings": timings})
+        except Exception as e:
+            # The 200 is already sent: report the failure in-band
+            log.warning("chat stream failed: %r", e)
+            retry_after = getattr(e, "retry_after", None)
+            yield _sse("error", {
+                "detail": str(e) if isinstance(e, gateway.CircuitOpen) else "The reply failed; please try again.",
+                **({"retry_after": round(retry_after)} if retry_after is not None else {}),
+            })
+        finally:
+            # Client went away (or upstream failed) mid-stream: keep what was produced
+            if not persisted:
+                with anyio.CancelScope(shield=True):
+                    await _persist(body.chat_id, user_id, user_input, "".join(parts))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,27 +1,47 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Response
+from sqlalchemy import literal, tuple_, union_all
+from sqlalchemy import select as sa_select
 from sqlmodel import select, delete
 from ..db import get_session
 from ..models import Chat, Message, ImageAsset
+from ..services import blobstore, search
+from ..services.pagination import before, decode_cursor, encode_cursor
+from ..services.write_behind import writer
 
 router = APIRouter(prefix="", tags=["history"]) 
 
 @router.post("/chats")
-def create_chat(user_id: str, title: str | None = None):
-    with get_session() as s:
+async def create_chat(user_id: str, title: str | None = None):
+    async with get_session() as s:
         chat = Chat(user_id=user_id, title=title or "New Chat")
         s.add(chat)
-        s.commit()
-        s.refresh(chat)
+        await s.commit()
+        writer.remember_chat(chat.id, user_id)
         return {"id": chat.id, "title": chat.title, "created_at": chat.created_at}
 
 @router.get("/chats")
-def list_chats(user_id: str, q: str | None = Query(None)):
-    with get_session() as s:
-        stmt = select(Chat).where(Chat.user_id == user_id).order_by(Chat.updated_at.desc())
-        chats = s.exec(stmt).all()
-        def matches(c: Chat):
-            if not q: return True
-            return q.lower() in (c.title or "").lower()
+async def list_chats(
+    response: Response,
+    user_id: str,
+    q: str | None = Query(None),
+    messages: bool = False,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Most recently updated chats first; the next page's cursor is sent in X-Next-Cursor."""
+    await writer.wait(user_id=user_id)
+    async with get_session() as s:
+        stmt = select(Chat).where(Chat.user_id == user_id)
+        match = search.chat_filter(q, include_messages=messages)
+        if match is not None:
+            stmt = stmt.where(match)
+        after = decode_cursor(cursor)
+        if after:
+            stmt = stmt.where(before(Chat.updated_at, Chat.id, after))
+        chats = (await s.exec(stmt.order_by(Chat.updated_at.desc(), Chat.id.desc()).limit(limit + 1))).all()
+        if len(chats) > limit:
+            chats = chats[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(chats[-1].updated_at, chats[-1].id)
         return [
             {
                 "id": c.id,
@@ -29,54 +49,95 @@ def list_chats(user_id: str, q: str | None = Query(None)):
                 "created_at": c.created_at.isoformat(),
                 "updated_at": c.updated_at.isoformat(),
             }
-            for c in chats if matches(c)
+            for c in chats
         ]
 
 @router.get("/chats/{chat_id}")
-def get_chat(chat_id: int, user_id: str):
-    with get_session() as s:
-        chat = s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id)).first()
+async def get_chat(
+    chat_id: int,
+    user_id: str,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=500),
+):
+    """One page of a chat's timeline (messages and images), oldest first.
+
+    The first page holds the newest entries; pass ``next_cursor`` back as
+    ``cursor`` to load older ones.
+    """
+    await writer.wait(chat_id=chat_id)
+    async with get_session() as s:
+        chat = (await s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id))).first()
         if not chat:
-            return {"id": chat_id, "messages": []}
-        msgs = s.exec(
-            select(Message).where(Message.chat_id == chat_id).order_by(Message.created_at.asc())
-        ).all()
-        imgs = s.exec(
-            select(ImageAsset).where(ImageAsset.chat_id == chat_id).order_by(ImageAsset.created_at.asc())
-        ).all()
+            return {"id": chat_id, "messages": [], "next_cursor": None}
 
-        combined = [
-            {
-                "role": m.role,
-                "content": m.content,
-                "created_at": m.created_at.isoformat(),
-            }
-            for m in msgs
-        ] + [
-            {
-                "role": "assistant",
-                "content": "",
-                "image_b64": i.b64,
-                "created_at": i.created_at.isoformat(),
-            }
-            for i in imgs
-        ]
-        combined.sort(key=lambda x: x["created_at"])
+        # Merge both tables in SQL, ordered by (created_at, kind, id); each
+        # branch is an index range scan on (chat_id, created_at, id)
+        timeline = union_all(
+            select(
+                Message.created_at.label("created_at"),
+                literal(0).label("kind"),
+                Message.id.label("id"),
+                Message.role.label("role"),
+                Message.content.label("content"),
+            ).where(Message.chat_id == chat_id),
+            select(
+                ImageAsset.created_at,
+                literal(1),
+                ImageAsset.id,
+                literal("assistant"),
+                literal(""),
+            ).where(ImageAsset.chat_id == chat_id),
+        ).subquery()
+        stmt = sa_select(timeline)  # plain select: rows, not scalars
+        older_than = decode_cursor(cursor, keys=2)
+        if older_than:
+            stmt = stmt.where(
+                tuple_(timeline.c.created_at, timeline.c.kind, timeline.c.id) < tuple_(*older_than)
+            )
+        rows = (await s.exec(
+            stmt.order_by(timeline.c.created_at.desc(), timeline.c.kind.desc(), timeline.c.id.desc())
+            .limit(limit + 1)
+        )).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.created_at, last.kind, last.id)
 
         return {
             "id": chat.id,
             "title": chat.title,
-            "messages": combined,
+            "messages": [
+                _image_entry(r, user_id) if r.kind else
+                {"role": r.role, "content": r.content, "created_at": r.created_at.isoformat()}
+                for r in reversed(rows)
+            ],
+            "next_cursor": next_cursor,
         }
 
+def _image_entry(i, user_id: str) -> dict:
+    urls = blobstore.image_urls(i.id, user_id)
+    return {
+        "role": "assistant",
+        "content": "",
+        "image_id": i.id,
+        "image_url": urls["url"],
+        "thumb_url": urls["thumb_url"],
+        "created_at": i.created_at.isoformat(),
+    }
+
 @router.delete("/chats/{chat_id}")
-def delete_chat(chat_id: int, user_id: str):
-    with get_session() as s:
-        chat = s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id)).first()
+async def delete_chat(chat_id: int, user_id: str):
+    # Let queued appends land first so they are deleted too
+    await writer.wait(chat_id=chat_id)
+    writer.forget_chat(chat_id)
+    async with get_session() as s:
+        chat = (await s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id))).first()
         if not chat:
             return {"ok": True}
-        s.exec(delete(Message).where(Message.chat_id == chat_id))
-        s.exec(delete(ImageAsset).where(ImageAsset.chat_id == chat_id))
-        s.delete(chat)
-        s.commit()
+        await s.exec(delete(Message).where(Message.chat_id == chat_id))
+        await s.exec(delete(ImageAsset).where(ImageAsset.chat_id == chat_id))
+        await s.delete(chat)
+        await s.commit()
         return {"ok": True}
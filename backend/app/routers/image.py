@@ -1,56 +1,73 @@
 from __future__ import annotations
 
-import os
-from datetime import datetime
+import json
 from typing import Optional
+from urllib.parse import quote
 
-from fastapi import APIRouter, Query
-from openai import OpenAI
-import os
-from typing import Optional
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-from sqlmodel import select
-from ..db import get_session
-from ..models import ImageAsset, Chat
+from ..services import blobstore, image_jobs
 
 router = APIRouter(prefix="", tags=["image"])
 
+
+class ImageJobIn(BaseModel):
+    prompt: str = Field(..., min_length=4)
+    chat_id: Optional[int] = None
+    title: Optional[str] = None
+
+
+@router.post("/image/jobs", status_code=202)
+async def create_image_job(body: ImageJobIn, user_id: str, response: Response):
+    """Queue a generation and return the job at once.
+
+    An identical (user, model, prompt) job still in flight is returned instead
+    of starting another; ``coalesced`` is then true.
+    """
+    job, created = await image_jobs.queue.submit(user_id, body.prompt, body.chat_id, body.title)
+    response.headers["Location"] = f"/image/jobs/{job.id}?user_id={quote(user_id)}"
+    return {**image_jobs.to_dict(job), "coalesced": not created}
+
+
+@router.get("/image/jobs/{job_id}")
+async def get_image_job(job_id: str, user_id: str):
+    job = await image_jobs.queue.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return image_jobs.to_dict(job)
+
+
+@router.get("/image/jobs/{job_id}/events")
+async def image_job_events(job_id: str, user_id: str):
+    """Server-Sent Events: a ``status`` event per change, ending with ``done`` or ``failed``."""
+    if await image_jobs.queue.get(job_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in image_jobs.queue.watch(job_id, user_id):
+            event = job.status if job.status in image_jobs.TERMINAL else "status"
+            yield f"event: {event}\ndata: {json.dumps(image_jobs.to_dict(job))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/image")
-def gen_image(
+async def gen_image(
     prompt: str = Query(..., min_length=4),
     chat_id: Optional[int] = None,
     title: Optional[str] = None,
     user_id: str = Query(...),
 ):
-    client = OpenAI()
-    model = os.getenv("IMAGE_MODEL", "gpt-image-1")
-
-    res = client.images.generate(model=model, prompt=prompt, size="1024x1024")
-    b64 = res.data[0].b64_json
-
-    # Persist chat and generated image
-    with get_session() as s:
-        chat = (
-            s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id)).first()
-            if chat_id
-            else None
-        )
-        if chat is None:
-            title_text = title or prompt[:48] + ("…" if len(prompt) > 48 else "")
-            chat = Chat(user_id=user_id, title=title_text)
-            s.add(chat)
-            s.commit()
-            s.refresh(chat)
-        else:
-            if (chat.title or "") == "New Chat":
-                chat.title = prompt[:48] + ("…" if len(prompt) > 48 else "")
-
-        asset = ImageAsset(chat_id=chat.id, user_id=user_id, title=title or prompt[:64], b64=b64)
-        s.add(asset)
-        chat.updated_at = datetime.utcnow()
-        s.add(chat)
-        s.commit()
-        s.refresh(asset)
-
-        return {"image_b64": b64, "id": asset.id, "chat_id": chat.id}
+    """Generate and wait for the result (a job like POST /image/jobs, so retries coalesce)."""
+    job, _ = await image_jobs.queue.submit(user_id, prompt, chat_id, title)
+    async for job in image_jobs.queue.watch(job.id, user_id):
+        pass
+    if job.status != "done":
+        raise HTTPException(status_code=502, detail=job.error or "Image generation failed")
+    return {"id": job.image_id, "chat_id": job.chat_id, **blobstore.image_urls(job.image_id, user_id)}
@@ -1,20 +1,96 @@
-from fastapi import APIRouter, Query
+import re
+
+from fastapi import APIRouter, Query, Request, Response
+from fastapi.responses import FileResponse
 from sqlmodel import select
 from ..db import get_session
 from ..models import ImageAsset
+from ..services import blobstore
+from ..services.concurrency import run_blocking
+from ..services.conditional import etag_matches
+from ..services.pagination import before, decode_cursor, encode_cursor
+from ..services.write_behind import writer
+
+router = APIRouter(prefix="", tags=["library"])
 
-router = APIRouter(prefix="", tags=["library"]) 
+# Blobs are content-addressed, so a given URL never changes content
+CACHE_CONTROL = "private, max-age=31536000, immutable"
 
 @router.get("/images")
-def list_images(user_id: str, limit: int = Query(100, ge=1, le=500)):
-    with get_session() as s:
-        imgs = s.exec(
-            select(ImageAsset)
-            .where(ImageAsset.user_id == user_id)
-            .order_by(ImageAsset.created_at.desc())
-            .limit(limit)
-        ).all()
+async def list_images(
+    response: Response,
+    user_id: str,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=500),
+):
+    """Newest images first; the next page's cursor is sent in X-Next-Cursor."""
+    await writer.wait(user_id=user_id)
+    async with get_session() as s:
+        stmt = select(ImageAsset).where(ImageAsset.user_id == user_id)
+        after = decode_cursor(cursor)
+        if after:
+            stmt = stmt.where(before(ImageAsset.created_at, ImageAsset.id, after))
+        imgs = (await s.exec(
+            stmt.order_by(ImageAsset.created_at.desc(), ImageAsset.id.desc()).limit(limit + 1)
+        )).all()
+        if len(imgs) > limit:
+            imgs = imgs[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(imgs[-1].created_at, imgs[-1].id)
         return [
-            {"id": im.id, "chat_id": im.chat_id, "title": im.title, "b64": im.b64, "created_at": im.created_at.isoformat()}
+            {
+                "id": im.id,
+                "chat_id": im.chat_id,
+                "title": im.title,
+                "created_at": im.created_at.isoformat(),
+                **blobstore.image_urls(im.id, user_id),
+            }
             for im in imgs
-        ]
\ No newline at end of file
+        ]
+
+@router.get("/images/{image_id}")
+async def get_image(image_id: int, user_id: str, request: Request, thumb: bool = False):
+    async with get_session() as s:
+        im = (await s.exec(
+            select(ImageAsset).where(ImageAsset.id == image_id, ImageAsset.user_id == user_id)
+        )).first()
+    if not im or not blobstore.is_digest(im.sha256):
+        return Response(status_code=404)
+
+    # Thumbnails are rendered on first request
+    path = await run_blocking(blobstore.thumbnail_path, im.sha256) if thumb else None
+    etag = f'"{im.sha256}-t"' if path else f'"{im.sha256}"'
+    path = path or blobstore.blob_path(im.sha256)
+    size = await run_blocking(_size, path)
+    if size is None:
+        return Response(status_code=404)
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag_matches(etag, request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("range", "").strip())
+    if m and (m.group(1) or m.group(2)):
+        if m.group(1):
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(size - int(m.group(2)), 0), size - 1
+        if start > end or start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        data = await run_blocking(_read_range, path, start, end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=data, status_code=206, media_type="image/png", headers=headers)
+
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+def _size(path) -> int | None:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return None
+
+def _read_range(path, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
@@ -1,24 +1,168 @@
-from fastapi import APIRouter, UploadFile, File
-from openai import OpenAI
-import tempfile, pathlib, os
+import asyncio
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from ..services import gateway
+from ..services.concurrency import run_blocking
 
 router = APIRouter(prefix="", tags=["stt"])
-oai = OpenAI()
+log = logging.getLogger(__name__)
 STT_MODEL = os.getenv("STT_MODEL", "whisper-1")
 
+# Upload bounds (STT_MAX_SECONDS 0: no length limit); longer recordings are
+# cut into segments transcribed in parallel (at most STT_CONCURRENCY at a time).
+STT_MAX_BYTES = int(os.getenv("STT_MAX_BYTES", str(25 * 1024 * 1024)))
+STT_MAX_SECONDS = float(os.getenv("STT_MAX_SECONDS", "1800"))
+STT_SEGMENT_SECONDS = float(os.getenv("STT_SEGMENT_SECONDS", "300"))
+CHUNK = 64 * 1024
+
+
+async def _bounded(request: Request):
+    """Yield the request body, failing with 413 as soon as it exceeds STT_MAX_BYTES."""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > STT_MAX_BYTES + CHUNK:  # slack for multipart framing
+            raise HTTPException(status_code=413, detail="Upload too large.")
+        yield chunk
+
+
+async def _read_upload(request: Request) -> UploadFile:
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > STT_MAX_BYTES + CHUNK:
+        raise HTTPException(status_code=413, detail="Upload too large.")
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=422, detail="Expected multipart/form-data with a 'file' field.")
+    # Parts are spooled to disk by the parser, so memory stays bounded
+    try:
+        form = await MultiPartParser(request.headers, _bounded(request), max_files=1, max_fields=10).parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        raise HTTPException(status_code=422, detail="Missing 'file' field.")
+    return file
+
+
+def _save(file: UploadFile, dest: pathlib.Path) -> None:
+    file.file.seek(0)
+    with open(dest, "wb") as out:
+        shutil.copyfileobj(file.file, out, CHUNK)
+
+
+async def _run(*cmd: str) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    out, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{cmd[0]} exited with {proc.returncode}")
+    return out
+
+
+async def _duration(path: pathlib.Path) -> float:
+    """Recording length in seconds, from the container header or else by decoding."""
+    out = await _run(
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", str(path),
+    )
+    try:
+        seconds = float(out.strip())
+    except ValueError:
+        seconds = 0.0
+    if seconds > 0:
+        return seconds
+    # No duration header (e.g. MediaRecorder webm): decode to find out,
+    # stopping just past the longest length that matters
+    return await _decoded_seconds(path, (STT_MAX_SECONDS or STT_SEGMENT_SECONDS) + 1)
+
+
+async def _decoded_seconds(path: pathlib.Path, limit: float) -> float:
+    out = await _run(
+        "ffmpeg", "-v", "error", "-nostats", "-progress", "pipe:1",
+        "-i", str(path), "-vn", "-t", str(limit), "-f", "null", "-",
+    )
+    seconds = 0.0
+    for line in out.decode("ascii", "replace").splitlines():
+        key, _, value = line.partition("=")
+        if key == "out_time_us" and value.strip().isdigit():
+            seconds = max(seconds, int(value) / 1_000_000)
+    return seconds
+
+
+async def _segments(path: pathlib.Path, suffix: str) -> list[pathlib.Path]:
+    pattern = path.parent / f"seg%04d{suffix}"
+    await _run(
+        "ffmpeg", "-v", "error", "-i", str(path), "-vn", "-c", "copy",
+        "-f", "segment", "-segment_time", str(STT_SEGMENT_SECONDS), "-reset_timestamps", "1",
+        str(pattern),
+    )
+    return sorted(path.parent.glob(f"seg*{suffix}"))
+
+
+async def _transcribe(name: str, data: bytes) -> str:
+    transcript = await gateway.call("stt", lambda c: c.audio.transcriptions.create(model=STT_MODEL, file=(name, data)))
+    return (transcript.text or "").strip()
+
+
+_warned = False
+
+
+def _warn_no_tooling() -> None:
+    global _warned
+    _warned = True
+    log.warning("ffmpeg/ffprobe not on PATH: STT_MAX_SECONDS is not enforced and uploads are not split")
+
+
 @router.post("/stt")
-async def stt(file: UploadFile = File(...)):
-    # Save to a temporary file, then pass a file handle to the API
+async def stt(request: Request):
+    """Transcribe a multipart upload (field ``file``).
+
+    Uploads above STT_MAX_BYTES or STT_MAX_SECONDS are rejected with 413.
+    Recordings longer than STT_SEGMENT_SECONDS are split and the segments
+    transcribed concurrently, then joined in order. Checking the length and
+    splitting need ffmpeg and ffprobe; without them the upload goes upstream
+    as a single request, bounded by STT_MAX_BYTES only.
+    """
+    file = await _read_upload(request)
     suffix = ".webm"
     if file.filename and "." in file.filename:
         suffix = "." + file.filename.rsplit(".", 1)[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
-    with open(tmp_path, "rb") as fh:
-        transcript = oai.audio.transcriptions.create(model=STT_MODEL, file=fh)
+
     try:
-        pathlib.Path(tmp_path).unlink(missing_ok=True)
-    except Exception:
-        pass
-    return {"text": transcript.text}
+        if not (shutil.which("ffprobe") and shutil.which("ffmpeg")):
+            if not _warned:
+                _warn_no_tooling()
+            file.file.seek(0)
+            data = await run_blocking(file.file.read)
+            return {"text": await _transcribe(f"audio{suffix}", data)}
+
+        workdir = pathlib.Path(await run_blocking(tempfile.mkdtemp, prefix="stt-"))
+        try:
+            src = workdir / f"input{suffix}"
+            await run_blocking(_save, file, src)
+            try:
+                seconds = await _duration(src)
+            except RuntimeError:
+                raise HTTPException(status_code=400, detail="Could not read the recording.")
+            if STT_MAX_SECONDS and seconds > STT_MAX_SECONDS:
+                raise HTTPException(status_code=413, detail="Recording too long.")
+            parts = [src]
+            if seconds > STT_SEGMENT_SECONDS:
+                parts = await _segments(src, suffix) or [src]
+            payloads = [await run_blocking(p.read_bytes) for p in parts]
+            texts = await asyncio.gather(
+                *(_transcribe(f"part{i}{suffix}", data) for i, data in enumerate(payloads))
+            )
+            return {"text": " ".join(t for t in texts if t)}
+        finally:
+            await run_blocking(shutil.rmtree, workdir, ignore_errors=True)
+    finally:
+        await file.close()
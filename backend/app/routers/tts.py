@@ -1,45 +1,72 @@
 # backend/app/routers/tts.py
+from contextlib import AsyncExitStack
+from typing import Optional
+
 from fastapi import APIRouter, Query, Response
-from openai import OpenAI
-import tempfile, pathlib, os
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import os
+
+from ..services import audio_cache, gateway
+from ..services.concurrency import run_blocking
 
 router = APIRouter(prefix="", tags=["tts"])
-oai = OpenAI()
 TTS_MODEL = os.getenv("TTS_MODEL", "gpt-4o-mini-tts")
+TTS_VOICE = os.getenv("TTS_VOICE", "alloy")
+
+async def _close(stack: AsyncExitStack, exc: Optional[BaseException] = None) -> None:
+    """Unwind ``stack``, passing ``exc`` in so the gateway session records the failure."""
+    if exc is None:
+        await stack.aclose()
+        return
+    try:
+        await stack.__aexit__(type(exc), exc, exc.__traceback__)
+    except BaseException as e:
+        if e is not exc:
+            raise
+
 
 @router.get("/tts")
-def tts(text: str = Query(..., min_length=1)):
-    # Try the streaming API first (most compatible)
+async def tts(text: str = Query(..., min_length=1)):
+    key = audio_cache.cache_key(TTS_MODEL, TTS_VOICE, text)
+    cached = await run_blocking(audio_cache.lookup, key)
+    if cached:
+        return FileResponse(cached, media_type="audio/mpeg", headers={"X-Cache": "hit"})
+
+    # Open the upstream stream before responding so failures still map to a 500
+    stack = AsyncExitStack()
     try:
-        with oai.audio.speech.with_streaming_response.create(
-            model=TTS_MODEL,
-            voice="alloy",
-            input=text,
-        ) as resp:
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-                resp.stream_to_file(f.name)
-                path = f.name
-        data = pathlib.Path(path).read_bytes()
-        try:
-            pathlib.Path(path).unlink(missing_ok=True)
-        except Exception:
-            pass
-        return Response(content=data, media_type="audio/mpeg")
-    except TypeError:
-        # Fallback for clients that prefer non-streaming create()
-        try:
-            # Returns a binary response; read its bytes
-            bin_resp = oai.audio.speech.create(
+        client = await stack.enter_async_context(gateway.session("tts"))
+        resp = await stack.enter_async_context(
+            client.audio.speech.with_streaming_response.create(
                 model=TTS_MODEL,
-                voice="alloy",
+                voice=TTS_VOICE,
                 input=text,
+                response_format="mp3",
             )
-            # Newer clients: .content; older: .read()
-            data = getattr(bin_resp, "content", None)
-            if data is None and hasattr(bin_resp, "read"):
-                data = bin_resp.read()
-            if data is None:
-                return Response(content=b"TTS failed: empty audio.", status_code=500, media_type="text/plain")
-            return Response(content=data, media_type="audio/mpeg")
-        except Exception as e2:
-            return Response(content=f"TTS failed: {e2}".encode("utf-8"), status_code=500, media_type="text/plain")
+        )
+    except Exception as e:
+        await _close(stack, e)
+        return Response(content=f"TTS failed: {e}".encode("utf-8"), status_code=500, media_type="text/plain")
+
+    async def audio():
+        # Chunks go to the client as they arrive and into the cache alongside
+        writer = await run_blocking(audio_cache.CacheWriter, key)
+        error = None
+        try:
+            async for chunk in resp.iter_bytes():
+                await run_blocking(writer.write, chunk)
+                yield chunk
+            await run_blocking(writer.commit)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            await run_blocking(writer.abort)
+            await _close(stack, error)
+
+    # The background task closes the upstream if the client goes away before
+    # the body is iterated (a no-op once audio() has closed it)
+    return StreamingResponse(
+        audio(), media_type="audio/mpeg", headers={"X-Cache": "miss"}, background=BackgroundTask(_close, stack)
+    )
@@ -0,0 +1,37 @@
+import re
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..services import transfer
+from ..services.write_behind import writer
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+
+@router.get("/{user_id}/export")
+async def export_user(user_id: str, gzip: bool = False):
+    """Stream the user's chats, messages and image references as NDJSON (gzip-compressed with ``gzip=true``)."""
+    await writer.wait(user_id=user_id)
+    name = re.sub(r"[^\w.-]", "_", user_id) + ".ndjson"
+    body = transfer.export_lines(user_id)
+    if gzip:
+        body, name = transfer.gzipped(body), name + ".gz"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
+@router.post("/{user_id}/import")
+async def import_user(user_id: str, request: Request):
+    """Add an export (NDJSON body, plain or gzip) to the user's account; items get new ids.
+
+    Rows are committed in batches: on a malformed line the response is 400
+    and ``imported`` counts what was stored before it.
+    """
+    try:
+        return await transfer.import_lines(user_id, transfer.read_lines(request.stream()))
+    except transfer.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "imported": e.counts})
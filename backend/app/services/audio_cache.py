@@ -0,0 +1,115 @@
+import hashlib
+import os
+import pathlib
+import threading
+import uuid
+from typing import Optional
+
+# Synthesized speech keyed on (model, voice, text). Files are touched on
+# every hit and the least recently used ones are evicted once the directory
+# grows past TTS_CACHE_MAX_BYTES (0 disables the cache).
+TTS_CACHE_DIR = pathlib.Path(os.getenv("TTS_CACHE_DIR", "data/tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_total: Optional[int] = None  # bytes on disk, computed lazily
+hits = misses = 0
+
+
+def cache_key(model: str, voice: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> pathlib.Path:
+    return TTS_CACHE_DIR / key[:2] / f"{key}.mp3"
+
+
+def lookup(key: str) -> Optional[pathlib.Path]:
+    """Return the cached file for ``key`` (marking it recently used), or None."""
+    global hits, misses
+    if TTS_CACHE_MAX_BYTES <= 0:
+        return None
+    path = _path(key)
+    try:
+        os.utime(path)
+    except OSError:
+        misses += 1
+        return None
+    hits += 1
+    return path
+
+
+def stats() -> dict:
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+class CacheWriter:
+    """Accumulates a response on disk as it streams; only a complete file becomes visible.
+
+    Every method does file I/O: call them (and the constructor) through ``run_blocking``.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.enabled = TTS_CACHE_MAX_BYTES > 0
+        self._tmp: Optional[pathlib.Path] = None
+        self._fh = None
+        if self.enabled:
+            final = _path(key)
+            final.parent.mkdir(parents=True, exist_ok=True)
+            self._tmp = final.with_name(f".{final.name}.{uuid.uuid4().hex}.part")
+            self._fh = open(self._tmp, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        if self._fh:
+            self._fh.write(chunk)
+
+    def commit(self) -> None:
+        if not self._fh:
+            return
+        self._fh.close()
+        self._fh = None
+        size = self._tmp.stat().st_size
+        os.replace(self._tmp, _path(self.key))
+        self._tmp = None
+        _account(size)
+
+    def abort(self) -> None:
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        if self._tmp:
+            self._tmp.unlink(missing_ok=True)
+            self._tmp = None
+
+
+def _scan() -> list[tuple[float, int, pathlib.Path]]:
+    entries = []
+    for p in TTS_CACHE_DIR.glob("*/*.mp3"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    return entries
+
+
+def _account(added: int) -> None:
+    global _total
+    with _lock:
+        if _total is None:
+            _total = sum(size for _, size, _ in _scan())
+        else:
+            _total += added
+        if _total <= TTS_CACHE_MAX_BYTES:
+            return
+        # Evict least recently used files down to 90% of the budget
+        entries = sorted(_scan())
+        _total = sum(size for _, size, _ in entries)
+        target = int(TTS_CACHE_MAX_BYTES * 0.9)
+        for _, size, p in entries:
+            if _total <= target:
+                break
+            p.unlink(missing_ok=True)
+            _total -= size
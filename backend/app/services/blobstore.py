@@ -0,0 +1,81 @@
+import hashlib
+import io
+import os
+import pathlib
+import re
+import tempfile
+from typing import Optional
+from urllib.parse import quote
+
+# Content-addressed store for generated images: one file per distinct
+# payload, named by its SHA-256, so identical images are stored once.
+BLOB_DIR = pathlib.Path(os.getenv("BLOB_DIR", "data/blobs"))
+THUMB_SIZE = int(os.getenv("THUMB_SIZE", "256"))
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+def image_urls(image_id: int, user_id: str) -> dict:
+    """API paths (relative to the backend base URL) for an ImageAsset and its thumbnail."""
+    url = f"/images/{image_id}?user_id={quote(user_id)}"
+    return {"url": url, "thumb_url": url + "&thumb=1"}
+
+
+def is_digest(value) -> bool:
+    """Whether ``value`` is a lowercase hex SHA-256, the only form a blob name takes."""
+    return isinstance(value, str) and _DIGEST.fullmatch(value) is not None
+
+
+def blob_path(digest: str) -> pathlib.Path:
+    # Digests come from the database and imports: never let one name a path outside BLOB_DIR
+    if not is_digest(digest):
+        raise ValueError(f"not a SHA-256 hex digest: {digest!r}")
+    return BLOB_DIR / digest[:2] / digest
+
+
+def exists(digest: str) -> bool:
+    return is_digest(digest) and blob_path(digest).is_file()
+
+
+def _write_atomic(path: pathlib.Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        pathlib.Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def put(data: bytes) -> str:
+    """Store ``data`` (if not already present) and return its SHA-256 hex digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if not path.exists():
+        _write_atomic(path, data)
+    return digest
+
+
+def thumbnail_path(digest: str, size: int = THUMB_SIZE) -> Optional[pathlib.Path]:
+    """Return a PNG thumbnail (longest side ``size``) for a stored image, creating it on first use.
+
+    Returns None when the source blob is missing or Pillow is not installed.
+    """
+    src = blob_path(digest)
+    if not src.is_file():
+        return None
+    dst = BLOB_DIR / "thumbs" / str(size) / digest[:2] / f"{digest}.png"
+    if dst.exists():
+        return dst
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    with Image.open(src) as im:
+        im.thumbnail((size, size))
+        buf = io.BytesIO()
+        im.save(buf, format="PNG", optimize=True)
+    _write_atomic(dst, buf.getvalue())
+    return dst
@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import os
+import pathlib
+import re
+import threading
+import time
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Optional
+
+import orjson
+
+from .lexical import STOPWORDS
+
+# The book catalog, loaded once per process and reloaded when the file's
+# mtime changes (checked at most every CATALOG_RELOAD_INTERVAL seconds).
+CATALOG_PATH = pathlib.Path(
+    os.getenv("CATALOG_PATH", pathlib.Path(__file__).parents[1] / "data" / "book_summaries.json")
+)
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "2"))
+# Minimum similarity (0..1) for a fuzzy title match
+FUZZY_THRESHOLD = float(os.getenv("CATALOG_FUZZY_THRESHOLD", "0.6"))
+
+_PUNCT = re.compile(r"[\W_]+")
+_ARTICLES = ("the ", "a ", "an ")
+
+
+def normalize_title(title: str) -> str:
+    """Casefold, strip accents and punctuation, and drop a leading article."""
+    t = unicodedata.normalize("NFKD", title or "")
+    t = "".join(ch for ch in t if not unicodedata.combining(ch)).casefold()
+    t = _PUNCT.sub(" ", t).strip()
+    for article in _ARTICLES:
+        if t.startswith(article) and len(t) > len(article):
+            return t[len(article):]
+    return t
+
+
+def _trigrams(s: str) -> set[str]:
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class Catalog:
+    def __init__(self, path: pathlib.Path = CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked = float("-inf")
+        self._load(None)
+
+    def _load(self, mtime: Optional[float]) -> None:
+        books = orjson.loads(self.path.read_bytes()) if mtime is not None else []
+        by_norm: dict[str, dict] = {}
+        grams: dict[str, set[int]] = {}
+        for i, b in enumerate(books):
+            norm = normalize_title(b["title"])
+            by_norm.setdefault(norm, b)
+            for g in _trigrams(norm):
+                grams.setdefault(g, set()).add(i)
+        # Titles to spot in free text; all-stopword titles ("It") would match everywhere
+        spotted = sorted(
+            {n for n in by_norm if n and not set(n.split()) <= STOPWORDS}, key=len, reverse=True
+        )
+        payload = orjson.dumps(books)
+        digest = hashlib.sha256(payload).hexdigest()[:32]
+        # Swap everything at once so readers never see a half-built index
+        self._state = {
+            "books": books,
+            "by_id": {b["id"]: b for b in books},
+            "by_title": {b["title"]: b for b in books},
+            "by_norm": by_norm,
+            "norms": [normalize_title(b["title"]) for b in books],
+            "mentions": re.compile(r"\b(" + "|".join(map(re.escape, spotted)) + r")\b") if spotted else None,
+            "grams": grams,
+            "payload": payload,
+            "payload_gz": gzip.compress(payload, 6),
+            # One per encoding, so caches never serve one body for the other
+            "etag": f'"{digest}"',
+            "etag_gz": f'"{digest}-gz"',
+        }
+        self._mtime = mtime
+
+    def _fresh(self) -> dict:
+        now = time.monotonic()
+        if now - self._checked >= CATALOG_RELOAD_INTERVAL:
+            with self._lock:
+                self._checked = now
+                try:
+                    mtime = os.path.getmtime(self.path)
+                except OSError:
+                    mtime = None
+                if mtime != self._mtime:
+                    self._load(mtime)
+        return self._state
+
+    def books(self) -> list[dict]:
+        return self._fresh()["books"]
+
+    def get(self, book_id: str) -> Optional[dict]:
+        return self._fresh()["by_id"].get(book_id)
+
+    def payload(self, gzipped: bool = False) -> tuple[bytes, str]:
+        """The serialized /books response (optionally gzip-compressed) and its ETag."""
+        st = self._fresh()
+        return (st["payload_gz"], st["etag_gz"]) if gzipped else (st["payload"], st["etag"])
+
+    def mentioned(self, text: str) -> list[dict]:
+        """Catalog books named in ``text``, once per mention, in order of appearance."""
+        st = self._fresh()
+        if st["mentions"] is None:
+            return []
+        # Normalize the text like the titles, minus the leading-article rule
+        t = unicodedata.normalize("NFKD", text or "")
+        t = _PUNCT.sub(" ", "".join(ch for ch in t if not unicodedata.combining(ch)).casefold())
+        return [st["by_norm"][m.group(1)] for m in st["mentions"].finditer(t)]
+
+    def find_title(self, title: str) -> Optional[dict]:
+        """Exact title, then normalized title, then the closest fuzzy match above FUZZY_THRESHOLD."""
+        st = self._fresh()
+        book = st["by_title"].get(title)
+        if book:
+            return book
+        norm = normalize_title(title)
+        if not norm:
+            return None
+        book = st["by_norm"].get(norm)
+        if book:
+            return book
+
+        # Candidates share at least one trigram; rank by trigram Jaccard, then edit similarity
+        qgrams = _trigrams(norm)
+        overlap: dict[int, int] = {}
+        for g in qgrams:
+            for i in st["grams"].get(g, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+        best, best_score = None, FUZZY_THRESHOLD
+        for i, shared in sorted(overlap.items(), key=lambda kv: -kv[1])[:20]:
+            cand = st["norms"][i]
+            jaccard = shared / len(qgrams | _trigrams(cand))
+            score = max(jaccard, SequenceMatcher(None, norm, cand).ratio())
+            if score > best_score:
+                best, best_score = st["books"][i], score
+        return best
+
+
+catalog = Catalog()
@@ -4,6 +4,10 @@ from functools import lru_cache
 
 @lru_cache
 def get_chroma():
+    # Local on-disk Chroma (no network; see services/vector_store.py for backend selection)
+    if os.getenv("VECTOR_BACKEND", "chroma_cloud") == "chroma_local":
+        return chromadb.PersistentClient(path=os.getenv("CHROMA_PATH", "data/chroma"))
+
     # Prefer environment variables; this avoids hardcoding secrets
     api_key = os.getenv("CHROMA_API_KEY")
     tenant = os.getenv("CHROMA_TENANT")
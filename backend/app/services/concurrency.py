@@ -0,0 +1,62 @@
+import asyncio
+import os
+import time
+from functools import partial
+
+import anyio
+
+from . import metrics
+
+# Per-upstream caps on in-flight requests, so one slow upstream (e.g. image
+# generation) cannot tie up capacity the others need. Override per upstream
+# with e.g. IMAGE_CONCURRENCY=4; UPSTREAM_CONCURRENCY sets the default.
+DEFAULT_LIMIT = int(os.getenv("UPSTREAM_CONCURRENCY", "16"))
+UPSTREAMS = ("chat", "embeddings", "moderation", "image", "tts", "stt")
+
+# Threads reserved for blocking Chroma and file calls made from async handlers
+BLOCKING_IO_THREADS = int(os.getenv("BLOCKING_IO_THREADS", "8"))
+
+_semaphores: dict[str, asyncio.Semaphore] = {}
+_blocking_limiter: anyio.CapacityLimiter | None = None
+
+
+class _Upstream:
+    """One call's slot on an upstream: waits for the semaphore, then times the call."""
+
+    __slots__ = ("name", "sem", "start")
+
+    def __init__(self, name: str, sem: asyncio.Semaphore):
+        self.name, self.sem = name, sem
+
+    async def __aenter__(self):
+        queued = time.perf_counter()
+        await self.sem.acquire()
+        self.start = time.perf_counter()
+        metrics.upstream_wait.observe(self.start - queued, self.name)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.sem.release()
+        if exc_type is None:
+            outcome = "ok"
+        else:
+            # e.g. the losing request of a hedged pair
+            outcome = "cancelled" if issubclass(exc_type, asyncio.CancelledError) else "error"
+        metrics.record_upstream(self.name, time.perf_counter() - self.start, outcome)
+
+
+def upstream(name: str) -> _Upstream:
+    """Guard (and time) one call to the named upstream: ``async with upstream("chat"):``."""
+    sem = _semaphores.get(name)
+    if sem is None:
+        limit = int(os.getenv(f"{name.upper()}_CONCURRENCY", DEFAULT_LIMIT))
+        sem = _semaphores[name] = asyncio.Semaphore(max(1, limit))
+    return _Upstream(name, sem)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call in the bounded worker pool used for Chroma and file I/O."""
+    global _blocking_limiter
+    if _blocking_limiter is None:
+        _blocking_limiter = anyio.CapacityLimiter(max(1, BLOCKING_IO_THREADS))
+    return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=_blocking_limiter)
@@ -0,0 +1,7 @@
+"""Conditional-request helpers."""
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Whether an ``If-None-Match`` header value lists ``etag`` (weak or strong) or is ``*``."""
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
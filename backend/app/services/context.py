@@ -0,0 +1,82 @@
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+# Prompt budget for prior conversation (rolling summary + recent messages).
+# Messages that no longer fit are folded into the chat's rolling summary.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Upper bound on unsummarized messages loaded per turn
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "60"))
+# Per-message framing overhead in chat-completion prompts
+MESSAGE_OVERHEAD = 4
+
+BOOK_KEYWORDS = ("book", "novel", "read", "recommend", "author", "literature", "story", "title")
+
+
+def mentions_books(text: str) -> bool:
+    t = (text or "").lower()
+    return any(k in t for k in BOOK_KEYWORDS)
+
+
+# "something similar", "more like that one", "a book like Dune", "in the same vein"
+_MORE_LIKE_THIS = re.compile(
+    r"\b(similar|more like|(ones?|books?|novels?|stor(y|ies)|reads?|something|anything|others?) (else )?like"
+    r"|same (vein|style|kind)|in the vein of)\b",
+    re.IGNORECASE,
+)
+
+
+def asks_for_similar(text: str) -> bool:
+    """Whether the turn asks for books like one already discussed."""
+    return bool(_MORE_LIKE_THIS.search(text or ""))
+
+
+@lru_cache
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Exact with tiktoken installed, otherwise ~4 characters per token."""
+    enc = _encoding(model)
+    if enc is None:
+        return len(text or "") // 4 + 1
+    return len(enc.encode(text or "", disallowed_special=()))
+
+
+@dataclass
+class History:
+    """Prior conversation for one turn."""
+
+    messages: list = field(default_factory=list)  # fit the budget, oldest first
+    overflow: list = field(default_factory=list)  # older, not yet in the summary
+    summary: str = ""
+    is_book: bool = False
+    chat_id: Optional[int] = None
+    summary_until: int = 0  # id of the last message the summary covers
+    backlog: bool = False  # unsummarized messages may precede the loaded window
+
+
+def fit(messages: list, summary: str, model: str, budget: int = CONTEXT_TOKEN_BUDGET) -> tuple[list, list]:
+    """Split ``messages`` (oldest first) into (overflow, kept).
+
+    ``kept`` is the longest suffix that fits in ``budget`` alongside the
+    summary; the most recent message is always kept.
+    """
+    remaining = budget - (count_tokens(summary, model) + MESSAGE_OVERHEAD if summary else 0)
+    cut = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        remaining -= count_tokens(messages[i].content, model) + MESSAGE_OVERHEAD
+        if remaining < 0 and cut < len(messages):
+            break
+        cut = i
+    return messages[:cut], messages[cut:]
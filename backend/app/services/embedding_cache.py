@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+# Two tiers: a small in-process LRU in front of a SQLite file that survives
+# restarts and is shared by every uvicorn worker on the host.
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", str(7 * 24 * 3600)))
+# Set to an empty string to keep the cache in memory only
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/embed_cache.db")
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").casefold().split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, maxsize: int = EMBED_CACHE_SIZE, ttl: float = EMBED_CACHE_TTL, path: str = EMBED_CACHE_PATH):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._mem: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vec BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def get_memory(self, key: str) -> Optional[list[float]]:
+        """Look up the in-process tier only (no I/O)."""
+        with self._lock:
+            item = self._mem.get(key)
+            if item is None:
+                return None
+            created, vec = item
+            if time.time() - created > self.ttl:
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def get_disk(self, key: str) -> Optional[list[float]]:
+        """Look up the persistent tier and promote a hit into memory. Counts a miss otherwise."""
+        if not self.path:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT vec, created FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            vec = array("f", row[0]).tolist()
+            self._remember(key, row[1], vec)
+            self.disk_hits += 1
+            return vec
+
+    def put(self, key: str, model: str, vec: list[float]) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, vec)
+            if self.path:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vec, created) VALUES (?, ?, ?, ?)",
+                    (key, model, array("f", vec).tobytes(), now),
+                )
+                self._writes += 1
+                if self._writes % 1024 == 0:
+                    # Occasionally drop expired rows so the file stays bounded
+                    db.execute("DELETE FROM embeddings WHERE created < ?", (now - self.ttl,))
+                db.commit()
+
+    def _remember(self, key: str, created: float, vec: list[float]) -> None:
+        self._mem[key] = (created, vec)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._mem),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+cache = EmbeddingCache()
@@ -1,14 +1,26 @@
 import os
-from openai import OpenAI
+
+from . import gateway, metrics
+from .concurrency import run_blocking
+from .embedding_cache import cache, cache_key
 
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
 
-def embed_query(text: str):
-    client = OpenAI()
-    res = client.embeddings.create(model=EMBED_MODEL, input=[text])
-    return res.data[0].embedding
+async def embed_query(text: str):
+    key = cache_key(EMBED_MODEL, text)
+    vec = cache.get_memory(key) or await run_blocking(cache.get_disk, key)
+    if vec is not None:
+        return vec
+    # Latency-sensitive (on the chat path), so hedged when EMBEDDINGS_HEDGE_MS is set
+    res = await gateway.call(
+        "embeddings", lambda c: c.embeddings.create(model=EMBED_MODEL, input=[text]), hedge=True
+    )
+    metrics.record_usage(EMBED_MODEL, res.usage)
+    vec = res.data[0].embedding
+    await run_blocking(cache.put, key, EMBED_MODEL, vec)
+    return vec
 
-def embed_texts(texts: list[str]):
-    client = OpenAI()
-    res = client.embeddings.create(model=EMBED_MODEL, input=texts)
+async def embed_texts(texts: list[str]):
+    res = await gateway.call("embeddings", lambda c: c.embeddings.create(model=EMBED_MODEL, input=texts))
+    metrics.record_usage(EMBED_MODEL, res.usage)
     return [d.embedding for d in res.data]
@@ -0,0 +1,251 @@
+"""The one way to call OpenAI.
+
+- One client per event loop, over a shared keep-alive connection pool
+  (OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE, OPENAI_KEEPALIVE_SECONDS),
+  so calls reuse warm TLS connections.
+- Per-operation timeouts: ``<OP>_TIMEOUT`` seconds (e.g. EMBEDDINGS_TIMEOUT),
+  applied to connect (capped at OPENAI_CONNECT_TIMEOUT) and to each read.
+- Transient failures (connection errors, timeouts, 429, 5xx) are retried
+  ``<OP>_RETRIES`` times (default OPENAI_RETRIES) with full-jitter
+  exponential backoff, honouring Retry-After.
+- Hedging: with ``hedge=True`` and ``<OP>_HEDGE_MS`` > 0, a second identical
+  request starts if the first has not answered by then; the first answer
+  wins and the other is cancelled.
+- A circuit breaker per operation opens after OPENAI_BREAKER_FAILURES
+  consecutive transient failures and rejects calls with ``CircuitOpen``
+  for OPENAI_BREAKER_COOLDOWN seconds, then lets one probe through.
+
+Each attempt also takes a slot from ``concurrency.upstream(op)``.
+
+    res = await gateway.call("embeddings", lambda c: c.embeddings.create(...), hedge=True)
+    async with gateway.session("tts") as client:  # streaming responses
+        ...
+"""
+import asyncio
+import os
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from . import metrics
+from .concurrency import UPSTREAMS, upstream
+
+T = TypeVar("T")
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "120"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_RETRIES = int(os.getenv("OPENAI_RETRIES", "2"))
+OPENAI_RETRY_BASE = float(os.getenv("OPENAI_RETRY_BASE", "0.25"))
+OPENAI_RETRY_MAX = float(os.getenv("OPENAI_RETRY_MAX", "8"))
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_COOLDOWN = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30"))
+
+# Default seconds per operation; streaming ones bound the gap between chunks
+TIMEOUTS = {"chat": 60, "embeddings": 10, "moderation": 5, "image": 120, "tts": 60, "stt": 120}
+
+
+def _setting(op: str, key: str, default) -> float:
+    return float(os.getenv(f"{op.upper()}_{key}", default))
+
+
+class CircuitOpen(Exception):
+    """The upstream is failing; calls are rejected until ``retry_after`` seconds pass."""
+
+    def __init__(self, op: str, retry_after: float):
+        super().__init__(f"{op} upstream unavailable; retry in {retry_after:.0f}s")
+        self.op = op
+        self.retry_after = retry_after
+
+
+class Breaker:
+    def __init__(self, threshold: int = OPENAI_BREAKER_FAILURES, cooldown: float = OPENAI_BREAKER_COOLDOWN):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def retry_after(self) -> float:
+        return 0.0 if self.opened_at is None else max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.probing or self.state == "open":
+            return False
+        self.probing = True  # half-open: a single trial request
+        return True
+
+    def success(self) -> None:
+        self.failures, self.opened_at, self.probing = 0, None, False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The call was cancelled: no verdict on the upstream."""
+        self.probing = False
+
+
+_breakers = {op: Breaker() for op in UPSTREAMS}
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _transient(e: BaseException) -> bool:
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+
+    # APITimeoutError is an APIConnectionError
+    return isinstance(e, (APIConnectionError, InternalServerError, RateLimitError))
+
+
+def client(op: str):
+    """The shared AsyncOpenAI client for the running loop, with ``op``'s timeout."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        http = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+            )
+        )
+        # Retries are ours (with the breaker in the loop), not the SDK's
+        clients = _clients[loop] = {"": AsyncOpenAI(http_client=http, max_retries=0)}
+    c = clients.get(op)
+    if c is None:
+        import httpx
+
+        seconds = _setting(op, "TIMEOUT", TIMEOUTS.get(op, 60))
+        timeout = httpx.Timeout(seconds, connect=min(seconds, OPENAI_CONNECT_TIMEOUT))
+        c = clients[op] = clients[""].with_options(timeout=timeout)
+    return c
+
+
+async def aclose() -> None:
+    """Close the running loop's connection pool (app shutdown)."""
+    clients = _clients.pop(asyncio.get_running_loop(), None)
+    if clients:
+        await clients[""].close()
+
+
+async def prewarm(connections: int = 1) -> None:
+    """Open ``connections`` pooled connections ahead of the first real call.
+
+    Each sends a models-list request, which pays for DNS, TCP and TLS; any
+    HTTP status will do, the connection stays in the pool either way.
+    Bypasses the breakers and concurrency slots.
+    """
+    from openai import APIStatusError
+
+    c = client("moderation")  # short timeouts
+
+    async def one():
+        try:
+            await c.models.list()
+        except APIStatusError:
+            pass
+
+    await asyncio.gather(*(one() for _ in range(connections)))
+
+
+@asynccontextmanager
+async def session(op: str):
+    """One attempt on ``op``: breaker check, concurrency slot, client.
+
+    For streaming responses, where the slot must be held while the body is
+    read; the outcome feeds the breaker, but nothing is retried.
+    """
+    breaker = _breakers[op]
+    if not breaker.allow():
+        metrics.upstream_requests.inc(op, "rejected")
+        raise CircuitOpen(op, breaker.retry_after())
+    ok = None
+    try:
+        async with upstream(op):
+            yield client(op)
+        ok = True
+    except Exception as e:
+        ok = not _transient(e)  # a 4xx says nothing about upstream health
+        raise
+    finally:
+        if ok is None:
+            breaker.release()
+        elif ok:
+            breaker.success()
+        else:
+            breaker.failure()
+
+
+async def _attempt(op: str, fn: Callable[..., Awaitable[T]]) -> T:
+    async with session(op) as c:
+        return await fn(c)
+
+
+async def _hedged(op: str, fn: Callable[..., Awaitable[T]], delay: float) -> T:
+    tasks = [asyncio.create_task(_attempt(op, fn))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.upstream_hedges.inc(op)
+            tasks.append(asyncio.create_task(_attempt(op, fn)))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                error = error or t.exception()
+        raise error
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+def _backoff(attempt: int, e: BaseException) -> float:
+    delay = random.uniform(0, min(OPENAI_RETRY_MAX, OPENAI_RETRY_BASE * 2 ** attempt))
+    response = getattr(e, "response", None)
+    try:
+        retry_after = float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        retry_after = None
+    return min(OPENAI_RETRY_MAX, max(delay, retry_after or 0))
+
+
+async def call(op: str, fn: Callable[..., Awaitable[T]], hedge: bool = False) -> T:
+    """Run ``fn(client)`` against ``op`` with timeout, retries, breaker and optional hedging."""
+    retries = int(_setting(op, "RETRIES", OPENAI_RETRIES))
+    hedge_after = _setting(op, "HEDGE_MS", 0) / 1000 if hedge else 0
+    for attempt in range(retries + 1):
+        try:
+            if hedge_after > 0:
+                return await _hedged(op, fn, hedge_after)
+            return await _attempt(op, fn)
+        except Exception as e:
+            if attempt == retries or not _transient(e):
+                raise
+            metrics.upstream_retries.inc(op)
+            await asyncio.sleep(_backoff(attempt, e))
+    raise AssertionError("unreachable")
+
+
+def stats() -> dict:
+    return {
+        op: {"state": b.state, "consecutive_failures": b.failures, "retry_after": round(b.retry_after(), 1)}
+        for op, b in _breakers.items()
+    }
@@ -0,0 +1,354 @@
+"""Background image generation jobs.
+
+``POST /image/jobs`` stores a job row and returns at once; IMAGE_JOB_WORKERS
+worker tasks claim queued jobs from the database, call the image API and
+persist the ImageAsset (and Chat) together with the job's ``done`` status.
+
+- Identical active jobs (same user, model and prompt) coalesce: a partial
+  unique index admits one queued/running row per key, so a retry returns
+  the job already in flight, across processes too.
+- Job state lives in the database. A claimed job holds a lease of
+  IMAGE_JOB_LEASE_SECONDS, renewed every third of that while it runs, so
+  slow generations (timeouts and retries) keep it; if its worker dies,
+  another one reclaims it once the lease lapses. Only the claim holding the
+  lease (``lease_owner``) can complete or requeue the job. Graceful
+  shutdown hands running jobs back to the queue.
+- Transient API errors are retried up to IMAGE_JOB_ATTEMPTS times in all.
+"""
+import asyncio
+import base64
+import contextvars
+import hashlib
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from ..db import get_session
+from ..models import Chat, ImageAsset, ImageJob
+from . import blobstore, metrics
+from . import gateway
+from .concurrency import run_blocking
+from .write_behind import writer
+
+log = logging.getLogger(__name__)
+
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "4"))
+IMAGE_JOB_ATTEMPTS = int(os.getenv("IMAGE_JOB_ATTEMPTS", "3"))
+IMAGE_JOB_LEASE_SECONDS = float(os.getenv("IMAGE_JOB_LEASE_SECONDS", "300"))
+# How often idle workers and watchers look for changes made by other processes
+IMAGE_JOB_POLL_SECONDS = float(os.getenv("IMAGE_JOB_POLL_SECONDS", "1"))
+IMAGE_SIZE = "1024x1024"
+
+ACTIVE = ("queued", "running")
+TERMINAL = ("done", "failed")
+
+
+def image_model() -> str:
+    return os.getenv("IMAGE_MODEL", "gpt-image-1")
+
+
+def dedup_key(user_id: str, model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{user_id}\0{model}\0{prompt.strip()}".encode("utf-8")).hexdigest()
+
+
+def to_dict(job: ImageJob) -> dict:
+    out = {
+        "id": job.id,
+        "status": job.status,
+        "prompt": job.prompt,
+        "model": job.model,
+        "chat_id": job.chat_id,
+        "image_id": job.image_id,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+    if job.status == "done" and job.image_id is not None:
+        out.update(blobstore.image_urls(job.image_id, job.user_id))
+    return out
+
+
+def _claimable(now: datetime):
+    # A queued job's lease_until, when set, is a retry back-off ("not before")
+    return or_(
+        and_(ImageJob.status == "queued", or_(ImageJob.lease_until.is_(None), ImageJob.lease_until < now)),
+        and_(ImageJob.status == "running", ImageJob.lease_until < now),
+    )
+
+
+def _transient(e: Exception) -> bool:
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    return isinstance(
+        e, (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError, gateway.CircuitOpen)
+    )
+
+
+def _held(job: ImageJob):
+    return and_(ImageJob.id == job.id, ImageJob.status == "running", ImageJob.lease_owner == job.lease_owner)
+
+
+def _persist_job(job: ImageJob, digest: str):
+    """Write-behind job: store the image (creating the chat if needed) and mark the job done.
+
+    Returns None, storing nothing, if the job's lease has passed to another worker.
+    """
+
+    async def run(s) -> Optional[tuple[int, int]]:
+        res = await s.exec(
+            update(ImageJob).where(_held(job)).values(status="done", lease_until=None, lease_owner=None)
+        )
+        if res.rowcount != 1:
+            return None
+        prompt, title = job.prompt, job.title
+        chat = (
+            (await s.exec(select(Chat).where(Chat.id == job.chat_id, Chat.user_id == job.user_id))).first()
+            if job.chat_id
+            else None
+        )
+        if chat is None:
+            title_text = title or prompt[:48] + ("…" if len(prompt) > 48 else "")
+            chat = Chat(user_id=job.user_id, title=title_text)
+            s.add(chat)
+            await s.flush()
+        else:
+            if (chat.title or "") == "New Chat":
+                chat.title = prompt[:48] + ("…" if len(prompt) > 48 else "")
+
+        asset = ImageAsset(chat_id=chat.id, user_id=job.user_id, title=title or prompt[:64], sha256=digest)
+        s.add(asset)
+        chat.updated_at = datetime.utcnow()
+        s.add(chat)
+        await s.flush()
+        await s.exec(
+            update(ImageJob).where(ImageJob.id == job.id)
+            .values(image_id=asset.id, chat_id=chat.id, error=None, updated_at=datetime.utcnow())
+        )
+        return asset.id, chat.id
+
+    return run
+
+
+class JobQueue:
+    def __init__(self, workers: int = IMAGE_JOB_WORKERS):
+        self.workers = workers
+        self.running = 0
+        self._tasks: list[asyncio.Task] = []
+        self._current: dict[asyncio.Task, ImageJob] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    # -- database ---------------------------------------------------------
+
+    async def _insert(
+        self, user_id: str, prompt: str, chat_id: Optional[int], title: Optional[str]
+    ) -> tuple[ImageJob, bool]:
+        model = image_model()
+        key = dedup_key(user_id, model, prompt)
+        async with get_session() as s:
+            for _ in range(3):
+                active = (await s.exec(
+                    select(ImageJob).where(ImageJob.dedup_key == key, ImageJob.status.in_(ACTIVE))
+                )).first()
+                if active is not None:
+                    return active, False
+                job = ImageJob(
+                    id=uuid.uuid4().hex, user_id=user_id, prompt=prompt, model=model,
+                    title=title, chat_id=chat_id, dedup_key=key,
+                )
+                s.add(job)
+                try:
+                    await s.commit()
+                except IntegrityError:
+                    # Lost a race with an identical submission; return that one
+                    await s.rollback()
+                    continue
+                return job, True
+        raise RuntimeError("could not enqueue image job")
+
+    async def get(self, job_id: str, user_id: str) -> Optional[ImageJob]:
+        async with get_session() as s:
+            return (await s.exec(
+                select(ImageJob).where(ImageJob.id == job_id, ImageJob.user_id == user_id)
+            )).first()
+
+    async def _claim(self) -> Optional[ImageJob]:
+        now = datetime.utcnow()
+        async with get_session() as s:
+            candidates = (await s.exec(
+                select(ImageJob.id).where(_claimable(now)).order_by(ImageJob.created_at).limit(self.workers)
+            )).all()
+            for job_id in candidates:
+                # Conditional update: only one worker (in any process) wins a job
+                res = await s.exec(
+                    update(ImageJob)
+                    .where(ImageJob.id == job_id, _claimable(now))
+                    .values(
+                        status="running",
+                        attempts=ImageJob.attempts + 1,
+                        lease_until=now + timedelta(seconds=IMAGE_JOB_LEASE_SECONDS),
+                        lease_owner=uuid.uuid4().hex,
+                        updated_at=now,
+                    )
+                )
+                await s.commit()
+                if res.rowcount == 1:
+                    return await s.get(ImageJob, job_id)
+        return None
+
+    async def _finish(self, job: ImageJob, status: str, error: Optional[str] = None, delay: float = 0) -> None:
+        now = datetime.utcnow()
+        async with get_session() as s:
+            await s.exec(
+                update(ImageJob)
+                .where(_held(job))
+                .values(
+                    status=status,
+                    error=error,
+                    lease_until=now + timedelta(seconds=delay) if delay else None,
+                    lease_owner=None,
+                    updated_at=now,
+                )
+            )
+            await s.commit()
+
+    async def _renew(self, job: ImageJob) -> None:
+        """Extend the job's lease every third of IMAGE_JOB_LEASE_SECONDS until cancelled or lost."""
+        while True:
+            await asyncio.sleep(IMAGE_JOB_LEASE_SECONDS / 3)
+            try:
+                async with get_session() as s:
+                    res = await s.exec(
+                        update(ImageJob).where(_held(job))
+                        .values(lease_until=datetime.utcnow() + timedelta(seconds=IMAGE_JOB_LEASE_SECONDS))
+                    )
+                    await s.commit()
+            except Exception:
+                log.exception("renewing the lease of image job %s failed", job.id)
+                continue
+            if res.rowcount != 1:
+                log.warning("image job %s: lease lost to another worker", job.id)
+                return
+
+    # -- workers ----------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop (idempotent)."""
+        if self._tasks:
+            return
+        self._wake, self._changed = asyncio.Event(), asyncio.Event()
+        # Fresh contexts, so workers started from a request don't inherit its trace
+        self._tasks = [
+            asyncio.create_task(self._worker(), context=contextvars.Context()) for _ in range(max(1, self.workers))
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running go back to the queue."""
+        tasks, self._tasks = self._tasks, []
+        interrupted = [self._current[t] for t in tasks if t in self._current]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in interrupted:
+            await self._finish(job, "queued")
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _worker(self) -> None:
+        me = asyncio.current_task()
+        while True:
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except Exception:
+                log.exception("claiming an image job failed")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), IMAGE_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._current[me] = job
+            self._notify()
+            try:
+                await self._run(job)
+            except Exception:
+                # Leave the job to its lease: once it lapses another worker retries it
+                log.exception("image job %s: worker error", job.id)
+            finally:
+                del self._current[me]
+                self._notify()
+
+    async def _run(self, job: ImageJob) -> None:
+        metrics.record_stage("image_queue", (datetime.utcnow() - job.created_at).total_seconds())
+        self.running += 1
+        renew = asyncio.create_task(self._renew(job))
+        try:
+            with metrics.span("image_job"):
+                res = await gateway.call(
+                    "image", lambda c: c.images.generate(model=job.model, prompt=job.prompt, size=IMAGE_SIZE)
+                )
+                digest = await run_blocking(blobstore.put, base64.b64decode(res.data[0].b64_json))
+                fut = writer.submit(_persist_job(job, digest), chat_id=job.chat_id, user_id=job.user_id)
+                stored = await asyncio.shield(fut)
+            if stored is None:
+                log.warning("image job %s: lease lost before its result was stored", job.id)
+            else:
+                writer.remember_chat(stored[1], job.user_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            retry = _transient(e) and job.attempts < IMAGE_JOB_ATTEMPTS
+            log.warning("image job %s attempt %d failed: %r", job.id, job.attempts, e)
+            await self._finish(
+                job, "queued" if retry else "failed", f"{type(e).__name__}: {e}",
+                delay=min(2 ** job.attempts, 30) * (0.5 + random.random()) if retry else 0,
+            )
+        finally:
+            renew.cancel()
+            self.running -= 1
+
+    # -- API --------------------------------------------------------------
+
+    async def submit(
+        self, user_id: str, prompt: str, chat_id: Optional[int] = None, title: Optional[str] = None
+    ) -> tuple[ImageJob, bool]:
+        """Queue a generation; returns (job, created). ``created`` is False when coalesced."""
+        self.start()
+        job, created = await self._insert(user_id, prompt, chat_id, title)
+        if created:
+            self._wake.set()
+        return job, created
+
+    async def watch(self, job_id: str, user_id: str) -> AsyncIterator[ImageJob]:
+        """Yield the job on every status change, ending after a terminal state (or if it is unknown)."""
+        self.start()
+        last = None
+        while True:
+            changed = self._changed
+            job = await self.get(job_id, user_id)
+            if job is None:
+                return
+            if (job.status, job.attempts) != last:
+                last = (job.status, job.attempts)
+                yield job
+            if job.status in TERMINAL:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), IMAGE_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+queue = JobQueue()
@@ -0,0 +1,163 @@
+"""BM25 keyword index over the book catalog.
+
+Built by ingest.py next to the vector index and stored as one JSON file under
+LEXICAL_DIR. rag.py fuses its ranking with the vector ranking and, when the
+keyword match is unambiguous, answers without an embedding call.
+"""
+import json
+import math
+import os
+import re
+import threading
+from typing import Iterable, Optional
+
+LEXICAL_DIR = os.getenv("LEXICAL_DIR", "data/lexical")
+# Short-circuit when the top hit covers this share of the query's IDF mass
+# and outscores the runner-up by LEXICAL_SHORTCUT_MARGIN (0 disables)
+LEXICAL_SHORTCUT_COVERAGE = float(os.getenv("LEXICAL_SHORTCUT_COVERAGE", "0.8"))
+LEXICAL_SHORTCUT_MARGIN = float(os.getenv("LEXICAL_SHORTCUT_MARGIN", "1.5"))
+K1, B = 1.2, 0.75
+
+_TOKEN = re.compile(r"\w+")
+# English function words plus chat filler that never discriminates between books
+STOPWORDS = frozenset(
+    "a about after all also an and any are as at be been but by can could do does for from "
+    "get give had has have he her his how i if in into is it its just like me more most my "
+    "no not of on one or our she so some something such than that the their them then there "
+    "these they this to up us want was we were what when where which who will with would you your "
+    "book books novel novels read reading recommend recommendation suggest story stories title "
+    "please thanks".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall((text or "").casefold()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def index_text(book: dict) -> str:
+    """The fields a book is indexed on; the title counts twice."""
+    return " ".join(
+        [book["title"], book["title"], " ".join(book.get("themes", [])), book.get("summary_short", ""),
+         book.get("summary_full", "")]
+    )
+
+
+def build(books: Iterable[dict], name: str = "book_summaries") -> int:
+    """Index ``books`` (catalog entries) and atomically replace the stored index."""
+    docs, postings, total = [], {}, 0
+    for b in books:
+        tokens = tokenize(index_text(b))
+        tf: dict[str, int] = {}
+        for t in tokens:
+            tf[t] = tf.get(t, 0) + 1
+        j = len(docs)
+        for t, n in tf.items():
+            postings.setdefault(t, []).append([j, n])
+        themes = ", ".join(b.get("themes", []))
+        docs.append({
+            "id": b["id"],
+            "title": b["title"],
+            "themes": themes,
+            "document": f"{b['title']} — {b.get('summary_short', '')} Themes: {themes}",
+            "len": len(tokens),
+        })
+        total += len(tokens)
+    os.makedirs(LEXICAL_DIR, exist_ok=True)
+    path = os.path.join(LEXICAL_DIR, f"{name}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"avgdl": total / len(docs) if docs else 0.0, "docs": docs, "postings": postings}, f,
+                  ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return len(docs)
+
+
+class BM25Index:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._docs: list[dict] = []
+        self._postings: dict[str, list] = {}
+        self._avgdl = 0.0
+
+    def _refresh(self) -> None:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime is None:
+                self._docs, self._postings, self._avgdl = [], {}, 0.0
+            else:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._docs, self._postings, self._avgdl = data["docs"], data["postings"], data["avgdl"]
+            self._mtime = mtime
+
+    def load(self) -> int:
+        """Read the index now rather than on the first search; returns its size."""
+        self._refresh()
+        return len(self._docs)
+
+    def _idf(self, term: str) -> float:
+        n, df = len(self._docs), len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10) -> dict:
+        """Top ``k`` hits as ``{"hits": [...], "confident": bool}``.
+
+        Each hit has ``id``, ``document``, ``metadata`` and ``score``.
+        ``confident`` is set when the top hit alone is a safe answer.
+        """
+        self._refresh()
+        terms = set(tokenize(query))
+        if not terms or not self._docs:
+            return {"hits": [], "confident": False}
+        scores: dict[int, float] = {}
+        matched: dict[int, float] = {}
+        for t in terms:
+            idf = self._idf(t)
+            for j, tf in self._postings.get(t, ()):
+                dl = self._docs[j]["len"]
+                scores[j] = scores.get(j, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / self._avgdl))
+                matched[j] = matched.get(j, 0.0) + idf
+        ranked = sorted(scores.items(), key=lambda kv: -kv[1])[:k]
+        hits = [
+            {
+                "id": self._docs[j]["id"],
+                "document": self._docs[j]["document"],
+                "metadata": {"title": self._docs[j]["title"], "themes": self._docs[j]["themes"]},
+                "score": s,
+            }
+            for j, s in ranked
+        ]
+        confident = False
+        if ranked and LEXICAL_SHORTCUT_MARGIN > 0:
+            top_j, top = ranked[0]
+            second = ranked[1][1] if len(ranked) > 1 else 0.0
+            coverage = matched[top_j] / sum(self._idf(t) for t in terms)
+            confident = coverage >= LEXICAL_SHORTCUT_COVERAGE and top >= LEXICAL_SHORTCUT_MARGIN * second
+        return {"hits": hits, "confident": confident}
+
+
+_indexes: dict[str, BM25Index] = {}
+
+
+def get_index(name: str = "book_summaries") -> BM25Index:
+    if name not in _indexes:
+        _indexes[name] = BM25Index(os.path.join(LEXICAL_DIR, f"{name}.json"))
+    return _indexes[name]
+
+
+def rrf(*rankings: list[dict], k: int = 60) -> list[dict]:
+    """Reciprocal-rank fusion of hit lists (matched on ``id``), best first."""
+    fused: dict[str, float] = {}
+    first: dict[str, dict] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            fused[hit["id"]] = fused.get(hit["id"], 0.0) + 1.0 / (k + rank + 1)
+            first.setdefault(hit["id"], hit)
+    return [first[i] for i in sorted(fused, key=lambda i: -fused[i])]
@@ -0,0 +1,273 @@
+"""In-process request instrumentation, exported in the Prometheus text format.
+
+- ``MetricsMiddleware`` times every HTTP request and opens a per-request
+  ``Trace`` (a context variable, so tasks and worker threads started by the
+  request add to it).
+- ``span(stage)`` / ``record_stage`` time pipeline stages, ``record_upstream``
+  and ``record_usage`` cover OpenAI calls, ``instrument_engine`` counts DB
+  queries.
+- ``watch`` / ``watch_cache`` export existing counters (cache and queue
+  stats) at scrape time, so they cost nothing on the request path.
+
+Requests slower than SLOW_REQUEST_MS are logged with their stage breakdown
+(a SLOW_REQUEST_SAMPLE fraction of them).
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+SLOW_REQUEST_SAMPLE = float(os.getenv("SLOW_REQUEST_SAMPLE", "1.0"))
+# Seconds; spans both millisecond DB stages and multi-second image calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(counts), total, n) for k, (counts, total, n) in self._series.items()]
+        for k, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, "+Inf"), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels((*self.labels, 'le'), (*k, bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, k)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, k)} {n}")
+        return lines
+
+
+http_requests = Counter("http_requests_total", "HTTP requests.", ("method", "route", "status"))
+http_seconds = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+stage_seconds = Histogram("stage_duration_seconds", "Latency of request pipeline stages.", ("stage",))
+upstream_seconds = Histogram("upstream_request_duration_seconds", "OpenAI call latency.", ("upstream",))
+upstream_wait = Histogram("upstream_queue_seconds", "Wait for an upstream concurrency slot.", ("upstream",))
+upstream_requests = Counter("upstream_requests_total", "OpenAI calls.", ("upstream", "outcome"))
+upstream_retries = Counter("upstream_retries_total", "OpenAI calls retried after a transient error.", ("upstream",))
+upstream_hedges = Counter("upstream_hedges_total", "Hedged (duplicate) OpenAI requests started.", ("upstream",))
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by the API.", ("model", "kind"))
+db_queries = Counter("db_queries_total", "SQL statements executed.")
+db_seconds = Histogram("db_query_duration_seconds", "SQL statement latency.")
+_METRICS = (http_requests, http_seconds, stage_seconds, upstream_seconds, upstream_wait,
+            upstream_requests, upstream_retries, upstream_hedges, llm_tokens, db_queries, db_seconds)
+
+
+class Trace:
+    """Per-request breakdown: milliseconds per stage, DB queries and tokens."""
+
+    __slots__ = ("stages", "db_queries", "tokens")
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.db_queries = 0
+        self.tokens = 0
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def summary(self) -> dict:
+        return {
+            "stages_ms": {k: round(v, 1) for k, v in self.stages.items()},
+            "db_queries": self.db_queries,
+            "tokens": self.tokens,
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current() -> Optional[Trace]:
+    return _trace.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+class span:
+    """``with span("embedding"):`` records the block's wall time as a stage."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stage, time.perf_counter() - self.start)
+
+
+def record_upstream(name: str, seconds: float, outcome: str) -> None:
+    upstream_seconds.observe(seconds, name)
+    upstream_requests.inc(name, outcome)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(f"upstream:{name}", seconds)
+
+
+def record_usage(model: str, usage) -> None:
+    """Count tokens from an OpenAI ``usage`` object (chat or embeddings); None is ignored."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    llm_tokens.inc(model, "prompt", amount=prompt)
+    if completion:
+        llm_tokens.inc(model, "completion", amount=completion)
+    trace = _trace.get()
+    if trace is not None:
+        trace.tokens += prompt + completion
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every SQL statement run on ``engine``."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_start"].pop()
+        db_queries.inc()
+        db_seconds.observe(seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace.db_queries += 1
+            trace.add("db", seconds)
+
+
+_watched: list[tuple[str, str, str, Callable[[], float]]] = []
+_caches: dict[str, Callable[[], dict]] = {}
+
+
+def watch(name: str, help: str, fn: Callable[[], float], kind: str = "gauge") -> None:
+    """Export ``fn()`` as a metric, read at scrape time."""
+    _watched.append((name, help, kind, fn))
+
+
+def watch_cache(name: str, stats: Callable[[], dict]) -> None:
+    """Export a cache's ``stats()`` (``hits``, ``misses``, optional ``disk_hits``/``size``)."""
+    _caches[name] = stats
+
+
+def _cache_lines() -> list[str]:
+    snapshots = {name: fn() for name, fn in _caches.items()}
+    lines = []
+    for metric, help, kind, value in (
+        ("cache_hits_total", "Cache hits.", "counter", lambda s: s.get("hits", 0) + s.get("disk_hits", 0)),
+        ("cache_misses_total", "Cache misses.", "counter", lambda s: s.get("misses", 0)),
+        ("cache_entries", "Entries held in memory.", "gauge", lambda s: s.get("size", 0)),
+    ):
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+        lines += [f"{metric}{_labels(('cache',), (name,))} {value(s)}" for name, s in snapshots.items()]
+    return lines
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    lines += _cache_lines()
+    for name, help, kind, fn in _watched:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {fn()}"]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request counts and latency by route template, slow-request logging."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = Trace()
+        token = _trace.set(trace)
+        status, streaming = 500, False
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = (b"content-type", b"text/event-stream") in [
+                    (k.lower(), v.split(b";")[0]) for k, v in message.get("headers", ())
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - start
+            _trace.reset(token)
+            # Label by template (/chats/{chat_id}) to keep cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(scope["method"], route, status)
+            http_seconds.observe(seconds, scope["method"], route)
+            # Event streams stay open by design; their duration says nothing about slowness
+            if not streaming and seconds * 1000 >= SLOW_REQUEST_MS and random.random() < SLOW_REQUEST_SAMPLE:
+                log.warning(
+                    "slow request %s %s -> %s in %.0f ms %s",
+                    scope["method"], route, status, seconds * 1000, json.dumps(trace.summary()),
+                )
@@ -1,35 +1,208 @@
 # backend/app/services/moderation.py
+import hashlib
 import os
-from typing import Iterable
+import pathlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from . import gateway
 
 # Optional OpenAI moderation (toggle via env)
 USE_OAI = os.getenv("USE_OAI_MODERATION", "false").lower() in ("1", "true", "yes")
 MODEL = os.getenv("MODERATION_MODEL", "omni-moderation-latest")
 
-def _keyword_block(text: str, words: Iterable[str]) -> bool:
-    t = (text or "").lower()
-    return any(w in t for w in words)
+# Local blocklist: one phrase per line, '#' starts a comment. The file is
+# re-read when its mtime changes (checked at most every RELOAD_INTERVAL s).
+BLOCKLIST_PATH = pathlib.Path(
+    os.getenv("MODERATION_BLOCKLIST", pathlib.Path(__file__).parents[1] / "data" / "moderation_blocklist.txt")
+)
+RELOAD_INTERVAL = float(os.getenv("MODERATION_RELOAD_INTERVAL", "5"))
+# Remote verdicts keyed on normalized text
+VERDICT_CACHE_SIZE = int(os.getenv("MODERATION_CACHE_SIZE", "4096"))
+VERDICT_CACHE_TTL = float(os.getenv("MODERATION_CACHE_TTL", "3600"))
 
-def is_blocked(text: str) -> bool:
-    """Return True if the input should be blocked; otherwise False."""
-    if not text:
-        return False
+# Used when the blocklist file is missing
+DEFAULT_BLOCKLIST = (
+    "self-harm", "suicide", "harm yourself", "harm yourselves",
+    "make a bomb", "buy a bomb", "weapon assembly",
+)
 
-    # Fast local fallback (keeps server working even without OpenAI)
-    local_blocklist = (
-        "self-harm", "suicide", "harm yourself",
-        "make a bomb", "buy a bomb", "weapon assembly",
-    )
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+# Runs of word characters (and @, $) that contain a letter: "h4rm", "5u1c1de", not "2024"
+_LEET_WORD = re.compile(r"[\w@$]*[^\W\d_][\w@$]*")
+_NON_WORD = re.compile(r"[\W_]+")
 
-    if USE_OAI:
+
+def normalize(text: str) -> str:
+    """Casefold, undo leetspeak inside words and collapse punctuation/whitespace to single spaces."""
+    t = _LEET_WORD.sub(lambda m: m.group().translate(_LEET), (text or "").casefold())
+    return _NON_WORD.sub(" ", t).strip()
+
+
+def _trie_pattern(phrases: Iterable[str]) -> Optional[re.Pattern]:
+    """Compile phrases into one regex whose alternations share prefixes.
+
+    Phrases are already normalized, so matching is a single left-to-right
+    scan of the normalized text regardless of how many terms there are.
+    """
+    trie: dict = {}
+    for p in phrases:
+        node = trie
+        for ch in p:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    if not trie:
+        return None
+
+    def build(node: dict) -> str:
+        if "" in node and len(node) == 1:
+            return ""
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return re.compile(build(trie))
+
+
+class Blocklist:
+    def __init__(self, path: pathlib.Path = BLOCKLIST_PATH):
+        self.path = path
+        self._pattern: Optional[re.Pattern] = None
+        self._mtime: Optional[float] = -1.0
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def _load(self, mtime: Optional[float]) -> None:
+        if mtime is None:
+            lines: Iterable[str] = DEFAULT_BLOCKLIST
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = [line.split("#", 1)[0] for line in f]
+        # Substring match on normalized text: "self harm" also blocks "self-harming"
+        phrases = {normalize(line) for line in lines if line.strip()}
+        phrases.discard("")
+        self._pattern = _trie_pattern(phrases)
+        self.size = len(phrases)
+        self._mtime = mtime
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < RELOAD_INTERVAL and self._mtime != -1.0:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._load(mtime)
+
+    def reload(self) -> None:
+        """Force a re-read on the next match."""
+        self._mtime = -1.0
+
+    def matches(self, text: str) -> bool:
+        self._maybe_reload()
+        return bool(self._pattern and self._pattern.search(normalize(text)))
+
+
+blocklist = Blocklist()
+
+
+class _VerdictCache:
+    def __init__(self, maxsize: int = VERDICT_CACHE_SIZE, ttl: float = VERDICT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, bool]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(f"{MODEL}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bool]:
+        item = self._items.get(key)
+        if item is None or time.time() - item[0] > self.ttl:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: str, flagged: bool) -> None:
+        self._items[key] = (time.time(), flagged)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+verdicts = _VerdictCache()
+
+
+def _keyword_block(text: str) -> bool:
+    return blocklist.matches(text)
+
+
+async def _remote_flags(texts: list[str]) -> list[bool]:
+    """One moderation request for all ``texts``; cached verdicts are reused."""
+    keys = [verdicts.key(t) for t in texts]
+    flags: list[Optional[bool]] = [verdicts.get(k) for k in keys]
+    # Texts that normalize the same are sent once
+    first: dict[str, int] = {}
+    for i, f in enumerate(flags):
+        if f is None:
+            first.setdefault(keys[i], i)
+    todo = list(first.values())
+    if todo:
+        batch = [texts[i] for i in todo]
+        resp = await gateway.call("moderation", lambda c: c.moderations.create(model=MODEL, input=batch), hedge=True)
+        # OpenAI v1 returns one result per input, in order, with .flagged
+        fresh = {keys[i]: bool(result.flagged) for i, result in zip(todo, resp.results)}
+        for key, flagged in fresh.items():
+            verdicts.put(key, flagged)
+        flags = [fresh.get(k, False) if f is None else f for k, f in zip(keys, flags)]
+    return [bool(f) for f in flags]
+
+
+async def is_blocked_many(texts: list[str]) -> list[bool]:
+    """Batched variant of is_blocked: at most one remote call for all texts."""
+    blocked = [bool(t) and _keyword_block(t) for t in texts]
+    pending = [i for i, (t, b) in enumerate(zip(texts, blocked)) if t and not b]
+    if USE_OAI and pending:
         try:
-            from openai import OpenAI
-            client = OpenAI()
-            resp = client.moderations.create(model=MODEL, input=text)
-            # OpenAI v1 returns .results[0].flagged
-            return bool(resp.results[0].flagged)
+            for i, flagged in zip(pending, await _remote_flags([texts[i] for i in pending])):
+                blocked[i] = flagged
         except Exception:
             # fail-open to avoid taking the API down on network/key errors
-            return _keyword_block(text, local_blocklist)
+            pass
+    return blocked
 
-    return _keyword_block(text, local_blocklist)
+
+async def is_blocked(text: str) -> bool:
+    """Return True if the input should be blocked; otherwise False."""
+    if not text:
+        return False
+    # Fast local check first: sub-millisecond and keeps working without OpenAI
+    if _keyword_block(text):
+        return True
+    if USE_OAI:
+        try:
+            return (await _remote_flags([text]))[0]
+        except Exception:
+            return False
+    return False
@@ -0,0 +1,31 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(ts: datetime, *keys: int) -> str:
+    """Opaque keyset cursor for the (timestamp, *keys) of the last row on a page."""
+    raw = "|".join([ts.isoformat(), *map(str, keys)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], keys: int = 1) -> Optional[tuple]:
+    """Inverse of encode_cursor; None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts, *rest = raw.split("|")
+        if len(rest) != keys:
+            return None
+        return (datetime.fromisoformat(ts), *map(int, rest))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def before(ts_col, id_col, cursor: tuple[datetime, int]):
+    """Rows strictly after ``cursor`` in (ts DESC, id DESC) order."""
+    ts, row_id = cursor
+    return or_(ts_col < ts, and_(ts_col == ts, id_col < row_id))
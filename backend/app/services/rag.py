@@ -1,14 +1,19 @@
-from .chroma_client import get_or_create_collection
+from typing import Optional
+
+from .vector_store import get_collection
+from .concurrency import run_blocking
 from .embeddings import embed_query
+from .catalog import catalog
+from .context import asks_for_similar
+from . import lexical, metrics, similar
+
+# Candidates taken from each ranking before fusion
+FUSION_DEPTH = 10
 
-def retrieve(user_query: str, k: int = 3) -> str:
-    coll = get_or_create_collection("book_summaries")
-    q_emb = embed_query(user_query)
-    res = coll.query(query_embeddings=[q_emb], n_results=k)
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
+def _format(hits: list[dict]) -> str:
     ctx = []
-    for d, m in zip(docs, metas):
+    for h in hits:
+        m = h["metadata"] or {}
         themes_val = m.get("themes")
         if isinstance(themes_val, list):
             themes = ", ".join(themes_val)
@@ -16,5 +21,62 @@ def retrieve(user_query: str, k: int = 3) -> str:
             themes = themes_val
         else:
             themes = ""
-        ctx.append(f"Title: {m.get('title')}\nThemes: {themes}\nBlurb: {d}")
+        ctx.append(f"Title: {m.get('title')}\nThemes: {themes}\nBlurb: {h['document']}")
     return "\n\n".join(ctx)
+
+async def _neighbor_hits(book_id: str, k: int) -> list[dict]:
+    """Graph neighbours of ``book_id`` as hits, most similar first; no embedding call."""
+    with metrics.span("similar"):
+        neighbors = await run_blocking(similar.get_graph("book_summaries").neighbors, book_id, k)
+    hits = []
+    for other_id, _ in neighbors:
+        b = catalog.get(other_id)
+        if b is not None:
+            themes = ", ".join(b.get("themes", []))
+            hits.append({
+                "id": other_id,
+                "document": f"{b['title']} — {b.get('summary_short', '')} Themes: {themes}",
+                "metadata": {"title": b["title"], "themes": themes},
+            })
+    return hits
+
+async def retrieve_hits(user_query: str, k: int = 3, q_emb=None) -> list[dict]:
+    """Hybrid retrieval: BM25 and vector rankings fused with RRF.
+
+    A confident keyword match (e.g. the user named a title) skips the
+    embedding call and the vector query: the context is that book, then
+    its graph neighbours fused with the other keyword hits. When the query
+    asks for books *like* the matched one, it is left out and the context
+    is its neighbours (or, without a graph, the fused ranking minus it).
+    """
+    with metrics.span("lexical"):
+        lex = await run_blocking(lexical.get_index().search, user_query, FUSION_DEPTH)
+    exclude = None
+    if lex["confident"]:
+        top = lex["hits"][0]
+        near = await _neighbor_hits(top["id"], FUSION_DEPTH)
+        if not asks_for_similar(user_query):
+            rest = lexical.rrf(lex["hits"][1:], near)
+            return [top] + [h for h in rest if h["id"] != top["id"]][:k - 1]
+        if near:
+            return near[:k]
+        exclude = top["id"]
+
+    coll = await run_blocking(get_collection, "book_summaries")
+    if q_emb is None:
+        with metrics.span("embedding"):
+            q_emb = await embed_query(user_query)
+    with metrics.span("vector_query"):
+        vec = (await run_blocking(coll.query_many, [q_emb], FUSION_DEPTH if lex["hits"] else k))[0]
+    return [h for h in lexical.rrf(vec, lex["hits"]) if h["id"] != exclude][:k]
+
+async def retrieve(user_query: str, k: int = 3, q_emb=None) -> str:
+    return _format(await retrieve_hits(user_query, k, q_emb))
+
+async def retrieve_similar(book: dict, k: int = 3) -> Optional[str]:
+    """Context for "more like ``book``" from the precomputed neighbour graph; None if it has none.
+
+    No embedding call and no vector query.
+    """
+    hits = await _neighbor_hits(book["id"], k)
+    return f"Books similar to {book['title']}:\n\n{_format(hits)}" if hits else None
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Semantic cache for first-turn book replies (opt-in). An entry is reused when
+# the model and retrieved context are identical and the query embedding is
+# within REPLY_CACHE_THRESHOLD cosine similarity of the cached one.
+REPLY_CACHE_ENABLED = os.getenv("REPLY_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+REPLY_CACHE_THRESHOLD = float(os.getenv("REPLY_CACHE_THRESHOLD", "0.95"))
+REPLY_CACHE_TTL = float(os.getenv("REPLY_CACHE_TTL", "3600"))
+REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "1000"))
+
+
+@dataclass
+class Probe:
+    """A lookup against the cache; pass it back to ``put`` to store the reply on a miss."""
+
+    bucket: str
+    vec: object
+    reply: Optional[str] = None
+
+
+def _unit(vec):
+    import numpy as np
+
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+class ReplyCache:
+    def __init__(
+        self,
+        maxsize: int = REPLY_CACHE_SIZE,
+        ttl: float = REPLY_CACHE_TTL,
+        threshold: float = REPLY_CACHE_THRESHOLD,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        # entry id -> (bucket, created, unit vector, reply), in LRU order
+        self._entries: OrderedDict[int, tuple[str, float, object, str]] = OrderedDict()
+        self._buckets: dict[str, set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def bucket(model: str, context: str) -> str:
+        return hashlib.sha256(f"{model}\0{context}".encode("utf-8")).hexdigest()
+
+    def lookup(self, model: str, context: str, query_vec) -> Probe:
+        if query_vec is None:
+            raise ValueError("reply cache lookups need a query embedding")
+        probe = Probe(self.bucket(model, context), _unit(query_vec))
+        now = time.time()
+        with self._lock:
+            best, best_id = self.threshold, None
+            for eid in list(self._buckets.get(probe.bucket, ())):
+                _, created, vec, _ = self._entries[eid]
+                if now - created > self.ttl:
+                    self._drop(eid)
+                    continue
+                sim = float(vec @ probe.vec)
+                if sim >= best:
+                    best, best_id = sim, eid
+            if best_id is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(best_id)
+                probe.reply = self._entries[best_id][3]
+                self.hits += 1
+        return probe
+
+    def put(self, probe: Probe, reply: str) -> None:
+        if not reply or probe.vec is None or probe.vec.ndim != 1:
+            return
+        with self._lock:
+            eid = self._next_id
+            self._next_id += 1
+            self._entries[eid] = (probe.bucket, time.time(), probe.vec, reply)
+            self._buckets.setdefault(probe.bucket, set()).add(eid)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, eid: int) -> None:
+        bucket = self._entries.pop(eid)[0]
+        ids = self._buckets[bucket]
+        ids.discard(eid)
+        if not ids:
+            del self._buckets[bucket]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": REPLY_CACHE_ENABLED,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+cache = ReplyCache()
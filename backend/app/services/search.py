@@ -0,0 +1,91 @@
+import re
+from typing import Optional
+
+from sqlalchemy import column, func, or_, text
+
+from ..models import Chat
+
+# SQLite FTS5 indexes over chat titles and message bodies. They are
+# external-content tables kept in sync by triggers, so every write path
+# (ORM, raw SQL, bulk jobs) updates them without extra application code.
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5("
+    "title, content='chat', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+    "content, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS chat_fts_ai AFTER INSERT ON chat BEGIN "
+    "INSERT INTO chat_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_fts_ad AFTER DELETE ON chat BEGIN "
+    "INSERT INTO chat_fts(chat_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_fts_au AFTER UPDATE OF title ON chat BEGIN "
+    "INSERT INTO chat_fts(chat_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+    "INSERT INTO chat_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN "
+    "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN "
+    "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN "
+    "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+
+_enabled = False
+
+
+def install_fts(conn) -> bool:
+    """Create the FTS tables and triggers (SQLite only). Returns False if FTS5 is unavailable."""
+    global _enabled
+    existed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_fts'"
+    ).first()
+    try:
+        for stmt in FTS_DDL:
+            conn.exec_driver_sql(stmt)
+    except Exception:
+        return False
+    if not existed:
+        # Index rows written before the FTS tables existed
+        conn.exec_driver_sql("INSERT INTO chat_fts(chat_fts) VALUES ('rebuild')")
+        conn.exec_driver_sql("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+    _enabled = True
+    return True
+
+
+def detect_fts(conn) -> bool:
+    """Use the FTS tables if a migration installed them."""
+    global _enabled
+    _enabled = conn.dialect.name == "sqlite" and conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_fts'"
+    ).first() is not None
+    return _enabled
+
+
+def fts_query(q: Optional[str]) -> Optional[str]:
+    """Turn free text into an FTS5 prefix query (all terms must match), or None if empty."""
+    terms = re.findall(r"\w+", q or "")
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def chat_filter(q: Optional[str], include_messages: bool = False):
+    """WHERE clause selecting chats whose title (or, optionally, any message) matches ``q``."""
+    match = fts_query(q)
+    if match is None:
+        return None
+    if not _enabled:
+        # Databases without FTS5 (e.g. Postgres): plain case-insensitive substring match
+        return func.lower(Chat.title).contains(q.strip().lower(), autoescape=True)
+    by_title = Chat.id.in_(
+        text("SELECT rowid FROM chat_fts WHERE chat_fts MATCH :m").bindparams(m=match).columns(column("rowid"))
+    )
+    if not include_messages:
+        return by_title
+    by_message = Chat.id.in_(
+        text(
+            "SELECT message.chat_id FROM message_fts JOIN message ON message.id = message_fts.rowid "
+            "WHERE message_fts MATCH :mm"
+        ).bindparams(mm=match).columns(column("chat_id"))
+    )
+    return or_(by_title, by_message)
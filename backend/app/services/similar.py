@@ -0,0 +1,130 @@
+"""Precomputed "more like this" graph over the book catalog.
+
+ingest.py computes each book's SIMILAR_TOP_N nearest neighbours by cosine
+similarity over the stored embeddings (blocked matrix products, so memory
+stays bounded) and stores them under SIMILAR_DIR as two small ``.npy``
+matrices (int32 neighbour rows, float16 scores) plus the id list. Lookups
+are a memory-mapped row read: no embedding call and no vector query.
+"""
+import json
+import os
+import threading
+from typing import Any, NamedTuple, Optional
+
+SIMILAR_DIR = os.getenv("SIMILAR_DIR", "data/similar")
+SIMILAR_TOP_N = int(os.getenv("SIMILAR_TOP_N", "10"))
+# Rows scored per matrix product while building
+BUILD_BLOCK = 1024
+
+
+def _paths(name: str) -> tuple[str, str, str]:
+    base = os.path.join(SIMILAR_DIR, name)
+    return base + ".neighbors.npy", base + ".scores.npy", base + ".ids.json"
+
+
+def build(coll, name: str = "book_summaries", top_n: int = SIMILAR_TOP_N) -> int:
+    """Compute the neighbour table for every vector in ``coll`` and atomically replace the stored one."""
+    import numpy as np
+
+    res = coll.get(include=["embeddings"])
+    ids = list(res["ids"])
+    m = np.asarray(res["embeddings"], dtype=np.float32).reshape(len(ids), -1) if ids else np.zeros((0, 1))
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    m = m / norms
+    k = min(top_n, max(len(ids) - 1, 0))
+    neighbors = np.zeros((len(ids), k), dtype=np.int32)
+    scores = np.zeros((len(ids), k), dtype=np.float16)
+    for start in range(0, len(ids) if k else 0, BUILD_BLOCK):
+        block = m[start:start + BUILD_BLOCK] @ m.T
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf  # a book is not its own neighbour
+        idx = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part = np.take_along_axis(block, idx, axis=1)
+        order = np.argsort(-part, axis=1)
+        neighbors[start:start + len(block)] = np.take_along_axis(idx, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(part, order, axis=1)
+
+    os.makedirs(SIMILAR_DIR, exist_ok=True)
+    neighbors_path, scores_path, ids_path = _paths(name)
+    for path, array in ((neighbors_path, neighbors), (scores_path, scores)):
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+    with open(ids_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(ids, f, ensure_ascii=False)
+    # ids.json is replaced last: its mtime is what readers watch
+    os.replace(ids_path + ".tmp", ids_path)
+    return len(ids)
+
+
+def exists(name: str = "book_summaries") -> bool:
+    return os.path.exists(_paths(name)[2])
+
+
+class _Graph(NamedTuple):
+    """One loaded version of the graph; never mutated, only replaced."""
+
+    ids: list
+    pos: dict
+    neighbors: Any  # int32 (n, k), memory-mapped
+    scores: Any  # float16 (n, k), memory-mapped
+    mtime: Optional[float]
+
+
+_EMPTY = _Graph([], {}, None, None, None)
+
+
+class SimilarityGraph:
+    """Lookups take one reference to the current ``_Graph``; a reload swaps it in one assignment."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._graph = _EMPTY
+
+    def _current(self) -> _Graph:
+        import numpy as np
+
+        graph = self._graph
+        neighbors_path, scores_path, ids_path = _paths(self.name)
+        try:
+            mtime = os.path.getmtime(ids_path)
+        except OSError:
+            mtime = None
+        if mtime == graph.mtime:
+            return graph
+        with self._lock:
+            if mtime is None:
+                self._graph = _EMPTY
+                return _EMPTY
+            with open(ids_path, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            neighbors = np.load(neighbors_path, mmap_mode="r")
+            scores = np.load(scores_path, mmap_mode="r")
+            if not len(ids) == len(neighbors) == len(scores):
+                # build() in another process is between file swaps: keep the old graph, retry next time
+                return self._graph
+            self._graph = _Graph(ids, {id_: i for i, id_ in enumerate(ids)}, neighbors, scores, mtime)
+            return self._graph
+
+    def load(self) -> int:
+        """Map the graph now rather than on the first lookup; returns its size."""
+        return len(self._current().ids)
+
+    def neighbors(self, book_id: str, k: int = SIMILAR_TOP_N) -> list[tuple[str, float]]:
+        """Up to ``k`` (id, cosine similarity) pairs, most similar first; [] for unknown books."""
+        graph = self._current()
+        i = graph.pos.get(book_id)
+        if i is None:
+            return []
+        return [(graph.ids[j], round(float(s), 4)) for j, s in zip(graph.neighbors[i][:k], graph.scores[i][:k])]
+
+
+_graphs: dict[str, SimilarityGraph] = {}
+
+
+def get_graph(name: str = "book_summaries") -> SimilarityGraph:
+    if name not in _graphs:
+        _graphs[name] = SimilarityGraph(name)
+    return _graphs[name]
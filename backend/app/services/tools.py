@@ -1,14 +1,6 @@
-import json
-import pathlib
-
-DATA_PATH = pathlib.Path(__file__).parents[1] / "data" / "book_summaries.json"
-BOOKS = {}
-
-# Load data once
-if DATA_PATH.exists():
-    with open(DATA_PATH, "r", encoding="utf-8") as f:
-        items = json.load(f)
-        BOOKS = {b["title"]: b["summary_full"] for b in items}
+from .catalog import catalog
 
 def get_summary_by_title(title: str) -> str:
-    return BOOKS.get(title, "Summary not found. Use the exact title.")
+    # Tolerates case, punctuation and small misspellings in the model's title
+    book = catalog.find_title(title)
+    return book["summary_full"] if book else "Summary not found. Use the exact title."
@@ -0,0 +1,247 @@
+"""Account export and import as NDJSON (one JSON object per line).
+
+An export is, in order::
+
+    {"type": "export", "version": 1, "user_id": ..., "exported_at": ...}
+    {"type": "chat", "id": ..., "title": ..., "summary": ..., ...}     every chat
+    {"type": "message", "id": ..., "chat_id": ..., "role": ..., ...}  every message, chat by chat
+    {"type": "image", "id": ..., "chat_id": ..., "sha256": ..., ...}  image references
+
+Image bytes stay in the content-addressed blob store; copy ``BLOB_DIR``
+along with the export when moving to another deployment. An imported image
+must name a blob that exists there, or carry its bytes as base64 in ``b64``.
+
+Both directions stream: rows are read through server-side cursors in
+batches of EXPORT_BATCH_ROWS, and imports are inserted IMPORT_BATCH_ROWS at
+a time, each batch in its own transaction, so memory stays flat whatever
+the account size. Imported chats, messages and images get new ids.
+"""
+import base64
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import orjson
+from sqlalchemy import insert, update
+from sqlalchemy import select as sa_select
+
+from ..db import engine
+from ..models import Chat, ImageAsset, Message
+from . import blobstore
+from .concurrency import run_blocking
+
+EXPORT_VERSION = 1
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "1000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(8 * 1024 * 1024)))
+INFLATE_CHUNK = 256 * 1024
+
+_EXPORTS = (
+    ("chat", sa_select(
+        Chat.id, Chat.title, Chat.created_at, Chat.updated_at, Chat.summary, Chat.summary_until, Chat.is_book_chat,
+    ), lambda user_id: Chat.user_id == user_id, (Chat.id,)),
+    ("message", sa_select(
+        Message.id, Message.chat_id, Message.role, Message.content, Message.created_at,
+    ).join(Chat, Chat.id == Message.chat_id), lambda user_id: Chat.user_id == user_id,
+        (Message.chat_id, Message.created_at, Message.id)),
+    ("image", sa_select(
+        ImageAsset.id, ImageAsset.chat_id, ImageAsset.title, ImageAsset.sha256, ImageAsset.created_at,
+    ), lambda user_id: ImageAsset.user_id == user_id, (ImageAsset.created_at, ImageAsset.id)),
+)
+
+
+class ImportFormatError(ValueError):
+    """The import body is malformed; ``counts`` holds what was committed before it."""
+
+    def __init__(self, message: str, counts: dict):
+        super().__init__(message)
+        self.counts = counts
+
+
+async def export_lines(user_id: str) -> AsyncIterator[bytes]:
+    """Yield the user's export, EXPORT_BATCH_ROWS lines per chunk."""
+    yield orjson.dumps(
+        {"type": "export", "version": EXPORT_VERSION, "user_id": user_id, "exported_at": datetime.utcnow()}
+    ) + b"\n"
+    async with engine.connect() as conn:
+        for kind, stmt, owned, order in _EXPORTS:
+            result = await conn.stream(
+                stmt.where(owned(user_id)).order_by(*order).execution_options(yield_per=EXPORT_BATCH_ROWS)
+            )
+            async for rows in result.partitions():
+                yield b"".join(orjson.dumps({"type": kind, **row._asdict()}) + b"\n" for row in rows)
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def _inflate(d, data: bytes):
+    # Bounded output per call, so a small compressed body cannot balloon in memory
+    out = d.decompress(data, INFLATE_CHUNK)
+    while out:
+        yield out
+        out = d.decompress(d.unconsumed_tail, INFLATE_CHUNK) if d.unconsumed_tail else b""
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a (possibly gzip-compressed) byte stream into non-empty lines."""
+    d, head, buf = None, True, b""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if head:
+            head = False
+            if chunk[:2] == b"\x1f\x8b":
+                d = zlib.decompressobj(31)
+        for data in _inflate(d, chunk) if d is not None else (chunk,):
+            *lines, buf = (buf + data).split(b"\n")
+            if len(buf) > IMPORT_MAX_LINE_BYTES:
+                raise ImportFormatError(f"line longer than {IMPORT_MAX_LINE_BYTES} bytes", {})
+            for line in lines:
+                if line.strip():
+                    yield line
+    if buf.strip():
+        yield buf
+
+
+def _time(value: Optional[str]) -> datetime:
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+class _Importer:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.counts = {"chats": 0, "messages": 0, "images": 0, "skipped": 0}
+        self.chat_ids: dict[int, int] = {}  # exported id -> new id
+        self.summarized: dict[int, int] = {}  # new chat id -> exported summary_until
+        self.covered: dict[int, int] = {}  # new chat id -> messages its summary covers
+        self.chats: list[tuple[int, int, dict]] = []  # (exported id, exported summary_until, row)
+        self.messages: list[dict] = []
+        self.images: list[dict] = []
+
+    def pending(self) -> int:
+        return len(self.chats) + len(self.messages) + len(self.images)
+
+    async def add(self, record: dict) -> None:
+        kind = record.get("type")
+        if kind == "export":
+            if record.get("version", EXPORT_VERSION) > EXPORT_VERSION:
+                raise ValueError(f"unsupported export version {record.get('version')}")
+            return
+        if kind == "chat":
+            self.chats.append((record["id"], int(record.get("summary_until") or 0), {
+                "user_id": self.user_id,
+                "title": record.get("title") or "New Chat",
+                "created_at": _time(record.get("created_at")),
+                "updated_at": _time(record.get("updated_at")),
+                "summary": record.get("summary") or "",
+                "summary_until": 0,  # set once the summarized messages have new ids
+                "is_book_chat": bool(record.get("is_book_chat")),
+            }))
+        elif kind in ("message", "image"):
+            if self.chats:
+                await self.flush()  # their chats need ids first
+            chat_id = self.chat_ids.get(record.get("chat_id"))
+            if chat_id is None and (kind == "message" or record.get("chat_id") is not None):
+                self.counts["skipped"] += 1  # its chat is not in the export
+                return
+            if kind == "message":
+                self.messages.append({
+                    "chat_id": chat_id,
+                    "role": record["role"],
+                    "content": record["content"],
+                    "created_at": _time(record.get("created_at")),
+                })
+                if record["id"] <= self.summarized.get(chat_id, 0):
+                    self.covered[chat_id] = self.covered.get(chat_id, 0) + 1
+            else:
+                digest = record.get("sha256")
+                if not blobstore.is_digest(digest):
+                    raise ValueError(f"image sha256 is not a SHA-256 hex digest: {digest!r}")
+                if record.get("b64"):
+                    data = base64.b64decode(record["b64"], validate=True)
+                    if await run_blocking(blobstore.put, data) != digest:
+                        raise ValueError("image bytes do not match its sha256")
+                elif not await run_blocking(blobstore.exists, digest):
+                    self.counts["skipped"] += 1  # no bytes to serve it from
+                    return
+                self.images.append({
+                    "chat_id": chat_id,
+                    "user_id": self.user_id,
+                    "title": record.get("title"),
+                    "sha256": digest,
+                    "b64": "",
+                    "created_at": _time(record.get("created_at")),
+                })
+        else:
+            self.counts["skipped"] += 1
+            return
+        if self.pending() >= IMPORT_BATCH_ROWS:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Insert everything pending in one transaction."""
+        chats, messages, images = self.chats, self.messages, self.images
+        self.chats, self.messages, self.images = [], [], []
+        async with engine.begin() as conn:
+            if chats:
+                ids = (await conn.execute(
+                    insert(Chat).returning(Chat.id, sort_by_parameter_order=True), [row for _, _, row in chats]
+                )).scalars().all()
+                for (old, until, _), new in zip(chats, ids):
+                    self.chat_ids[old] = new
+                    if until:
+                        self.summarized[new] = until
+            if messages:
+                await conn.execute(insert(Message), messages)
+            if images:
+                await conn.execute(insert(ImageAsset), images)
+        self.counts["chats"] += len(chats)
+        self.counts["messages"] += len(messages)
+        self.counts["images"] += len(images)
+
+    async def finish(self) -> dict:
+        await self.flush()
+        if self.covered:
+            # Messages were inserted in export order, so a summary covering
+            # the first n exported messages covers the first n new ids
+            async with engine.begin() as conn:
+                for chat_id, n in self.covered.items():
+                    until = (await conn.execute(
+                        sa_select(Message.id).where(Message.chat_id == chat_id)
+                        .order_by(Message.id).offset(n - 1).limit(1)
+                    )).scalar()
+                    await conn.execute(update(Chat).where(Chat.id == chat_id).values(summary_until=until))
+        return self.counts
+
+
+async def import_lines(user_id: str, lines: AsyncIterator[bytes]) -> dict:
+    """Import an export into ``user_id``'s account; returns the counts inserted.
+
+    Batches are committed as they fill, so on ImportFormatError the rows
+    before the bad line are already stored (see ``counts``).
+    """
+    importer = _Importer(user_id)
+    n = 0
+    try:
+        async for n, line in _numbered(lines):
+            await importer.add(orjson.loads(line))
+    except ImportFormatError as e:
+        raise ImportFormatError(f"line {n + 1}: {e}", importer.counts) from None
+    except (orjson.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ImportFormatError(f"line {n}: {type(e).__name__}: {e}", importer.counts) from None
+    return await importer.finish()
+
+
+async def _numbered(lines: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    n = 0
+    async for line in lines:
+        n += 1
+        yield n, line
@@ -0,0 +1,264 @@
+"""Vector-store backends behind one collection interface.
+
+VECTOR_BACKEND selects the implementation:
+
+- ``chroma_cloud`` (default): Chroma Cloud via ``chromadb.CloudClient``
+- ``chroma_local``: on-disk ``chromadb.PersistentClient`` at CHROMA_PATH
+- ``numpy``: built-in index under VECTOR_DIR; no network and no chromadb
+
+Every backend exposes the subset of the Chroma collection API that rag.py
+and ingest.py use (``query``, ``get``, ``add``, ``upsert``, ``delete``,
+``count``) plus ``query_many`` for batched lookups.
+"""
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma_cloud")
+VECTOR_DIR = os.getenv("VECTOR_DIR", "data/vectors")
+
+
+def _hits(res: dict, i: int) -> list[dict]:
+    """Flatten row ``i`` of a Chroma-shaped query result into hit dicts."""
+    ids = res["ids"][i]
+
+    def column(key: str) -> list:
+        rows = res.get(key)
+        return rows[i] if rows else [None] * len(ids)
+
+    return [
+        {"id": id_, "document": d, "metadata": m or {}, "distance": dist}
+        for id_, d, m, dist in zip(ids, column("documents"), column("metadatas"), column("distances"))
+    ]
+
+
+class ChromaCollection:
+    """Thin adapter over a chromadb collection (cloud or local)."""
+
+    def __init__(self, coll):
+        self._coll = coll
+
+    def query(self, query_embeddings, n_results: int = 3, **kwargs) -> dict:
+        return self._coll.query(query_embeddings=query_embeddings, n_results=n_results, **kwargs)
+
+    def query_many(self, query_embeddings, n_results: int = 3) -> list[list[dict]]:
+        res = self.query(query_embeddings, n_results)
+        return [_hits(res, i) for i in range(len(query_embeddings))]
+
+    def get(self, ids=None, include=None) -> dict:
+        kwargs = {"include": include} if include is not None else {}
+        return self._coll.get(ids=ids, **kwargs)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._coll.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._coll.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self._coll.delete(ids=ids)
+
+    def count(self) -> int:
+        return self._coll.count()
+
+
+class _Snapshot(NamedTuple):
+    """One loaded version of a NumpyCollection; never mutated, only replaced."""
+
+    ids: list
+    docs: list
+    metas: list
+    matrix: Any  # float32 (n, dim), memory-mapped
+    pos: dict
+    mtime: Optional[float]  # None: reload on next use
+
+
+class NumpyCollection:
+    """In-process cosine index.
+
+    Vectors are L2-normalized and stored as a float32 ``.npy`` matrix that is
+    memory-mapped on open; ids, documents and metadata live next to it in a
+    JSON file. Queries are a single matrix product plus ``argpartition``.
+    Writes rewrite both files atomically, and readers in other workers pick
+    up the new files on their next query.
+
+    The loaded files are held in one immutable ``_Snapshot`` that a reload
+    replaces in a single assignment; each read takes one reference to it,
+    so queries on pool threads never see half of an update.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._matrix_path = os.path.join(path, "vectors.npy")
+        self._meta_path = os.path.join(path, "index.json")
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> _Snapshot:
+        import numpy as np
+
+        try:
+            mtime = os.path.getmtime(self._meta_path)
+        except OSError:
+            self._snap = _Snapshot([], [], [], np.zeros((0, 0), dtype=np.float32), {}, None)
+            return self._snap
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ids = meta["ids"]
+        matrix = np.load(self._matrix_path, mmap_mode="r")
+        if len(matrix) != len(ids):
+            # A writer in another process has swapped only one file so far:
+            # keep serving the previous version and retry on the next read
+            if not hasattr(self, "_snap"):
+                self._snap = _Snapshot([], [], [], matrix[:0], {}, None)
+            return self._snap
+        self._snap = _Snapshot(
+            ids, meta["documents"], meta["metadatas"], matrix, {id_: i for i, id_ in enumerate(ids)}, mtime
+        )
+        return self._snap
+
+    def _current(self) -> _Snapshot:
+        """The up-to-date snapshot, reloading first if the files changed."""
+        snap = self._snap
+        try:
+            mtime = os.path.getmtime(self._meta_path)
+        except OSError:
+            mtime = None
+        if mtime == snap.mtime:
+            return snap
+        with self._lock:
+            return self._load()
+
+    @staticmethod
+    def _normalize(vectors):
+        import numpy as np
+
+        m = np.asarray(vectors, dtype=np.float32)
+        if m.ndim == 1:
+            m = m[None, :]
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+
+    @classmethod
+    def _top_k(cls, snap: _Snapshot, query_embeddings, k: int):
+        import numpy as np
+
+        n = len(snap.ids)
+        q = cls._normalize(query_embeddings)
+        if n == 0:
+            empty = np.zeros((len(q), 0), dtype=np.int64)
+            return empty, empty.astype(np.float32)
+        k = min(k, n)
+        scores = q @ snap.matrix.T
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    def query(self, query_embeddings, n_results: int = 3, **kwargs) -> dict:
+        snap = self._current()
+        idx, scores = self._top_k(snap, query_embeddings, n_results)
+        return {
+            "ids": [[snap.ids[j] for j in row] for row in idx],
+            "documents": [[snap.docs[j] for j in row] for row in idx],
+            "metadatas": [[snap.metas[j] for j in row] for row in idx],
+            "distances": [[float(1.0 - s) for s in row] for row in scores],
+        }
+
+    def query_many(self, query_embeddings, n_results: int = 3) -> list[list[dict]]:
+        res = self.query(query_embeddings, n_results)
+        return [_hits(res, i) for i in range(len(res["ids"]))]
+
+    def get(self, ids=None, include=None) -> dict:
+        snap = self._current()
+        rows = list(range(len(snap.ids))) if ids is None else [snap.pos[i] for i in ids if i in snap.pos]
+        res = {
+            "ids": [snap.ids[j] for j in rows],
+            "documents": [snap.docs[j] for j in rows],
+            "metadatas": [snap.metas[j] for j in rows],
+        }
+        if include and "embeddings" in include:
+            res["embeddings"] = snap.matrix[rows]
+        return res
+
+    def count(self) -> int:
+        return len(self._current().ids)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        import numpy as np
+
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        new = self._normalize(embeddings)
+        with self._lock:
+            snap = self._load()
+            matrix = np.array(snap.matrix, dtype=np.float32)
+            if matrix.size == 0:
+                matrix = np.zeros((0, new.shape[1]), dtype=np.float32)
+            ids_all, docs, metas, pos = list(snap.ids), list(snap.docs), list(snap.metas), dict(snap.pos)
+            appended = []
+            for row, (id_, d, m) in enumerate(zip(ids, documents, metadatas)):
+                j = pos.get(id_)
+                if j is None:
+                    pos[id_] = len(ids_all)
+                    ids_all.append(id_)
+                    docs.append(d)
+                    metas.append(m)
+                    appended.append(new[row])
+                else:
+                    matrix[j] = new[row]
+                    docs[j] = d
+                    metas[j] = m
+            if appended:
+                matrix = np.vstack([matrix, np.stack(appended)])
+            self._write(matrix, ids_all, docs, metas)
+
+    def delete(self, ids):
+        import numpy as np
+
+        drop = set(ids)
+        with self._lock:
+            snap = self._load()
+            keep = [j for j, id_ in enumerate(snap.ids) if id_ not in drop]
+            if len(keep) == len(snap.ids):
+                return
+            matrix = np.array(snap.matrix[keep], dtype=np.float32)
+            self._write(
+                matrix,
+                [snap.ids[j] for j in keep],
+                [snap.docs[j] for j in keep],
+                [snap.metas[j] for j in keep],
+            )
+
+    def _write(self, matrix, ids, docs, metas) -> None:
+        import numpy as np
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._matrix_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp, self._matrix_path)
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": docs, "metadatas": metas}, f, ensure_ascii=False)
+        # index.json is replaced last: its mtime is what readers watch
+        os.replace(tmp, self._meta_path)
+        self._load()
+
+
+@lru_cache
+def get_collection(name: str):
+    """Return the collection ``name`` on the configured backend."""
+    if VECTOR_BACKEND == "numpy":
+        return NumpyCollection(os.path.join(VECTOR_DIR, name))
+    if VECTOR_BACKEND in ("chroma_cloud", "chroma_local"):
+        from .chroma_client import get_or_create_collection
+
+        return ChromaCollection(get_or_create_collection(name))
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND!r}")
@@ -0,0 +1,182 @@
+"""Write-behind queue for chat and image persistence.
+
+Writes are submitted as ``async job(session) -> result`` callables and
+applied by a single consumer task on the event loop, which groups whatever
+has queued up (at most WRITE_BATCH_MAX jobs, waiting up to
+WRITE_BATCH_WINDOW_MS for more) into one transaction. Jobs never commit
+(they may ``flush`` to obtain ids); if a grouped transaction fails, its jobs
+are retried one per transaction so a bad job only fails itself.
+
+Callers that need a result (a new chat's id) await the returned future.
+Appends to a chat already known to belong to the user are not awaited;
+readers ``await wait(...)`` first so they still see their own writes.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+log = logging.getLogger(__name__)
+
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "256"))
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "2"))
+# (chat_id, user_id) pairs already verified, so appends can skip the wait
+KNOWN_CHATS = int(os.getenv("WRITE_KNOWN_CHATS", "10000"))
+
+Job = Callable[[AsyncSession], Awaitable[object]]
+
+
+class WriteBehind:
+    def __init__(self, engine=None, max_batch: int = WRITE_BATCH_MAX, window_ms: float = WRITE_BATCH_WINDOW_MS):
+        self._engine = engine
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: dict[tuple[str, object], set[asyncio.Future]] = {}
+        self._known: OrderedDict[tuple[int, str], None] = OrderedDict()
+        self.batches = 0
+        self.jobs = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from ..db import engine
+
+            self._engine = engine
+        return self._engine
+
+    def submit(self, job: Job, chat_id: Optional[int] = None, user_id: Optional[str] = None) -> asyncio.Future:
+        """Queue ``job``; the future resolves once its transaction has committed."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            # A fresh context, so the consumer doesn't inherit the first caller's trace
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+        fut = loop.create_future()
+        keys = [k for k in (("chat", chat_id), ("user", user_id)) if k[1] is not None]
+        for k in keys:
+            self._pending.setdefault(k, set()).add(fut)
+        fut.add_done_callback(lambda f: self._settle(f, keys))
+        self._queue.put_nowait((job, fut))
+        return fut
+
+    def _settle(self, fut: asyncio.Future, keys: list) -> None:
+        for k in keys:
+            futs = self._pending.get(k)
+            if futs is not None:
+                futs.discard(fut)
+                if not futs:
+                    del self._pending[k]
+        if not fut.cancelled() and fut.exception() is not None:
+            log.error("write-behind job failed", exc_info=fut.exception())
+
+    @staticmethod
+    async def _await_all(futs: set, timeout: float) -> None:
+        if futs:
+            # Shielded: a cancelled reader must not cancel the writes it waited on
+            await asyncio.wait([asyncio.shield(f) for f in futs], timeout=timeout)
+
+    async def wait(self, chat_id: Optional[int] = None, user_id: Optional[str] = None, timeout: float = 30) -> None:
+        """Wait until writes queued so far for ``chat_id`` / ``user_id`` are committed."""
+        futs = set()
+        for k in (("chat", chat_id), ("user", user_id)):
+            if k[1] is not None:
+                futs |= self._pending.get(k, set())
+        await self._await_all(futs, timeout)
+
+    async def flush(self, timeout: float = 30) -> None:
+        """Wait until everything queued so far is committed."""
+        futs = set().union(*self._pending.values()) if self._pending else set()
+        if self._task is not None and not self._task.done():
+            marker = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((_noop, marker))
+            futs.add(marker)
+        await self._await_all(futs, timeout)
+
+    async def close(self, timeout: float = 30) -> None:
+        """Flush, then stop the consumer task (app shutdown)."""
+        await self.flush(timeout)
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def remember_chat(self, chat_id: int, user_id: str) -> None:
+        self._known[(chat_id, user_id)] = None
+        self._known.move_to_end((chat_id, user_id))
+        while len(self._known) > KNOWN_CHATS:
+            self._known.popitem(last=False)
+
+    def forget_chat(self, chat_id: int) -> None:
+        for key in [k for k in self._known if k[0] == chat_id]:
+            del self._known[key]
+
+    def owns(self, chat_id: Optional[int], user_id: str) -> bool:
+        return chat_id is not None and (chat_id, user_id) in self._known
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), remaining) if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+            await self._apply(batch)
+
+    async def _apply(self, batch: list[tuple[Job, asyncio.Future]]) -> None:
+        batch = [(job, fut) for job, fut in batch if not fut.done()]
+        if not batch:
+            return
+        try:
+            async with AsyncSession(self.engine, expire_on_commit=False) as s:
+                # One flush at commit lets the ORM batch the inserts
+                with s.no_autoflush:
+                    results = [await job(s) for job, _ in batch]
+                await s.commit()
+        except Exception:
+            # Isolate the failure: one transaction per job
+            for job, fut in batch:
+                try:
+                    async with AsyncSession(self.engine, expire_on_commit=False) as s:
+                        result = await job(s)
+                        await s.commit()
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    if not fut.done():
+                        fut.set_result(result)
+            self.batches += len(batch)
+        else:
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+            self.batches += 1
+        self.jobs += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "jobs": self.jobs,
+            "transactions": self.batches,
+            "jobs_per_transaction": self.jobs / self.batches if self.batches else 0.0,
+        }
+
+
+async def _noop(s) -> None:
+    return None
+
+
+writer = WriteBehind()
@@ -0,0 +1,158 @@
+"""Prewarming and readiness.
+
+Heavy dependencies (the OpenAI SDK and httpx, chromadb, numpy, Pillow,
+tiktoken) are imported where they are first used, so importing the app
+stays cheap and a worker only loads what its traffic needs. Before the
+worker reports ready, the PREWARM steps pay those first-use costs instead
+of the first requests:
+
+- ``catalog``: parse book_summaries.json and build the title indexes
+- ``vectors``: resolve the vector collection (chromadb client and collection, or the numpy index)
+- ``lexical``, ``similar``: load the BM25 index and the similarity graph
+- ``tokenizer``: load the tiktoken encoding for CHAT_MODEL
+- ``openai``: import the SDK and open PREWARM_CONNECTIONS pooled connections
+
+Steps run concurrently after migrations, blocking work off the event loop,
+each bounded by PREWARM_TIMEOUT seconds. A failed step is logged and
+reported but does not hold back readiness: its work then happens on first
+use, as it would without prewarming.
+
+Imported first by ``app.main``, so ``import_ms`` in the report covers the
+whole app.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+from typing import Optional
+
+_started = time.perf_counter()
+
+log = logging.getLogger(__name__)
+
+PREWARM = [s.strip() for s in os.getenv("PREWARM", "catalog,vectors,lexical,similar,tokenizer,openai").split(",")
+           if s.strip()]
+PREWARM_TIMEOUT = float(os.getenv("PREWARM_TIMEOUT", "30"))
+PREWARM_CONNECTIONS = int(os.getenv("PREWARM_CONNECTIONS", "2"))
+# Deferred imports; the report lists which ones this process has loaded
+HEAVY_MODULES = ("openai", "httpx", "chromadb", "numpy", "PIL", "tiktoken")
+
+
+async def _catalog() -> None:
+    from .services.catalog import catalog
+    from .services.concurrency import run_blocking
+
+    await run_blocking(catalog.books)
+
+
+async def _vectors() -> None:
+    from .services.concurrency import run_blocking
+    from .services.vector_store import get_collection
+
+    await run_blocking(get_collection, "book_summaries")
+
+
+async def _lexical() -> None:
+    from .services import lexical
+    from .services.concurrency import run_blocking
+
+    await run_blocking(lexical.get_index().load)
+
+
+async def _similar() -> None:
+    from .services import similar
+    from .services.concurrency import run_blocking
+
+    await run_blocking(similar.get_graph().load)
+
+
+async def _tokenizer() -> None:
+    from .routers.chat import CHAT_MODEL
+    from .services.concurrency import run_blocking
+    from .services.context import count_tokens
+
+    await run_blocking(count_tokens, "", CHAT_MODEL)
+
+
+async def _openai() -> None:
+    from .services import gateway
+    from .services.concurrency import run_blocking
+
+    # About a second of imports; keep them off the event loop
+    await run_blocking(importlib.import_module, "openai")
+    await gateway.prewarm(PREWARM_CONNECTIONS)
+
+
+STEPS = {
+    "catalog": _catalog,
+    "vectors": _vectors,
+    "lexical": _lexical,
+    "similar": _similar,
+    "tokenizer": _tokenizer,
+    "openai": _openai,
+}
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class Readiness:
+    def __init__(self):
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.steps: dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_seconds is not None
+
+    def imported(self) -> None:
+        """Record the app's import time (end of ``app.main``)."""
+        self.import_seconds = time.perf_counter() - _started
+
+    def start(self) -> None:
+        """Prewarm in the background; the worker is ready when it finishes."""
+        self._task = asyncio.get_running_loop().create_task(self._prewarm())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _prewarm(self) -> None:
+        await asyncio.gather(*(self._step(name) for name in PREWARM))
+        self.ready_seconds = time.perf_counter() - _started
+        log.info(
+            "ready in %.0f ms (imports %.0f ms; prewarm %s)", self.ready_seconds * 1000,
+            (self.import_seconds or 0) * 1000, ", ".join(f"{k} {v['ms']:.0f} ms" for k, v in self.steps.items()),
+        )
+
+    async def _step(self, name: str) -> None:
+        t = time.perf_counter()
+        try:
+            step = STEPS.get(name)
+            if step is None:
+                raise ValueError(f"unknown step (one of {', '.join(STEPS)})")
+            await asyncio.wait_for(step(), PREWARM_TIMEOUT)
+        except Exception as e:
+            log.warning("prewarm %s failed: %s: %s", name, type(e).__name__, e)
+            self.steps[name] = {"ms": _ms(time.perf_counter() - t), "ok": False, "error": f"{type(e).__name__}: {e}"}
+        else:
+            self.steps[name] = {"ms": _ms(time.perf_counter() - t), "ok": True}
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "import_ms": _ms(self.import_seconds),
+            "ready_ms": _ms(self.ready_seconds),
+            "prewarm": self.steps,
+            "loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+        }
+
+
+readiness = Readiness()
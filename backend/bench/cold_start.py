@@ -0,0 +1,107 @@
+"""Cold-start report: import time, time to ready and first-request latency.
+
+Imports ``app.main`` under ``python -X importtime`` RUNS times and reports
+the median import time per top-level package and for the app's own modules.
+Then starts the backend (fake OpenAI server and throwaway data, as in
+bench.load) RUNS times with prewarming and RUNS times without, and reports
+the seconds until /health and /ready answer, the first and second /chat
+latency, and the worker's own /ready report.
+
+    cd backend && python -m bench.cold_start [--runs 3] [--top 12]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .load import BACKEND_DIR, QUESTIONS, Stack
+
+
+def import_times(runs: int) -> list[dict[str, int]]:
+    """Per run: microseconds of import time by module (self time) plus ``total``."""
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-bench")}
+    results = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app.main"],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        modules: dict[str, int] = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = int(self_us)
+            if name.strip() == "app.main":
+                modules["total"] = int(cumulative_us)
+        results.append(modules)
+    return results
+
+
+def _median_by(runs: list[dict[str, int]], key) -> dict[str, float]:
+    grouped: list[dict[str, int]] = []
+    for modules in runs:
+        sums: dict[str, int] = {}
+        for name, us in modules.items():
+            group = key(name) if name != "total" else None
+            if group:
+                sums[group] = sums.get(group, 0) + us
+        grouped.append(sums)
+    names = set().union(*grouped)
+    return {n: statistics.median(g.get(n, 0) for g in grouped) / 1000 for n in names}
+
+
+def report_imports(runs: int, top: int) -> None:
+    times = import_times(runs)
+    total = statistics.median(t["total"] for t in times) / 1000
+    print(f"import app.main: {total:.0f} ms (median of {runs})")
+    packages = _median_by(times, lambda n: n.split(".")[0])
+    print("\nby package (self time, ms):")
+    for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {name:<28} {ms:7.1f}  {ms / total * 100:4.0f}%")
+    own = _median_by(times, lambda n: n if n.startswith("app.") else None)
+    print("\napp modules (self time, ms):")
+    for name, ms in sorted(own.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {name:<28} {ms:7.1f}")
+
+
+def _chat_ms(client: httpx.Client, i: int) -> float:
+    start = time.perf_counter()
+    r = client.post("/chat", params={"user_id": "cold"}, json={"message": QUESTIONS[i % len(QUESTIONS)]})
+    r.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def report_startup(runs: int, fake_args: list[str]) -> None:
+    print(f"\n{'':>10}  {'live s':>7}  {'ready s':>7}  {'1st chat ms':>11}  {'2nd chat ms':>11}")
+    for label, prewarm in (("prewarm", None), ("no prewarm", "")):
+        rows, report = [], {}
+        for _ in range(runs):
+            env = {} if prewarm is None else {"PREWARM": prewarm}
+            with Stack(1, fake_args, env) as stack, httpx.Client(base_url=stack.url, timeout=60) as client:
+                report = client.get("/ready").json()
+                rows.append((stack.live_seconds, stack.ready_seconds, _chat_ms(client, 0), _chat_ms(client, 1)))
+        live, ready, first, second = (statistics.median(col) for col in zip(*rows))
+        print(f"{label:>10}  {live:7.2f}  {ready:7.2f}  {first:11.0f}  {second:11.0f}")
+        steps = ", ".join(f"{k} {v['ms']:.0f}" + ("" if v["ok"] else " (failed)") for k, v in report["prewarm"].items())
+        print(f"{'':>10}  imports {report['import_ms']:.0f} ms, ready at {report['ready_ms']:.0f} ms"
+              + (f"; prewarm ms: {steps}" if steps else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="rows per import table")
+    parser.add_argument("--imports-only", action="store_true", help="skip starting the backend")
+    args, fake_args = parser.parse_known_args()  # the rest (e.g. --chat-ms 100) goes to the fake server
+    report_imports(args.runs, args.top)
+    if not args.imports_only:
+        report_startup(args.runs, fake_args)
+
+
+if __name__ == "__main__":
+    main()
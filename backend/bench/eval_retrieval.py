@@ -0,0 +1,84 @@
+"""Offline retrieval evaluation: vector-only vs BM25-only vs hybrid (RRF).
+
+Runs a labelled query set against the ingested index and reports recall@k,
+MRR, how often the hybrid path skipped the embedding call, and mean latency.
+Queries come from a JSON file of ``[{"query": ..., "expected": [book ids]}]``
+or, by default, the small built-in set below.
+
+    cd backend && python ingest.py && python -m bench.eval_retrieval [--queries FILE] [--k 3]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services import lexical
+from app.services.concurrency import run_blocking
+from app.services.embeddings import embed_query
+from app.services.rag import FUSION_DEPTH, retrieve_hits
+from app.services.vector_store import get_collection
+
+QUERIES = [
+    {"query": "I want a book about friendship and magic", "expected": ["the-hobbit", "name-of-the-wind"]},
+    # Asks for other books: the named one is not a correct answer
+    {"query": "something like The Hobbit", "expected": ["name-of-the-wind", "hitchhikers-guide"]},
+    {"query": "dystopian novel about surveillance and a totalitarian state", "expected": ["1984"]},
+    {"query": "a witty romance about first impressions and class", "expected": ["pride-and-prejudice"]},
+    {"query": "desert planet, politics and ecology", "expected": ["dune"]},
+    {"query": "teenage alienation in New York", "expected": ["catcher-in-the-rye"]},
+    {"query": "wealth, obsession and the American dream in the jazz age", "expected": ["the-great-gatsby"]},
+    {"query": "racial injustice in a small southern town seen by a child", "expected": ["to-kill-a-mockingbird"]},
+    {"query": "father and son surviving after the apocalypse", "expected": ["the-road"]},
+    {"query": "a shepherd follows his dream and personal legend", "expected": ["the-alchemist"]},
+    {"query": "funny science fiction road trip through space", "expected": ["hitchhikers-guide"]},
+    {"query": "guilt and redemption after a murder", "expected": ["crime-and-punishment"]},
+    {"query": "Crime and Punishment", "expected": ["crime-and-punishment"]},
+    {"query": "Vreau o carte despre prietenie și magie.", "expected": ["the-hobbit", "name-of-the-wind"]},
+]
+
+
+async def _vector(query: str, k: int) -> list[dict]:
+    coll = await run_blocking(get_collection, "book_summaries")
+    return (await run_blocking(coll.query_many, [await embed_query(query)], k))[0]
+
+
+async def _lexical(query: str, k: int) -> list[dict]:
+    return (await run_blocking(lexical.get_index().search, query, k))["hits"]
+
+
+async def _hybrid(query: str, k: int) -> list[dict]:
+    return await retrieve_hits(query, k)
+
+
+async def evaluate(queries: list[dict], k: int) -> None:
+    print(f"{len(queries)} queries, k={k}, fusion depth {FUSION_DEPTH}")
+    for name, fn in (("vector", _vector), ("bm25", _lexical), ("hybrid", _hybrid)):
+        recall = mrr = elapsed = 0.0
+        for q in queries:
+            start = time.perf_counter()
+            ids = [h["id"] for h in await fn(q["query"], k)]
+            elapsed += time.perf_counter() - start
+            expected = set(q["expected"])
+            recall += bool(expected & set(ids))
+            mrr += next((1.0 / (i + 1) for i, id_ in enumerate(ids) if id_ in expected), 0.0)
+        n = len(queries)
+        print(f"{name:>7}: recall@{k} {recall / n:.2f}  MRR {mrr / n:.2f}  {elapsed / n * 1000:7.1f} ms/query")
+
+    shortcut = sum(lexical.get_index().search(q["query"], FUSION_DEPTH)["confident"] for q in queries)
+    print(f"hybrid answered {shortcut}/{len(queries)} queries without an embedding call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="JSON file of {query, expected} objects")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = json.load(f)
+    asyncio.run(evaluate(queries, args.k))
+
+
+if __name__ == "__main__":
+    main()
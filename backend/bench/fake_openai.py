@@ -0,0 +1,205 @@
+"""Fake OpenAI-compatible API for offline benchmarks.
+
+Implements the endpoints the backend calls (chat completions with tool calls
+and streaming, embeddings, moderations, images, speech, transcriptions, and
+the models list used for connection prewarming) with
+deterministic payloads and configurable latency, so load tests measure the
+backend rather than the network or the bill.
+
+    cd backend && python -m bench.fake_openai --port 8900 --chat-ms 300
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import zlib
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+LATENCY_MS = {
+    "chat": float(os.getenv("FAKE_CHAT_MS", "300")),
+    "token": float(os.getenv("FAKE_TOKEN_MS", "15")),
+    "embeddings": float(os.getenv("FAKE_EMBED_MS", "40")),
+    "moderation": float(os.getenv("FAKE_MODERATION_MS", "30")),
+    "image": float(os.getenv("FAKE_IMAGE_MS", "1500")),
+    "speech": float(os.getenv("FAKE_SPEECH_MS", "200")),
+    "transcription": float(os.getenv("FAKE_STT_MS", "400")),
+}
+JITTER = float(os.getenv("FAKE_JITTER", "0.2"))  # +/- fraction of each latency
+EMBED_DIM = 1536
+REPLY = (
+    "Based on what you enjoy, I would suggest The Hobbit. It is a warm, funny adventure about an "
+    "unlikely hero, loyal friends and a dragon, and it reads quickly while still feeling epic."
+)
+
+
+async def _sleep(kind: str) -> None:
+    ms = LATENCY_MS[kind]
+    if ms > 0:
+        await asyncio.sleep(ms * random.uniform(1 - JITTER, 1 + JITTER) / 1000)
+
+
+def _vector(text: str) -> list[float]:
+    # Deterministic unit-ish vector, so identical texts embed identically
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    rnd = random.Random(seed)
+    return [rnd.uniform(-1, 1) for _ in range(EMBED_DIM)]
+
+
+def _png(size: int = 64) -> bytes:
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + bytes(random.randrange(256) for _ in range(size * 3)) for _ in range(size))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    p, c = len(prompt) // 4 + 1, len(completion) // 4 + 1
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+async def chat(req: Request):
+    body = await req.json()
+    msgs = body["messages"]
+    prompt = json.dumps(msgs)
+    # Call the summary tool on the first book turn, like the real model tends to
+    wants_tool = bool(body.get("tools")) and msgs[-1]["role"] == "user"
+    await _sleep("chat")
+    base = {"id": "chatcmpl-fake", "created": 0, "model": body["model"]}
+    tool_call = {"id": "call_fake", "type": "function",
+                 "function": {"name": "get_summary_by_title", "arguments": '{"title": "The Hobbit"}'}}
+
+    if body.get("stream"):
+        async def events():
+            def event(delta: dict, finish=None) -> str:
+                choice = {"index": 0, "delta": delta, "finish_reason": finish}
+                return "data: " + json.dumps({**base, "object": "chat.completion.chunk", "choices": [choice]}) + "\n\n"
+
+            if wants_tool:
+                args = tool_call["function"]["arguments"]
+                yield event({"tool_calls": [{"index": 0, "id": tool_call["id"], "type": "function",
+                                             "function": {"name": "get_summary_by_title", "arguments": args[:8]}}]})
+                yield event({"tool_calls": [{"index": 0, "function": {"arguments": args[8:]}}]})
+                yield event({}, "tool_calls")
+            else:
+                for word in REPLY.split(" "):
+                    await _sleep("token")
+                    yield event({"content": word + " "})
+                yield event({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    if wants_tool:
+        message, finish, text = {"role": "assistant", "content": None, "tool_calls": [tool_call]}, "tool_calls", ""
+    else:
+        message, finish, text = {"role": "assistant", "content": REPLY}, "stop", REPLY
+    return JSONResponse({
+        **base,
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+        "usage": _usage(prompt, text),
+    })
+
+
+async def embeddings(req: Request):
+    body = await req.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await _sleep("embeddings")
+    return JSONResponse({
+        "object": "list",
+        "model": body["model"],
+        "data": [{"object": "embedding", "index": i, "embedding": _vector(t)} for i, t in enumerate(inputs)],
+        "usage": {"prompt_tokens": sum(len(t) // 4 + 1 for t in inputs), "total_tokens": 0},
+    })
+
+
+async def moderations(req: Request):
+    body = await req.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await _sleep("moderation")
+    return JSONResponse({
+        "id": "modr-fake",
+        "model": body.get("model", "omni-moderation-latest"),
+        "results": [{"flagged": False, "categories": {}, "category_scores": {}} for _ in inputs],
+    })
+
+
+async def images(req: Request):
+    await req.json()
+    await _sleep("image")
+    return JSONResponse({"created": 0, "data": [{"b64_json": base64.b64encode(_png()).decode("ascii")}]})
+
+
+async def speech(req: Request):
+    body = await req.json()
+    await _sleep("speech")
+    seed = hashlib.sha256(body["input"].encode("utf-8")).digest()
+
+    async def audio():
+        # ~1 KB of "audio" per 10 characters, in 4 KB chunks
+        remaining = max(len(body["input"]) * 100, 4096)
+        while remaining > 0:
+            n = min(remaining, 4096)
+            yield (seed * (n // len(seed) + 1))[:n]
+            remaining -= n
+            await asyncio.sleep(0)
+
+    return StreamingResponse(audio(), media_type="audio/mpeg")
+
+
+async def transcriptions(req: Request):
+    form = await req.form()
+    data = await form["file"].read()
+    await _sleep("transcription")
+    return JSONResponse({"text": f"Recommend me a book like the one I heard about ({len(data)} bytes)."})
+
+
+async def models(req: Request):
+    return JSONResponse({"object": "list", "data": [
+        {"id": m, "object": "model", "created": 0, "owned_by": "fake"}
+        for m in ("gpt-4o-mini", "text-embedding-3-small", "dall-e-3", "tts-1", "whisper-1")
+    ]})
+
+
+app = Starlette(routes=[
+    Route("/v1/chat/completions", chat, methods=["POST"]),
+    Route("/v1/embeddings", embeddings, methods=["POST"]),
+    Route("/v1/moderations", moderations, methods=["POST"]),
+    Route("/v1/images/generations", images, methods=["POST"]),
+    Route("/v1/audio/speech", speech, methods=["POST"]),
+    Route("/v1/audio/transcriptions", transcriptions, methods=["POST"]),
+    Route("/v1/models", models),
+    Route("/health", lambda req: Response("ok")),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    for kind in LATENCY_MS:
+        parser.add_argument(f"--{kind}-ms", type=float, default=LATENCY_MS[kind])
+    args = parser.parse_args()
+    for kind in LATENCY_MS:
+        LATENCY_MS[kind] = getattr(args, f"{kind}_ms")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Offline load benchmark for the HTTP API.
+
+Starts the fake OpenAI server (bench/fake_openai.py) and the backend under
+uvicorn against throwaway data directories (numpy vector store seeded by
+ingest.py, fresh SQLite, blob and TTS cache dirs), then drives concurrent
+scenarios and reports throughput and p50/p95/p99 latency per endpoint.
+Results are written as JSON under RESULTS_DIR so runs can be compared:
+
+    cd backend && python -m bench.load [--scenarios chat,chats] [--concurrency 32]
+        [--requests 200] [--workers 1] [--compare [FILE]]
+
+Pass ``--url`` to benchmark an already running backend instead (it must be
+pointed at a fake or real OpenAI-compatible API by its own environment).
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+BACKEND_DIR = pathlib.Path(__file__).resolve().parents[1]
+RESULTS_DIR = pathlib.Path(os.getenv("BENCH_RESULTS_DIR", BACKEND_DIR / "data" / "bench"))
+USERS = 20
+QUESTIONS = [
+    "Can you recommend a book about friendship and magic?",
+    "I want a novel like The Hobbit",
+    "What should I read after Dune?",
+    "Recommend a dystopian story about surveillance",
+    "Tell me about a funny science fiction book",
+    "Any classic romance novels you would suggest?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30, interval: float = 0.2) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{' '.join(proc.args)} exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(interval)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+class Stack:
+    """Fake upstream + backend processes over a temporary data directory."""
+
+    def __init__(self, workers: int, fake_args: list[str], app_env: dict | None = None):
+        self.workers = workers
+        self.fake_args = fake_args
+        self.app_env = app_env or {}
+        self.procs: list[subprocess.Popen] = []
+        self.tmp = tempfile.TemporaryDirectory(prefix="bench-")
+        self.url = ""
+        # Seconds from spawning uvicorn until /health and /ready answer 200
+        self.live_seconds = self.ready_seconds = 0.0
+
+    def __enter__(self):
+        data = pathlib.Path(self.tmp.name)
+        fake_port, app_port = _free_port(), _free_port()
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+            "VECTOR_BACKEND": "numpy",
+            "VECTOR_DIR": str(data / "vectors"),
+            "LEXICAL_DIR": str(data / "lexical"),
+            "SIMILAR_DIR": str(data / "similar"),
+            "DB_URL": f"sqlite:///{data / 'app.db'}",
+            "BLOB_DIR": str(data / "blobs"),
+            "TTS_CACHE_DIR": str(data / "tts_cache"),
+            "EMBED_CACHE_PATH": str(data / "embed_cache.db"),
+            # The /stt clips are random bytes, not audio: no length limit, so no ffmpeg is needed
+            "STT_MAX_SECONDS": "0",
+        }
+        self._spawn([sys.executable, "-m", "bench.fake_openai", "--port", str(fake_port), *self.fake_args], env)
+        _wait_ready(f"http://127.0.0.1:{fake_port}/health", self.procs[-1])
+        subprocess.run([sys.executable, "ingest.py"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        started = time.monotonic()
+        self._spawn([
+            sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+            "--workers", str(self.workers), "--log-level", "warning", "--no-access-log",
+        ], {**env, **self.app_env})
+        self.url = f"http://127.0.0.1:{app_port}"
+        _wait_ready(f"{self.url}/health", self.procs[-1], interval=0.01)
+        self.live_seconds = time.monotonic() - started
+        _wait_ready(f"{self.url}/ready", self.procs[-1], interval=0.01)
+        self.ready_seconds = time.monotonic() - started
+        return self
+
+    def _spawn(self, args: list[str], env: dict) -> None:
+        self.procs.append(subprocess.Popen(args, cwd=BACKEND_DIR, env=env))
+
+    def __exit__(self, *exc):
+        for p in reversed(self.procs):
+            p.terminate()
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        self.tmp.cleanup()
+
+
+class Fixtures:
+    """Chats and images created up front so read scenarios have data."""
+
+    def __init__(self):
+        self.chats: dict[str, list[int]] = {}
+
+    async def seed(self, client: httpx.AsyncClient) -> None:
+        async def one(u: int):
+            user = f"bench-{u}"
+            for q in QUESTIONS[:3]:
+                chat_id = (self.chats.get(user) or [None])[-1]
+                r = await client.post("/chat", params={"user_id": user}, json={"message": q, "chat_id": chat_id})
+                r.raise_for_status()
+                if chat_id is None:
+                    self.chats[user] = [r.json()["chat_id"]]
+            await client.get("/image", params={"prompt": "a cozy reading nook", "user_id": user})
+
+        await asyncio.gather(*(one(u) for u in range(USERS)))
+
+    def user(self) -> str:
+        return f"bench-{random.randrange(USERS)}"
+
+    def chat(self) -> tuple[str, int]:
+        user = random.choice([u for u, ids in self.chats.items() if ids])
+        return user, random.choice(self.chats[user])
+
+
+# Each scenario issues one request and returns the response
+async def _chat(client, fx: Fixtures, i: int):
+    if i % 2:
+        user, chat_id = fx.chat()
+    else:
+        user, chat_id = fx.user(), None
+    return await client.post("/chat", params={"user_id": user},
+                             json={"message": QUESTIONS[i % len(QUESTIONS)], "chat_id": chat_id})
+
+
+async def _image(client, fx: Fixtures, i: int):
+    return await client.get("/image", params={"prompt": f"book cover number {i}", "user_id": fx.user()})
+
+
+async def _chats(client, fx: Fixtures, i: int):
+    return await client.get("/chats", params={"user_id": fx.user()})
+
+
+async def _chat_detail(client, fx: Fixtures, i: int):
+    user, chat_id = fx.chat()
+    return await client.get(f"/chats/{chat_id}", params={"user_id": user})
+
+
+async def _images(client, fx: Fixtures, i: int):
+    return await client.get("/images", params={"user_id": fx.user()})
+
+
+async def _tts(client, fx: Fixtures, i: int):
+    # A few distinct texts, so the mix includes both cache misses and hits
+    return await client.get("/tts", params={"text": f"{QUESTIONS[i % len(QUESTIONS)]} ({i % 10})"})
+
+
+async def _stt(client, fx: Fixtures, i: int):
+    audio = os.urandom(32 * 1024)
+    return await client.post("/stt", files={"file": ("clip.webm", audio, "audio/webm")})
+
+
+SCENARIOS = {
+    "chat": _chat,
+    "image": _image,
+    "chats": _chats,
+    "chat_detail": _chat_detail,
+    "images": _images,
+    "tts": _tts,
+    "stt": _stt,
+}
+
+
+def _percentile(sorted_ms: list[float], p: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    idx = min(len(sorted_ms) - 1, max(0, round(p / 100 * len(sorted_ms)) - 1))
+    return sorted_ms[idx]
+
+
+async def run_scenario(client: httpx.AsyncClient, fx: Fixtures, name: str, requests: int, concurrency: int) -> dict:
+    fn = SCENARIOS[name]
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                r = await fn(client, fx, i)
+                await r.aread()
+                ok, key = r.status_code < 400, str(r.status_code)
+            except httpx.HTTPError as e:
+                ok, key = False, type(e).__name__
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors[key] = errors.get(key, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        **{f"p{p}_ms": round(_percentile(latencies, p), 1) for p in (50, 95, 99)},
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+    }
+
+
+async def bench(url: str, scenarios: list[str], requests: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        fx = Fixtures()
+        await fx.seed(client)
+        results = {}
+        for name in scenarios:
+            results[name] = await run_scenario(client, fx, name, requests, concurrency)
+            _print_row(name, results[name])
+        return results
+
+
+def _print_row(name: str, r: dict, base: dict | None = None) -> None:
+    line = (f"{name:>12}: {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f}  p95 {r['p95_ms']:7.1f}  "
+            f"p99 {r['p99_ms']:7.1f} ms  errors {sum(r['errors'].values())}")
+    if base:
+        line += (f"  | rps {_delta(r['rps'], base['rps'])}  p95 {_delta(r['p95_ms'], base['p95_ms'])}"
+                 f"  p99 {_delta(r['p99_ms'], base['p99_ms'])}")
+    print(line)
+
+
+def _delta(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _previous() -> pathlib.Path | None:
+    runs = sorted(RESULTS_DIR.glob("*.json"))
+    return runs[-1] if runs else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--url", help="benchmark a running backend instead of starting one")
+    parser.add_argument("--compare", nargs="?", const="latest", help="compare with a results file (default: the latest)")
+    parser.add_argument("--no-save", action="store_true")
+    args, fake_args = parser.parse_known_args()  # the rest (e.g. --chat-ms 100) goes to the fake server
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    baseline_path = _previous() if args.compare == "latest" else args.compare and pathlib.Path(args.compare)
+
+    if args.url:
+        results = asyncio.run(bench(args.url, scenarios, args.requests, args.concurrency))
+    else:
+        with Stack(args.workers, fake_args) as stack:
+            results = asyncio.run(bench(stack.url, scenarios, args.requests, args.concurrency))
+
+    if baseline_path:
+        baseline = json.loads(baseline_path.read_text())
+        print(f"\ncompared with {baseline_path.name} ({baseline.get('git_rev')}):")
+        for name, r in results.items():
+            _print_row(name, r, baseline["scenarios"].get(name))
+
+    if not args.no_save:
+        now = datetime.now(timezone.utc)
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        out = RESULTS_DIR / f"{now:%Y%m%dT%H%M%SZ}.json"
+        out.write_text(json.dumps({
+            "created_at": now.isoformat(),
+            "git_rev": _git_rev(),
+            "workers": args.workers,
+            "fake_args": fake_args,
+            "scenarios": results,
+        }, indent=2))
+        print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Chat-turn write throughput: per-request transactions vs. the write-behind queue.
+
+Each "turn" is what /chat persists: look up the chat, append a user and an
+assistant message, bump Chat.updated_at. WORKERS concurrent tasks write
+TURNS turns each against a fresh SQLite file (aiosqlite, like the app), in
+three configurations:
+
+- before: default engine (rollback journal), one session and commit per turn
+- tuned: WAL + synchronous=NORMAL + busy timeout, still one commit per turn
+- write-behind: tuned engine, turns grouped into shared transactions
+
+    cd backend && python -m bench.write_throughput [--workers 16] [--turns 200]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import Chat, Message
+from app.services.write_behind import WriteBehind
+
+
+async def _engine(path: str, tuned: bool):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        connect_args={"timeout": 30},
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=32,
+        max_overflow=0,
+    )
+    if tuned:
+        @event.listens_for(engine.sync_engine, "connect")
+        def _pragmas(conn, _record):
+            cur = conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA busy_timeout=30000")
+            cur.close()
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    return engine
+
+
+async def _seed(engine, n: int) -> list[int]:
+    async with AsyncSession(engine, expire_on_commit=False) as s:
+        chats = [Chat(user_id=f"u{i}", title="bench") for i in range(n)]
+        s.add_all(chats)
+        await s.commit()
+        return [c.id for c in chats]
+
+
+async def _turn(s: AsyncSession, chat_id: int, user_id: str, i: int) -> int:
+    chat = (await s.exec(select(Chat).where(Chat.id == chat_id, Chat.user_id == user_id))).first()
+    s.add(Message(chat_id=chat.id, role="user", content=f"question {i}"))
+    s.add(Message(chat_id=chat.id, role="assistant", content=f"answer {i} " * 20))
+    chat.updated_at = datetime.utcnow()
+    s.add(chat)
+    return chat.id
+
+
+async def _direct(engine, chat_ids: list[int], turns: int) -> None:
+    async def worker(w: int):
+        for i in range(turns):
+            async with AsyncSession(engine) as s:
+                await _turn(s, chat_ids[w], f"u{w}", i)
+                await s.commit()
+
+    await asyncio.gather(*(worker(w) for w in range(len(chat_ids))))
+
+
+async def _write_behind(engine, chat_ids: list[int], turns: int) -> dict:
+    writer = WriteBehind(engine)
+
+    async def worker(w: int):
+        await asyncio.gather(*(
+            writer.submit(lambda s, i=i: _turn(s, chat_ids[w], f"u{w}", i), chat_id=chat_ids[w])
+            for i in range(turns)
+        ))
+
+    await asyncio.gather(*(worker(w) for w in range(len(chat_ids))))
+    await writer.close()
+    return writer.stats()
+
+
+async def run(workers: int, turns: int) -> None:
+    total = workers * turns
+    with tempfile.TemporaryDirectory() as d:
+        for name, tuned, batched in (("before", False, False), ("tuned", True, False), ("write-behind", True, True)):
+            engine = await _engine(os.path.join(d, f"{name}.db"), tuned)
+            chat_ids = await _seed(engine, workers)
+            start = time.perf_counter()
+            extra = await _write_behind(engine, chat_ids, turns) if batched else None
+            if not batched:
+                await _direct(engine, chat_ids, turns)
+            elapsed = time.perf_counter() - start
+            async with AsyncSession(engine) as s:
+                assert len((await s.exec(select(Message.id))).all()) == 2 * total
+            await engine.dispose()
+            line = f"{name:>13}: {total} turns in {elapsed:6.2f}s  {total / elapsed:8.0f} turns/s"
+            if extra:
+                line += f"  ({extra['jobs_per_transaction']:.1f} turns/transaction)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.workers, args.turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,187 @@
-import json, os
-from app.services.chroma_client import get_or_create_collection
-from app.services.embeddings import embed_texts
+"""Incremental ingest of app/data/book_summaries.json into the vector store.
 
-def load_books(path="app/data/book_summaries.json"):
+Books are streamed from the JSON file, hashed, and only new or changed ones
+are embedded (in bounded batches, several in flight at once) and upserted;
+books no longer in the file are deleted from the store. Re-running on an
+unchanged catalog makes no embedding calls. Transient API errors are
+retried by the OpenAI gateway (EMBEDDINGS_RETRIES). The BM25
+keyword index (app/services/lexical.py) is rebuilt from the file each run,
+and the "more like this" graph (app/services/similar.py) whenever vectors
+were written.
+
+    python ingest.py [--path FILE] [--workers N] [--force]
+"""
+import argparse, asyncio, hashlib, json, os, time
+from app.services.vector_store import get_collection
+from app.services.embeddings import EMBED_MODEL, embed_texts
+from app.services.concurrency import run_blocking
+from app.services import lexical, similar
+
+COLLECTION = "book_summaries"
+# Per-request limits: stay well under the API's input count and token caps
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+# Books whose hashes are checked together, and rows per vector-store write
+READ_CHUNK = 1000
+WRITE_BATCH = int(os.getenv("INGEST_WRITE_BATCH", "2048"))
+
+def iter_books(path="app/data/book_summaries.json", bufsize=1 << 16):
+    """Yield the objects of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        buf, pos, started = "", 0, False
+        while True:
+            chunk = f.read(bufsize)
+            buf = buf[pos:] + chunk
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if not started:
+                    if pos >= len(buf):
+                        break
+                    if buf[pos] != "[":
+                        raise ValueError(f"{path}: expected a JSON array")
+                    started, pos = True, pos + 1
+                    continue
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise
+                    break  # object continues in the next chunk
+                yield obj
+                pos = end
+            if not chunk:
+                return
 
-def run():
-    books = load_books()
-    ids = [b["id"] for b in books]
+def load_books(path="app/data/book_summaries.json"):
+    return list(iter_books(path))
+
+def to_record(b: dict) -> dict:
     # Include title + blurb to slightly improve retrieval
-    documents = [f"{b['title']} — {b['summary_short']} Themes: {', '.join(b['themes'])}" for b in books]
-    metadatas = [{"title": b["title"], "themes": ", ".join(b["themes"])} for b in books]
-    embeddings = embed_texts(documents)
+    document = f"{b['title']} — {b['summary_short']} Themes: {', '.join(b['themes'])}"
+    metadata = {"title": b["title"], "themes": ", ".join(b["themes"])}
+    digest = hashlib.sha256(
+        json.dumps([EMBED_MODEL, document, metadata], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    metadata["content_hash"] = digest
+    return {"id": b["id"], "document": document, "metadata": metadata}
+
+def _batches(records: list[dict]):
+    """Split records into embedding requests bounded by count and ~tokens (4 chars each)."""
+    batch, tokens = [], 0
+    for r in records:
+        t = len(r["document"]) // 4 + 1
+        if batch and (len(batch) >= EMBED_BATCH_SIZE or tokens + t > EMBED_BATCH_TOKENS):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(r)
+        tokens += t
+    if batch:
+        yield batch
+
+def _stored_hashes(coll, ids: list[str]) -> dict[str, str]:
+    res = coll.get(ids=ids, include=["metadatas"])
+    return {id_: (m or {}).get("content_hash") for id_, m in zip(res["ids"], res["metadatas"] or [])}
+
+def _delete_missing(coll, seen: set[str]) -> int:
+    """Delete stored books that are not in ``seen``; returns how many."""
+    stale = [id_ for id_ in coll.get(include=[])["ids"] if id_ not in seen]
+    for i in range(0, len(stale), WRITE_BATCH):
+        coll.delete(ids=stale[i:i + WRITE_BATCH])
+    return len(stale)
+
+class _Progress:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.seen = self.skipped = self.embedded = self.written = self.deleted = 0
+        self._last = 0.0
+
+    def report(self, final=False):
+        now = time.monotonic()
+        if not final and now - self._last < 2:
+            return
+        self._last = now
+        rate = self.embedded / max(now - self.start, 1e-9)
+        print(
+            f"{'Done' if final else '..'}: read {self.seen}, unchanged {self.skipped}, "
+            f"embedded {self.embedded}, written {self.written}, deleted {self.deleted} ({rate:.1f} docs/s)"
+        )
+
+async def ingest(path="app/data/book_summaries.json", workers=INGEST_WORKERS, force=False):
+    coll = await run_blocking(get_collection, COLLECTION)
+    progress = _Progress()
+    seen: set[str] = set()
+    # Bounded queues keep memory flat however large the catalog is
+    todo: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    done: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+
+    async def produce():
+        books = iter_books(path)
+        while True:
+            chunk = await run_blocking(lambda: [to_record(b) for _, b in zip(range(READ_CHUNK), books)])
+            if not chunk:
+                break
+            progress.seen += len(chunk)
+            seen.update(r["id"] for r in chunk)
+            stored = {} if force else await run_blocking(_stored_hashes, coll, [r["id"] for r in chunk])
+            changed = [r for r in chunk if stored.get(r["id"]) != r["metadata"]["content_hash"]]
+            progress.skipped += len(chunk) - len(changed)
+            for batch in _batches(changed):
+                await todo.put(batch)
+            progress.report()
+        for _ in range(workers):
+            await todo.put(None)
+
+    async def embed_worker():
+        while (batch := await todo.get()) is not None:
+            vectors = await embed_texts([r["document"] for r in batch])
+            progress.embedded += len(batch)
+            await done.put((batch, vectors))
+        await done.put(None)
+
+    async def write():
+        # A single writer, so vector-store writes never interleave
+        pending, finished = [], 0
+        while finished < workers:
+            item = await done.get()
+            if item is None:
+                finished += 1
+            else:
+                pending.extend(zip(*item))
+            if pending and (len(pending) >= WRITE_BATCH or finished == workers):
+                await run_blocking(
+                    coll.upsert,
+                    ids=[r["id"] for r, _ in pending],
+                    embeddings=[v for _, v in pending],
+                    documents=[r["document"] for r, _ in pending],
+                    metadatas=[r["metadata"] for r, _ in pending],
+                )
+                progress.written += len(pending)
+                pending = []
+                progress.report()
 
-    coll = get_or_create_collection("book_summaries")
+    await asyncio.gather(produce(), write(), *(embed_worker() for _ in range(workers)))
+    progress.deleted = await run_blocking(_delete_missing, coll, seen)
+    progress.report(final=True)
+    indexed = await run_blocking(lexical.build, iter_books(path), COLLECTION)
+    print(f"BM25 index: {indexed} books in {lexical.LEXICAL_DIR}")
+    if progress.written or progress.deleted or force or not similar.exists(COLLECTION):
+        linked = await run_blocking(similar.build, coll, COLLECTION)
+        print(f"Similarity graph: {linked} books in {similar.SIMILAR_DIR}")
+    return progress
 
-    # Be idempotent: delete existing IDs, then add
-    try:
-        coll.delete(ids=ids)
-    except Exception:
-        pass
-    coll.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
-    print(f"Ingested {len(ids)} items into collection 'book_summaries'.")
+def run(path="app/data/book_summaries.json", workers=INGEST_WORKERS, force=False):
+    asyncio.run(ingest(path, workers, force))
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="app/data/book_summaries.json")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--force", action="store_true", help="re-embed every book")
+    args = parser.parse_args()
+    run(args.path, args.workers, args.force)
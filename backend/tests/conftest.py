@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings are read at import time: point every data path at a throwaway
+# directory before anything imports the app
+_DATA = tempfile.mkdtemp(prefix="bookchat-tests-")
+for name, value in {
+    "OPENAI_API_KEY": "sk-test",
+    "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",  # nothing listens; tests must not reach OpenAI
+    "DB_URL": f"sqlite:///{_DATA}/app.db",
+    "BLOB_DIR": f"{_DATA}/blobs",
+    "VECTOR_BACKEND": "numpy",
+    "VECTOR_DIR": f"{_DATA}/vectors",
+    "LEXICAL_DIR": f"{_DATA}/lexical",
+    "SIMILAR_DIR": f"{_DATA}/similar",
+    "TTS_CACHE_DIR": f"{_DATA}/tts",
+    "EMBED_CACHE_PATH": f"{_DATA}/embeddings.db",
+    "PREWARM": "",
+}.items():
+    os.environ[name] = value
+
+
+@pytest.fixture(scope="session")
+def data_dir() -> str:
+    return _DATA
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,95 @@
+import base64
+import sqlite3
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations
+from app.db import _migrate_image_blobs
+from app.services import blobstore
+
+# The schema the app created before migrations were versioned
+BASELINE = """
+CREATE TABLE chat (
+    id INTEGER PRIMARY KEY, user_id VARCHAR NOT NULL, title VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL
+);
+CREATE TABLE message (
+    id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL REFERENCES chat (id), role VARCHAR NOT NULL,
+    content VARCHAR NOT NULL, created_at DATETIME NOT NULL
+);
+CREATE TABLE imageasset (
+    id INTEGER PRIMARY KEY, chat_id INTEGER REFERENCES chat (id), title VARCHAR, user_id VARCHAR NOT NULL,
+    b64 VARCHAR NOT NULL, created_at DATETIME NOT NULL
+);
+INSERT INTO chat VALUES (1, 'u', 'Books', '2024-01-01 00:00:00', '2024-01-01 00:00:00');
+INSERT INTO chat VALUES (2, 'u', 'Weather', '2024-01-02 00:00:00', '2024-01-02 00:00:00');
+INSERT INTO message VALUES (1, 1, 'user', 'Recommend a novel about dragons', '2024-01-01 00:00:00');
+INSERT INTO message VALUES (2, 2, 'user', 'Is it raining?', '2024-01-02 00:00:00');
+"""
+PNG = b"\x89PNG baseline image"
+
+
+def _baseline(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as db:
+        db.executescript(BASELINE)
+        db.execute(
+            "INSERT INTO imageasset VALUES (1, 1, 'cover', 'u', ?, '2024-01-01 00:00:01')",
+            (base64.b64encode(PNG).decode(),),
+        )
+    return create_engine(f"sqlite:///{path}")
+
+
+def test_upgrade_from_a_baseline_database(tmp_path):
+    engine = _baseline(tmp_path)
+    with engine.connect() as conn:
+        assert migrations.upgrade(conn) == [v for v, _, _ in migrations.MIGRATIONS]
+        schema = inspect(conn)
+        chat_columns = {c["name"] for c in schema.get_columns("chat")}
+        assert {"summary", "summary_until", "is_book_chat"} <= chat_columns
+        assert "sha256" in {c["name"] for c in schema.get_columns("imageasset")}
+        assert "ix_chat_user_updated" in {i["name"] for i in schema.get_indexes("chat")}
+        assert "lease_owner" in {c["name"] for c in schema.get_columns("imagejob")}
+        # Existing rows survive and chats about books are flagged
+        flags = dict(conn.execute(text("SELECT id, is_book_chat FROM chat")).all())
+        assert flags == {1: True, 2: False}
+        assert conn.execute(text("SELECT content FROM message WHERE id = 2")).scalar() == "Is it raining?"
+        conn.commit()
+    engine.dispose()
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = _baseline(tmp_path)
+    with engine.connect() as conn:
+        migrations.upgrade(conn)
+        assert migrations.upgrade(conn) == []
+        versions = conn.execute(text("SELECT version FROM schema_version ORDER BY version")).scalars().all()
+        assert versions == [v for v, _, _ in migrations.MIGRATIONS]
+    engine.dispose()
+
+
+def test_inline_images_move_to_the_blob_store(tmp_path):
+    engine = _baseline(tmp_path)
+    with engine.connect() as conn:
+        migrations.upgrade(conn)
+        conn.commit()
+        _migrate_image_blobs(conn)
+        digest, b64 = conn.execute(text("SELECT sha256, b64 FROM imageasset WHERE id = 1")).one()
+    engine.dispose()
+    assert b64 == ""
+    assert blobstore.blob_path(digest).read_bytes() == PNG
+
+
+def test_a_fresh_database_gets_the_same_tables(tmp_path):
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    upgraded = _baseline(tmp_path)
+    tables = []
+    for engine in (fresh, upgraded):
+        with engine.connect() as conn:
+            migrations.upgrade(conn)
+            conn.commit()
+            schema = inspect(conn)
+            tables.append({t: {c["name"] for c in schema.get_columns(t)}
+                           for t in ("chat", "message", "imageasset", "imagejob")})
+        engine.dispose()
+    assert tables[0] == tables[1]
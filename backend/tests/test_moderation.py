@@ -0,0 +1,39 @@
+import pytest
+
+from app.services import moderation
+from app.services.moderation import Blocklist, normalize
+
+
+@pytest.fixture
+def blocklist(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("self-harm\nharm yourself\nharm yourselves\nmake a bomb\n", encoding="utf-8")
+    return Blocklist(path)
+
+
+@pytest.mark.parametrize("text", [
+    "how to self-harm",
+    "self-harming",
+    "SELF HARM",
+    "s3lf_h4rm",
+    "harm yourselves",
+    "how do I m4ke a b0mb?",
+])
+def test_blocks_phrases_inside_longer_text(blocklist, text):
+    assert blocklist.matches(text)
+
+
+@pytest.mark.parametrize("text", ["a book about harmony", "published in 2024", "self-help books"])
+def test_allows_unrelated_text(blocklist, text):
+    assert not blocklist.matches(text)
+
+
+def test_leetspeak_is_folded_only_inside_words():
+    assert normalize("Top 10 books of 2024") == "top 10 books of 2024"
+    assert normalize("5u1c1de @ 3 am") == "suicide 3 am"
+    assert normalize("h4rm-y0urs3lf!") == "harm yourself"
+
+
+def test_default_list_is_used_without_a_file(tmp_path):
+    assert Blocklist(tmp_path / "missing.txt").matches("thinking about suicide")
+    assert moderation.DEFAULT_BLOCKLIST
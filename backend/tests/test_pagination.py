@@ -0,0 +1,67 @@
+import sqlite3
+from datetime import datetime
+
+from app.services.pagination import decode_cursor, encode_cursor
+
+
+def _db(data_dir) -> sqlite3.Connection:
+    return sqlite3.connect(f"{data_dir}/app.db")
+
+
+def test_cursor_round_trip():
+    ts = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+    assert decode_cursor(encode_cursor(ts, 0, 7), keys=2) == (ts, 0, 7)
+
+
+def test_malformed_cursors_are_ignored():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+    assert decode_cursor("not base64!") is None
+    assert decode_cursor(encode_cursor(datetime(2024, 1, 1), 1, 2)) is None  # wrong number of keys
+
+
+def test_chat_list_pages_cover_every_chat_once(client, data_dir):
+    ids = [client.post("/chats", params={"user_id": "pager", "title": f"chat {i}"}).json()["id"] for i in range(7)]
+    # Equal timestamps: the id tie-break alone has to keep pages apart
+    with _db(data_dir) as db:
+        db.execute("UPDATE chat SET updated_at = '2024-01-01 00:00:00.000000' WHERE user_id = 'pager'")
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        r = client.get("/chats", params={"user_id": "pager", "limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        seen += [c["id"] for c in r.json()]
+        pages += 1
+        cursor = r.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert pages == 3
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_chat_timeline_pages_walk_back_to_the_first_message(client, data_dir):
+    chat_id = client.post("/chats", params={"user_id": "reader"}).json()["id"]
+    with _db(data_dir) as db:
+        db.executemany(
+            "INSERT INTO message (chat_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+            [(chat_id, "user" if i % 2 == 0 else "assistant", f"m{i}", f"2024-01-01 00:00:{i // 3:02d}.000000")
+             for i in range(10)],
+        )
+
+    pages, cursor = [], None
+    while True:
+        body = client.get(
+            f"/chats/{chat_id}", params={"user_id": "reader", "limit": 4, **({"cursor": cursor} if cursor else {})}
+        ).json()
+        pages.append([m["content"] for m in body["messages"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    # Newest page first, each page oldest first
+    assert pages == [["m6", "m7", "m8", "m9"], ["m2", "m3", "m4", "m5"], ["m0", "m1"]]
+
+
+def test_other_users_chats_are_not_listed(client):
+    client.post("/chats", params={"user_id": "owner"})
+    assert client.get("/chats", params={"user_id": "stranger"}).json() == []
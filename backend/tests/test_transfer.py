@@ -0,0 +1,53 @@
+import base64
+import hashlib
+
+import orjson
+
+from app.services import blobstore
+
+
+def _import(client, user_id: str, *records: dict):
+    lines = [{"type": "export", "version": 1, "user_id": "someone"}, *records]
+    return client.post(f"/users/{user_id}/import", content=b"\n".join(orjson.dumps(r) for r in lines))
+
+
+def _images(client, user_id: str) -> list[dict]:
+    return client.get("/images", params={"user_id": user_id}).json()
+
+
+def test_import_rejects_a_sha256_that_is_not_a_digest(client):
+    r = _import(client, "eve", {"type": "image", "id": 1, "chat_id": None, "sha256": "/etc/passwd"})
+    assert r.status_code == 400
+    assert r.json()["detail"]["imported"]["images"] == 0
+    r = _import(client, "eve", {"type": "image", "id": 1, "chat_id": None, "sha256": "../" * 8 + "etc/passwd"})
+    assert r.status_code == 400
+    assert _images(client, "eve") == []
+
+
+def test_import_skips_images_whose_blob_is_missing(client):
+    r = _import(client, "mallory", {"type": "image", "id": 1, "chat_id": None, "sha256": "0" * 64})
+    assert r.status_code == 200
+    assert r.json()["images"] == 0 and r.json()["skipped"] == 1
+    assert _images(client, "mallory") == []
+
+
+def test_imported_image_is_served_from_the_blob_store(client):
+    stored = b"\x89PNG stored"
+    digest = blobstore.put(stored)
+    carried = b"\x89PNG carried"
+    r = _import(
+        client, "alice",
+        {"type": "image", "id": 1, "chat_id": None, "sha256": digest, "title": "stored"},
+        {"type": "image", "id": 2, "chat_id": None, "sha256": hashlib.sha256(carried).hexdigest(),
+         "b64": base64.b64encode(carried).decode(), "title": "carried"},
+    )
+    assert r.status_code == 200 and r.json()["images"] == 2
+    bodies = {im["title"]: client.get(im["url"]).content for im in _images(client, "alice")}
+    assert bodies == {"stored": stored, "carried": carried}
+
+
+def test_import_rejects_bytes_that_do_not_match_the_digest(client):
+    r = _import(client, "bob", {"type": "image", "id": 1, "chat_id": None, "sha256": "a" * 64,
+                                "b64": base64.b64encode(b"something else").decode()})
+    assert r.status_code == 400
+    assert _images(client, "bob") == []
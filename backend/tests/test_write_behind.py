@@ -0,0 +1,78 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.write_behind import WriteBehind
+
+
+def _insert(value: int):
+    async def job(s):
+        await s.exec(text("INSERT INTO item (value) VALUES (:v)"), params={"v": value})
+        return value
+
+    return job
+
+
+async def _fail(s):
+    raise RuntimeError("bad job")
+
+
+async def _engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'wb.db'}")
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("CREATE TABLE item (value INTEGER NOT NULL)")
+    return engine
+
+
+async def _values(engine) -> list[int]:
+    async with engine.connect() as conn:
+        return sorted((await conn.execute(text("SELECT value FROM item"))).scalars())
+
+
+def test_close_commits_unawaited_writes_and_stops_the_consumer(tmp_path):
+    async def main():
+        engine = await _engine(tmp_path)
+        writer = WriteBehind(engine, max_batch=8, window_ms=50)
+        # Fire-and-forget, as chat appends are: nothing awaits these futures
+        futures = [writer.submit(_insert(i), chat_id=1, user_id="u") for i in range(20)]
+        consumer = writer._task
+        await writer.close()
+        assert all(f.done() and f.result() == i for i, f in enumerate(futures))
+        assert await _values(engine) == list(range(20))
+        assert consumer.done() and writer._task is None
+        assert writer.stats()["transactions"] < 20  # grouped, not one per job
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_a_failing_job_only_fails_itself(tmp_path):
+    async def main():
+        engine = await _engine(tmp_path)
+        writer = WriteBehind(engine, window_ms=50)
+        ok = [writer.submit(_insert(i)) for i in range(3)]
+        bad = writer.submit(_fail)
+        ok.append(writer.submit(_insert(3)))
+        await writer.close()
+        assert [f.result() for f in ok] == [0, 1, 2, 3]
+        assert isinstance(bad.exception(), RuntimeError)
+        assert await _values(engine) == [0, 1, 2, 3]
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_wait_covers_only_the_given_chat(tmp_path):
+    async def main():
+        engine = await _engine(tmp_path)
+        writer = WriteBehind(engine, window_ms=50)
+        mine = writer.submit(_insert(1), chat_id=1)
+        writer.submit(_insert(2), chat_id=2)
+        await writer.wait(chat_id=1)
+        assert mine.done()
+        await writer.close()
+        assert await _values(engine) == [1, 2]
+        await engine.dispose()
+
+    asyncio.run(main())
@@ -8,14 +8,16 @@ export default function ChatById({ params }: { params: { id: string } }){
   const chatId = Number(params.id);
   // Prime ChatWindow by loading history once (optional — ChatWindow can also load on its own)
   const [seed, setSeed] = useState<
-    { role: "user" | "assistant"; content: string; image_b64?: string }[] | null
+    { role: "user" | "assistant"; content: string; image_url?: string }[] | null
   >(null);
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
 
   const base = useMemo(()=>process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8000",[]);
   const userId = useMemo(() => getUserId(), []);
   useEffect(()=>{
     fetch(`${base}/chats/${chatId}?user_id=${userId}`).then(r=>r.json()).then(data=>{
       setSeed(data?.messages || []);
+      setOlderCursor(data?.next_cursor ?? null);
     }).catch(()=>setSeed([]));
   },[base,chatId,userId]);
 
@@ -35,5 +37,5 @@ export default function ChatById({ params }: { params: { id: string } }){
     );
   }
 
-  return <ChatWindow chatId={chatId} seedMessages={seed || undefined}/>;
+  return <ChatWindow chatId={chatId} seedMessages={seed || undefined} olderCursor={olderCursor}/>;
 }
\ No newline at end of file
@@ -4,7 +4,7 @@ import ImageLightbox from "@/components/ImageLightbox";
 import Spinner from "@/components/Spinner";
 import { getUserId } from "@/lib/user";
 
-type Img = { id:number; chat_id:number|null; title?:string|null; b64:string };
+type Img = { id:number; chat_id:number|null; title?:string|null; url:string; thumb_url:string };
 
 export default function LibraryPage(){
   const base = useMemo(()=>process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8000",[]);
@@ -24,9 +24,9 @@ export default function LibraryPage(){
         <>
           <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-3">
             {imgs.map(im=> (
-              <img key={im.id} src={`data:image/png;base64,${im.b64}`} alt={im.title || "image"}
+              <img key={im.id} src={base + im.thumb_url} alt={im.title || "image"} loading="lazy"
                    className="rounded-xl border border-gray-300 dark:border-gray-600 cursor-zoom-in hover:opacity-95"
-                   onClick={()=>setOpen(`data:image/png;base64,${im.b64}`)}/>
+                   onClick={()=>setOpen(base + im.url)}/>
             ))}
           </div>
           {imgs.length===0 && <div className="text-gray-500">No images yet.</div>}
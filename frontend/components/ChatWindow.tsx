@@ -8,6 +8,7 @@ import ImageLightbox from "./ImageLightbox";
 import { Send, ImagePlus } from "lucide-react";
 import Recorder from "./Recorder";
 import { getUserId } from "@/lib/user";
+import { readSse } from "@/lib/sse";
 
 function useApiBase() {
   return useMemo(
@@ -24,29 +25,38 @@ function stripMarkdown(s: string) {
     .trim();
 }
 
+type SeedMsg = {
+  role: "user" | "assistant";
+  content: string;
+  image_url?: string;
+};
+
+function toChatMsgs(seed: SeedMsg[], base: string): ChatMsg[] {
+  return seed
+    .map((m) => ({
+      role: m.role,
+      content: m.content || "",
+      imageUrl: m.image_url ? base + m.image_url : undefined,
+    }))
+    .filter((m) => m.content.trim() !== "" || m.imageUrl);
+}
+
 export default function ChatWindow({
   chatId,
   seedMessages,
+  olderCursor,
 }: {
   chatId?: number;
-  seedMessages?: {
-    role: "user" | "assistant";
-    content: string;
-    imageB64?: string;
-    image_b64?: string;
-  }[];
+  seedMessages?: SeedMsg[];
+  olderCursor?: string | null;
 }) {
+  const base = useApiBase();
   const [input, setInput] = useState("");
   const [msgs, setMsgs] = useState<ChatMsg[]>(
-    seedMessages
-      ?.map((m) => ({
-        role: m.role,
-        content: m.content || "",
-        imageB64: m.imageB64 || m.image_b64,
-      }))
-      .filter((m) => m.content.trim() !== "" || m.imageB64)
-      || []
+    seedMessages ? toChatMsgs(seedMessages, base) : []
   );
+  const [older, setOlder] = useState<string | null>(olderCursor ?? null);
+  const keepScrollRef = useRef(false);
   const [sending, setSending] = useState(false);
   const [status, setStatus] = useState<"thinking" | "generating" | null>(null);
   const [lightbox, setLightbox] = useState<string | null>(null);
@@ -57,28 +67,43 @@ export default function ChatWindow({
   const audioRef = useRef<HTMLAudioElement>(null);
   const listRef = useRef<HTMLDivElement>(null);
   const bottomRef = useRef<HTMLDivElement>(null);
-  const base = useApiBase();
   const userId = useMemo(() => getUserId(), []);
   const router = useRouter();
 
   useEffect(() => {
     if (seedMessages) {
-      setMsgs(
-        seedMessages
-          .map((m) => ({
-            role: m.role,
-            content: m.content || "",
-            imageB64: m.imageB64 || (m as any).image_b64,
-          }))
-          .filter((m) => m.content.trim() !== "" || m.imageB64)
-      );
+      setMsgs(toChatMsgs(seedMessages, base));
     }
-  }, [seedMessages]);
+  }, [seedMessages, base]);
+
+  useEffect(() => {
+    setOlder(olderCursor ?? null);
+  }, [olderCursor]);
 
   useEffect(() => {
+    // Prepending older history should not jump to the bottom
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     bottomRef.current?.scrollIntoView({ behavior: "auto" });
   }, [msgs, chatId]);
 
+  async function loadOlder() {
+    if (!chatId || !older) return;
+    try {
+      const res = await fetch(
+        `${base}/chats/${chatId}?user_id=${userId}&cursor=${encodeURIComponent(older)}`
+      );
+      const data = await res.json();
+      keepScrollRef.current = true;
+      setMsgs((m) => [...toChatMsgs(data?.messages || [], base), ...m]);
+      setOlder(data?.next_cursor ?? null);
+    } catch {
+      // keep the button so the user can retry
+    }
+  }
+
   useEffect(() => {
     speakingIdxRef.current = speakingIdx;
   }, [speakingIdx]);
@@ -100,27 +125,16 @@ export default function ChatWindow({
     }
 
     setSpeakingIdx(idx);
-    try {
-      const tts = await fetch(
-        base + "/tts?text=" + encodeURIComponent(stripMarkdown(text))
-      );
-      if (tts.ok) {
-        const blob = await tts.blob();
-        const url = URL.createObjectURL(blob);
-        setAudioUrl(url);
-        setTimeout(() => {
-          const a = audioRef.current;
-          if (a && speakingIdxRef.current === idx) {
-            a.play();
-            a.onended = () => setSpeakingIdx(null);
-          }
-        }, 100);
-      } else {
-        setSpeakingIdx(null);
+    // Point the player at the endpoint directly so playback starts while audio streams in
+    setAudioUrl(base + "/tts?text=" + encodeURIComponent(stripMarkdown(text)));
+    setTimeout(() => {
+      const a = audioRef.current;
+      if (a && speakingIdxRef.current === idx) {
+        a.onended = () => setSpeakingIdx(null);
+        a.onerror = () => setSpeakingIdx(null);
+        a.play().catch(() => setSpeakingIdx(null));
       }
-    } catch {
-      setSpeakingIdx(null);
-    }
+    }, 100);
   }
 
   async function send(text?: string) {
@@ -132,12 +146,41 @@ export default function ChatWindow({
     setMsgs((m) => [...m, { role: "user", content: message }]);
 
     try {
-      const res = await fetch(base + `/chat?user_id=${userId}`, {
+      const res = await fetch(base + `/chat/stream?user_id=${userId}`, {
         method: "POST",
         headers: { "content-type": "application/json" },
         body: JSON.stringify({ message, chat_id: chatId }),
       });
-      const data = await res.json();
+      if (!res.ok) throw new Error(`chat failed: ${res.status}`);
+
+      // Render tokens as they arrive; the final event carries the chat id
+      let data: any = null;
+      let failed: any = null;
+      let started = false;
+      await readSse(res, (event, payload) => {
+        if (event === "delta" && payload?.text) {
+          if (!started) {
+            started = true;
+            setStatus(null);
+            setMsgs((m) => [...m, { role: "assistant", content: payload.text }]);
+          } else {
+            setMsgs((m) => {
+              const last = m[m.length - 1];
+              return [...m.slice(0, -1), { ...last, content: last.content + payload.text }];
+            });
+          }
+        } else if (event === "done") {
+          data = payload;
+        } else if (event === "error") {
+          failed = payload;
+        }
+      });
+      if (failed) {
+        const note = "Sorry, something went wrong" + (started ? " before the reply was finished." : ".");
+        setMsgs((m) => [...m, { role: "assistant", content: note }]);
+        window.dispatchEvent(new Event("chats-changed"));
+        return;
+      }
 
       // If we didn't have a chat yet, jump to the newly created chat route
       if (!chatId && data?.chat_id) {
@@ -146,8 +189,10 @@ export default function ChatWindow({
         return;
       }
 
-      const reply = data?.reply ?? "(no reply)";
-      setMsgs((m) => [...m, { role: "assistant", content: reply }]);
+      if (!started) {
+        const reply = data?.reply ?? "(no reply)";
+        setMsgs((m) => [...m, { role: "assistant", content: reply }]);
+      }
       window.dispatchEvent(new Event("chats-changed"));
     } catch (e) {
       setMsgs((m) => [...m, { role: "assistant", content: "Sorry, something went wrong." }]);
@@ -179,10 +224,10 @@ export default function ChatWindow({
         router.push("/chat/" + data.chat_id);
         return;
       }
-      if (data?.image_b64) {
+      if (data?.url) {
         setMsgs((m) => [
           ...m,
-          { role: "assistant", content: "", imageB64: data.image_b64 },
+          { role: "assistant", content: "", imageUrl: base + data.url },
         ]);
         window.dispatchEvent(new Event("chats-changed"));
       } else {
@@ -222,6 +267,16 @@ export default function ChatWindow({
           </div>
         ) : (
           <div className="space-y-4 py-4">
+            {older && (
+              <div className="flex justify-center">
+                <button
+                  onClick={loadOlder}
+                  className="rounded-full border border-gray-300 dark:border-gray-600 px-3 py-1 text-sm text-gray-500 hover:text-gray-900 dark:hover:text-gray-100"
+                >
+                  Load older messages
+                </button>
+              </div>
+            )}
             {msgs.map((m, i) => (
               <MessageBubble
                 key={i}
@@ -7,7 +7,7 @@ import { Bot, User, Copy, Check, Volume2, Square } from "lucide-react";
 export type ChatMsg = {
   role: "user" | "assistant";
   content: string;
-  imageB64?: string | null; // optional inline image
+  imageUrl?: string | null; // optional image (absolute URL)
 };
 
 function Avatar({ role }: { role: "user" | "assistant" }) {
@@ -99,12 +99,12 @@ export default function MessageBubble({ msg, onCopy, onImageClick, onSpeak, spea
           </div>
         )}
 
-        {msg.imageB64 && (
+        {msg.imageUrl && (
           <img
-            src={`data:image/png;base64,${msg.imageB64}`}
+            src={msg.imageUrl}
             alt="Generated image"
             className="max-w-[200px] w-auto h-auto object-contain rounded-xl border border-gray-300 dark:border-gray-600 cursor-zoom-in hover:opacity-95"
-            onClick={() => onImageClick?.(`data:image/png;base64,${msg.imageB64}`)}
+            onClick={() => onImageClick?.(msg.imageUrl as string)}
           />
         )}
       </div>
@@ -23,21 +23,33 @@ export default function Sidebar() {
   const userId = useMemo(() => getUserId(), []);
   const router = useRouter();
 
-  async function load() {
+  const [cursor, setCursor] = useState<string | null>(null);
+
+  // Search runs server-side; results are paged with the X-Next-Cursor header
+  async function load(more = false) {
     try {
-      const res = await fetch(base + `/chats?user_id=${userId}`);
+      const params = new URLSearchParams({ user_id: userId });
+      if (q.trim()) params.set("q", q.trim());
+      if (more && cursor) params.set("cursor", cursor);
+      const res = await fetch(base + `/chats?${params}`);
       const data = await res.json().catch(() => []);
-      setChats(Array.isArray(data) ? data : []);
+      const page = Array.isArray(data) ? data : [];
+      setChats((prev) => (more ? [...prev, ...page] : page));
+      setCursor(res.headers?.get("X-Next-Cursor") ?? null);
     } catch {
-      setChats([]);
+      if (!more) setChats([]);
     }
   }
 
   useEffect(() => {
-    load().catch(() => {});
-    window.addEventListener("chats-changed", load);
-    return () => window.removeEventListener("chats-changed", load);
-  }, [base, userId]);
+    const t = setTimeout(() => load().catch(() => {}), q ? 250 : 0);
+    const onChange = () => load().catch(() => {});
+    window.addEventListener("chats-changed", onChange);
+    return () => {
+      clearTimeout(t);
+      window.removeEventListener("chats-changed", onChange);
+    };
+  }, [base, userId, q]);
 
   async function newChat() {
     const res = await fetch(base + `/chats?user_id=${userId}`, { method: "POST" });
@@ -46,9 +58,7 @@ export default function Sidebar() {
     router.push("/chat/" + data.id);
   }
 
-  const filtered = Array.isArray(chats)
-    ? chats.filter((c) => !q || c.title.toLowerCase().includes(q.toLowerCase()))
-    : [];
+  const filtered = Array.isArray(chats) ? chats : [];
 
   return (
     <aside
@@ -120,6 +130,14 @@ export default function Sidebar() {
         {filtered.length === 0 && (
           <div className="text-gray-500 text-sm">No chats yet.</div>
         )}
+        {cursor && (
+          <button
+            onClick={() => load(true)}
+            className="w-full rounded-md px-2 py-2 text-sm text-gray-500 hover:bg-gray-100 dark:hover:bg-gray-700"
+          >
+            Load more
+          </button>
+        )}
       </nav>
       <div className="p-3 border-t border-gray-200 dark:border-gray-700 shrink-0">
         <ThemeToggle />
@@ -0,0 +1,35 @@
+// Minimal reader for the text/event-stream responses returned by the API.
+// Streams end with a "done" event, or an "error" event if the server failed mid-stream.
+export async function readSse(
+  res: Response,
+  onEvent: (event: string, data: any) => void
+): Promise<void> {
+  if (!res.body) return;
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let sep = buf.indexOf("\n\n");
+    while (sep !== -1) {
+      const block = buf.slice(0, sep);
+      buf = buf.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (data) {
+        try {
+          onEvent(event, JSON.parse(data));
+        } catch {
+          // ignore malformed frames
+        }
+      }
+      sep = buf.indexOf("\n\n");
+    }
+  }
+}